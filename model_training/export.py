@@ -0,0 +1,186 @@
+import argparse
+import glob
+import os
+import sys
+
+import cv2
+import numpy as np
+import yaml
+from ultralytics import YOLO
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from detections import Detections, BASE_CLASS_ID  # noqa: E402
+
+MODEL_PATH = '../model/train104/weights/best.pt'
+DATA_CONFIG = 'config.yaml'
+IMAGE_SIZE = 640
+CALIBRATION_IMAGES = 300
+
+# Detections scored at or below this threshold are ignored, as in image_processing
+PARITY_SCORE_THRESHOLD = 0.2
+PARITY_BASE_IOU = 0.9
+
+
+def find_images(config_path=DATA_CONFIG, split='train'):
+    """
+    Lists the labeled screens of a dataset split.
+
+    Params:
+        config_path (str): Path to the dataset config
+        split (str): The split to list, 'train' or 'val'
+
+    Returns:
+        list: Paths to the images
+    """
+    with open(config_path) as f:
+        config = yaml.safe_load(f)
+    directory = os.path.join(os.path.dirname(os.path.abspath(config_path)), config['path'], config[split])
+    return sorted(path for extension in ('png', 'jpg', 'jpeg')
+                  for path in glob.glob(os.path.join(directory, '**', f'*.{extension}'), recursive=True))
+
+
+def letterbox(image, size=IMAGE_SIZE):
+    """
+    Resizes an image keeping its aspect ratio and pads it to a square, the way YOLO preprocesses its input.
+
+    Params:
+        image (numpy.ndarray): BGR image
+        size (int): Side of the square
+
+    Returns:
+        numpy.ndarray: 1 x 3 x size x size float32 RGB tensor scaled to [0, 1]
+    """
+    height, width = image.shape[:2]
+    scale = size / max(height, width)
+    resized = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_LINEAR)
+    padded = np.full((size, size, 3), 114, dtype=np.uint8)
+    top, left = (size - resized.shape[0]) // 2, (size - resized.shape[1]) // 2
+    padded[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+    return np.ascontiguousarray(padded[:, :, ::-1].transpose(2, 0, 1)[None], dtype=np.float32) / 255
+
+
+def quantize_onnx(onnx_path, images, output_path):
+    """
+    Quantizes an ONNX model to INT8 with static calibration on labeled screens.
+
+    Params:
+        onnx_path (str): Path to the float ONNX model
+        images (list): Paths to the calibration images
+        output_path (str): Path to the quantized model
+    """
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    class ScreensReader(CalibrationDataReader):
+        def __init__(self):
+            import onnxruntime
+            self.input_name = onnxruntime.InferenceSession(onnx_path).get_inputs()[0].name
+            self.paths = iter(images)
+
+        def get_next(self):
+            for path in self.paths:
+                image = cv2.imread(path)
+                if image is not None:
+                    return {self.input_name: letterbox(image)}
+            return None
+
+    quantize_static(onnx_path, output_path, ScreensReader(), quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8, per_channel=True)
+
+
+def export(export_format, int8=False, model_path=MODEL_PATH, config_path=DATA_CONFIG):
+    """
+    Exports the trained detector for CPU inference. The exported model is written next to the PyTorch weights, where
+    the model registry looks for it.
+
+    Params:
+        export_format (str): 'onnx' for ONNX Runtime or 'openvino'
+        int8 (bool): Quantize the weights and activations to INT8, calibrated on the training screens
+        model_path (str): Path to the PyTorch weights
+        config_path (str): Path to the dataset config, used for calibration
+
+    Returns:
+        str: Path to the exported model
+    """
+    model = YOLO(model_path)
+    if export_format == 'openvino':
+        return model.export(format='openvino', imgsz=IMAGE_SIZE, int8=int8, data=config_path if int8 else None)
+
+    onnx_path = model.export(format='onnx', imgsz=IMAGE_SIZE, simplify=True)
+    if not int8:
+        return onnx_path
+    images = find_images(config_path)[:CALIBRATION_IMAGES]
+    if not images:
+        raise FileNotFoundError(f"No calibration images found for {config_path}")
+    output_path = onnx_path.replace('.onnx', '-int8.onnx')
+    quantize_onnx(onnx_path, images, output_path)
+    return output_path
+
+
+def iou(first, second):
+    x1, y1 = max(first[0], second[0]), max(first[1], second[1])
+    x2, y2 = min(first[2], second[2]), min(first[3], second[3])
+    intersection = max(x2 - x1, 0) * max(y2 - y1, 0)
+    union = (first[2] - first[0]) * (first[3] - first[1]) + (second[2] - second[0]) * (second[3] - second[1]) \
+        - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def check_parity(exported_path, images, model_path=MODEL_PATH):
+    """
+    Runs the PyTorch and the exported detector on the same screens and compares what the attack decision relies on:
+    the amount of defences and the location of the base.
+
+    Params:
+        exported_path (str): Path to the exported model
+        images (list): Paths to the screens
+        model_path (str): Path to the PyTorch weights
+
+    Returns:
+        bool: True if every screen has the same box count and a matching base box
+    """
+    reference, exported = YOLO(model_path), YOLO(exported_path, task='detect')
+    mismatches = 0
+    for path in images:
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        expected = Detections.from_results(reference(image, imgsz=IMAGE_SIZE, verbose=False)[0]) \
+            .filter(PARITY_SCORE_THRESHOLD)
+        actual = Detections.from_results(exported(image, imgsz=IMAGE_SIZE, verbose=False)[0]) \
+            .filter(PARITY_SCORE_THRESHOLD)
+
+        problems = []
+        if len(expected) != len(actual):
+            problems.append(f"{len(actual)} boxes instead of {len(expected)}")
+        if (expected.base_box is None) != (actual.base_box is None):
+            problems.append(f"base {'missing' if actual.base_box is None else 'found where there is none'}")
+        elif expected.base_box is not None and iou(expected.base_box, actual.base_box) < PARITY_BASE_IOU:
+            problems.append(f"base IoU {iou(expected.base_box, actual.base_box):.2f}")
+
+        if problems:
+            mismatches += 1
+            print(f"{os.path.basename(path)}: {', '.join(problems)}")
+
+    print(f"{len(images) - mismatches}/{len(images)} screens match (class {BASE_CLASS_ID} base IoU >= "
+          f"{PARITY_BASE_IOU})")
+    return mismatches == 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the defence detector for CPU inference and check it matches "
+                                                 "the PyTorch model.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export_parser = subparsers.add_parser('export')
+    export_parser.add_argument('format', choices=['onnx', 'openvino'])
+    export_parser.add_argument('--int8', action='store_true', help="quantize to INT8 calibrated on the train split")
+    parity_parser = subparsers.add_parser('parity')
+    parity_parser.add_argument('model', help="path to the exported model")
+    parity_parser.add_argument('--split', default='val', help="dataset split to compare on")
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        exported_model = export(args.format, args.int8)
+        print(f"Exported to {exported_model}")
+        sys.exit(0 if check_parity(exported_model, find_images(split='val')) else 1)
+    else:
+        sys.exit(0 if check_parity(args.model, find_images(split=args.split)) else 1)
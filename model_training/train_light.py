@@ -0,0 +1,225 @@
+import argparse
+import csv
+import os
+import shutil
+import time
+
+import cv2
+import yaml
+from ultralytics import YOLO
+
+from export import find_images, DATA_CONFIG, BASE_CLASS_ID
+
+TEACHER_RUN = '../model/train104'
+RUNS_DIRECTORY = '../model'
+REPORT_PATH = '../model/light_report.csv'
+UNLABELED_SCREENS_DIRECTORY = '../logs/screenshots'
+DISTILLED_DATASET_DIRECTORY = 'distilled'
+
+MODEL_SIZES = ['n', 's']
+IMAGE_SIZES = [640, 480, 320]
+EPOCHS = 150
+
+# Teacher detections scored below this threshold aren't turned into pseudo-labels
+PSEUDO_LABEL_SCORE_THRESHOLD = 0.5
+# A model qualifies for shipping if it finds the base at least this reliably on the validation screens
+REQUIRED_BASE_AP50 = 0.95
+LATENCY_RUNS = 20
+
+
+def run_name(size, image_size, distilled):
+    return f"light_{size}_{image_size}{'_distilled' if distilled else ''}"
+
+
+def build_distilled_dataset(teacher_path=os.path.join(TEACHER_RUN, 'weights', 'best.pt'),
+                            screens_directory=UNLABELED_SCREENS_DIRECTORY, config_path=DATA_CONFIG):
+    """
+    Distils train104 into a dataset: the labeled screens are kept with their labels and every unlabeled screen saved
+    by the bot is labeled with the teacher's detections.
+
+    Params:
+        teacher_path (str): Path to the teacher's weights
+        screens_directory (str): Directory of the unlabeled screens
+        config_path (str): Path to the config of the labeled dataset
+
+    Returns:
+        str: Path to the config of the distilled dataset
+    """
+    images_directory = os.path.join(DISTILLED_DATASET_DIRECTORY, 'images')
+    labels_directory = os.path.join(DISTILLED_DATASET_DIRECTORY, 'labels')
+    shutil.rmtree(DISTILLED_DATASET_DIRECTORY, ignore_errors=True)
+    os.makedirs(images_directory)
+    os.makedirs(labels_directory)
+
+    for path in find_images(config_path):
+        shutil.copy(path, images_directory)
+        label_path = os.path.splitext(path.replace(f'{os.sep}images{os.sep}', f'{os.sep}labels{os.sep}'))[0] + '.txt'
+        if os.path.exists(label_path):
+            shutil.copy(label_path, labels_directory)
+
+    teacher = YOLO(teacher_path)
+    pseudo_labeled = 0
+    for name in sorted(os.listdir(screens_directory)):
+        if not name.endswith(('.png', '.jpg', '.webp')) or '_detections' in name:
+            continue
+        image = cv2.imread(os.path.join(screens_directory, name))
+        # Resource counter crops and other partial captures can't be labeled
+        if image is None or image.shape[0] < 640 or image.shape[1] < 640:
+            continue
+        boxes = teacher(image, verbose=False)[0].boxes
+        keep = boxes.conf.cpu().numpy() >= PSEUDO_LABEL_SCORE_THRESHOLD
+        if not keep.any():
+            continue
+        stem = f"pseudo_{os.path.splitext(name)[0]}"
+        cv2.imwrite(os.path.join(images_directory, f"{stem}.png"), image)
+        with open(os.path.join(labels_directory, f"{stem}.txt"), 'w') as f:
+            for class_id, box in zip(boxes.cls.cpu().numpy()[keep], boxes.xywhn.cpu().numpy()[keep]):
+                f.write(f"{int(class_id)} {' '.join(f'{v:.6f}' for v in box)}\n")
+        pseudo_labeled += 1
+    print(f"{pseudo_labeled} screens pseudo-labeled by {teacher_path}")
+
+    with open(config_path) as f:
+        config = yaml.safe_load(f)
+    # Validation stays on the hand-labeled screens so every variant is compared on the same ground truth
+    config['val'] = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(config_path)), config['path'],
+                                                  config['val']))
+    config['path'] = os.path.abspath(DISTILLED_DATASET_DIRECTORY)
+    config['train'] = 'images'
+    distilled_config = os.path.join(DISTILLED_DATASET_DIRECTORY, 'config.yaml')
+    with open(distilled_config, 'w') as f:
+        yaml.safe_dump(config, f)
+    return distilled_config
+
+
+def train(size, image_size, distilled=False, epochs=EPOCHS, config_path=DATA_CONFIG):
+    """
+    Fine-tunes a COCO-pretrained YOLOv8 nano or small model on the screens.
+
+    Params:
+        size (str): Model size, 'n' or 's'
+        image_size (int): Input size to train and run at
+        distilled (bool): Train on the dataset distilled from train104 instead of the labeled screens only
+        epochs (int): Epochs to train for
+        config_path (str): Path to the dataset config
+
+    Returns:
+        str: Path to the run directory
+    """
+    name = run_name(size, image_size, distilled)
+    model = YOLO(f"yolov8{size}.pt")
+    model.train(data=config_path, epochs=epochs, imgsz=image_size, project=os.path.abspath(RUNS_DIRECTORY),
+                name=name, exist_ok=True)
+    return os.path.join(RUNS_DIRECTORY, name)
+
+
+def read_best_map(run_directory):
+    """
+    Reads the best validation mAP of a run from its results.csv.
+
+    Returns:
+        tuple: (mAP50, mAP50-95) of the epoch with the best mAP50-95
+    """
+    with open(os.path.join(run_directory, 'results.csv')) as f:
+        rows = [{key.strip(): value.strip() for key, value in row.items()} for row in csv.DictReader(f)]
+    best = max(rows, key=lambda row: float(row['metrics/mAP50-95(B)']))
+    return float(best['metrics/mAP50(B)']), float(best['metrics/mAP50-95(B)'])
+
+
+def evaluate(run_directory, config_path=DATA_CONFIG):
+    """
+    Measures a trained run on CPU: load time (up to the first inference), inference latency on the validation screens
+    and how reliably it finds the base.
+
+    Params:
+        run_directory (str): The run directory
+        config_path (str): Path to the dataset config
+
+    Returns:
+        dict: The row of the report
+    """
+    with open(os.path.join(run_directory, 'args.yaml')) as f:
+        image_size = yaml.safe_load(f)['imgsz']
+    weights = os.path.join(run_directory, 'weights', 'best.pt')
+
+    start = time.perf_counter()
+    model = YOLO(weights)
+    model(cv2.imread(find_images(config_path, 'val')[0]), imgsz=image_size, device='cpu', verbose=False)
+    load_time = time.perf_counter() - start
+
+    images = [cv2.imread(path) for path in find_images(config_path, 'val')[:LATENCY_RUNS]]
+    start = time.perf_counter()
+    for image in images:
+        model(image, imgsz=image_size, device='cpu', verbose=False)
+    latency = (time.perf_counter() - start) / len(images)
+
+    validation = model.val(data=config_path, imgsz=image_size, device='cpu', verbose=False, plots=False)
+    classes = list(validation.box.ap_class_index)
+    _, base_recall, base_ap50, _ = validation.box.class_result(classes.index(BASE_CLASS_ID)) \
+        if BASE_CLASS_ID in classes else (0, 0, 0, 0)
+
+    map50, map50_95 = read_best_map(run_directory)
+    return {
+        'run': os.path.basename(run_directory),
+        'imgsz': image_size,
+        'size_mb': round(os.path.getsize(weights) / 2 ** 20, 1),
+        'map50': round(map50, 4),
+        'map50_95': round(map50_95, 4),
+        'base_ap50': round(float(base_ap50), 4),
+        'base_recall': round(float(base_recall), 4),
+        'cpu_latency_ms': round(latency * 1000, 1),
+        'load_time_s': round(load_time, 2),
+    }
+
+
+def report(run_directories, path=REPORT_PATH):
+    """
+    Evaluates runs, writes the comparison to a CSV file and prints it with the fastest model that qualifies.
+
+    Params:
+        run_directories (list): The run directories, train104 included as the reference
+        path (str): Path to the report
+    """
+    rows = [evaluate(run_directory) for run_directory in run_directories]
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    print(f"{'Run':<26} {'imgsz':>5} {'MB':>6} {'mAP50':>6} {'mAP50-95':>8} {'Base AP50':>9} {'Base R':>6} "
+          f"{'CPU ms':>7} {'Load s':>6}")
+    for row in rows:
+        print(f"{row['run']:<26} {row['imgsz']:>5} {row['size_mb']:>6} {row['map50']:>6.3f} {row['map50_95']:>8.3f} "
+              f"{row['base_ap50']:>9.3f} {row['base_recall']:>6.3f} {row['cpu_latency_ms']:>7} "
+              f"{row['load_time_s']:>6}")
+
+    qualifying = [row for row in rows if row['base_ap50'] >= REQUIRED_BASE_AP50]
+    if qualifying:
+        fastest = min(qualifying, key=lambda row: row['cpu_latency_ms'])
+        print(f"Fastest model finding the base with AP50 >= {REQUIRED_BASE_AP50}: {fastest['run']}")
+    else:
+        print(f"No model finds the base with AP50 >= {REQUIRED_BASE_AP50}")
+    print(f"Report saved to {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train nano/small detectors and compare them with train104.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    train_parser = subparsers.add_parser('train')
+    train_parser.add_argument('--sizes', nargs='+', choices=MODEL_SIZES, default=MODEL_SIZES)
+    train_parser.add_argument('--imgsz', nargs='+', type=int, default=IMAGE_SIZES)
+    train_parser.add_argument('--epochs', type=int, default=EPOCHS)
+    train_parser.add_argument('--distill', action='store_true',
+                              help="add the screens saved by the bot, pseudo-labeled by train104")
+    report_parser = subparsers.add_parser('report')
+    report_parser.add_argument('runs', nargs='*', help="run directories, all light runs if not given")
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        data_config = build_distilled_dataset() if args.distill else DATA_CONFIG
+        trained_runs = [train(size, image_size, args.distill, args.epochs, data_config)
+                        for size in args.sizes for image_size in args.imgsz]
+        report([TEACHER_RUN, *trained_runs])
+    else:
+        light_runs = args.runs or sorted(os.path.join(RUNS_DIRECTORY, name) for name in os.listdir(RUNS_DIRECTORY)
+                                         if name.startswith('light_'))
+        report([TEACHER_RUN, *light_runs])
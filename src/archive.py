@@ -0,0 +1,172 @@
+import atexit
+import collections
+import logging
+import os
+import queue
+import threading
+
+import cv2
+
+from metrics import metrics
+
+ARCHIVE_DIRECTORY = '../logs/screenshots'
+# Which enemies are archived: 'all', 'attacked', 'low_confidence' (only the ones whose analysis was uncertain) or
+# 'none'
+ARCHIVE_POLICY = 'all'
+# Image encoding: 'jpg' and 'webp' are several times faster to write and smaller than 'png'
+ARCHIVE_ENCODING = 'jpg'
+ARCHIVE_QUALITY = 90
+# Keep only the newest files within both bounds, the oldest ones are deleted first
+ARCHIVE_MAX_FILES = 5000
+ARCHIVE_MAX_BYTES = 1024 ** 3
+# Entries waiting to be written; when the writer falls behind new entries are dropped instead of stalling the loop
+ARCHIVE_QUEUE_SIZE = 32
+
+ARCHIVE_POLICIES = ('all', 'attacked', 'low_confidence', 'none')
+ARCHIVE_ENCODINGS = {
+    'png': [cv2.IMWRITE_PNG_COMPRESSION, 1],
+    'jpg': [cv2.IMWRITE_JPEG_QUALITY, ARCHIVE_QUALITY],
+    'webp': [cv2.IMWRITE_WEBP_QUALITY, ARCHIVE_QUALITY],
+}
+
+
+class ScreenshotArchive:
+    """
+    Bounded archive of the screenshots and detection results of scanned enemies. Entries are encoded and written by a
+    background thread, and the archive is kept as a ring buffer: once it exceeds ARCHIVE_MAX_FILES files or
+    ARCHIVE_MAX_BYTES bytes, the oldest files are deleted. Files left by previous runs stay in the ring instead of
+    being wiped at startup.
+    """
+
+    def __init__(self, directory=ARCHIVE_DIRECTORY, policy=ARCHIVE_POLICY, encoding=ARCHIVE_ENCODING,
+                 max_files=ARCHIVE_MAX_FILES, max_bytes=ARCHIVE_MAX_BYTES):
+        if policy not in ARCHIVE_POLICIES:
+            raise ValueError(f"Invalid archive policy {policy!r}, use one of {ARCHIVE_POLICIES}")
+        if encoding not in ARCHIVE_ENCODINGS:
+            raise ValueError(f"Invalid archive encoding {encoding!r}, use one of {list(ARCHIVE_ENCODINGS)}")
+        self.directory = directory
+        self.policy = policy
+        self.encoding = encoding
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.files = collections.deque()
+        self.total_bytes = 0
+        self.written = 0
+        self.dropped = 0
+        self.evicted = 0
+        self.entries = queue.Queue(maxsize=ARCHIVE_QUEUE_SIZE)
+        self.writer = None
+
+    def start(self):
+        """
+        Indexes the files already in the archive, evicting the oldest ones over the bounds, and starts the writer.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        existing = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            # Subdirectories hold the archives of other bot instances
+            if name.startswith('.') or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            existing.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(existing):
+            self.files.append((name, size))
+            self.total_bytes += size
+        self.evict()
+        logging.info(f"Screenshot archive: {len(self.files)} files, {self.total_bytes / 2 ** 20:.0f} MiB kept from "
+                     f"previous runs, policy '{self.policy}', encoding '{self.encoding}'")
+
+        self.writer = threading.Thread(target=self.write_entries, name='archive-writer', daemon=True)
+        self.writer.start()
+        atexit.register(self.flush)
+
+    def wants(self, attacked=False, low_confidence=False):
+        """
+        Tells whether an enemy is archived under the current policy.
+
+        Params:
+            attacked (bool): The enemy was attacked
+            low_confidence (bool): The analysis of the enemy was uncertain
+
+        Returns:
+            bool: True if its entries should be archived
+        """
+        return self.policy == 'all' or (self.policy == 'attacked' and attacked) \
+            or (self.policy == 'low_confidence' and low_confidence)
+
+    def submit(self, name, render, *args):
+        """
+        Queues an entry for the writer. Rendering runs on the writer thread, so its arguments must not be modified
+        afterwards.
+
+        Params:
+            name (str): File name without extension for images, with it for text
+            render (callable): Function returning the image (numpy.ndarray) or the text (str) of the entry
+            *args: Arguments of the render function
+
+        Returns:
+            bool: True if the entry was queued, False if it was dropped because the writer is behind
+        """
+        if self.writer is None:
+            self.start()
+        try:
+            self.entries.put_nowait((name, render, args))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logging.warning(f"Screenshot archive is behind, dropped {name} ({self.dropped} dropped)")
+            return False
+
+    def write_entries(self):
+        while True:
+            name, render, args = self.entries.get()
+            try:
+                with metrics.span('archive_write'):
+                    self.write(name, render(*args))
+            except Exception as e:
+                logging.error(f"Couldn't archive {name}: {e}")
+            finally:
+                self.entries.task_done()
+
+    def write(self, name, content):
+        if isinstance(content, str):
+            filename = name
+            with open(os.path.join(self.directory, filename), 'w') as f:
+                f.write(content)
+        else:
+            filename = f"{name}.{self.encoding}"
+            cv2.imwrite(os.path.join(self.directory, filename), content, ARCHIVE_ENCODINGS[self.encoding])
+        size = os.path.getsize(os.path.join(self.directory, filename))
+        self.files.append((filename, size))
+        self.total_bytes += size
+        self.written += 1
+        self.evict()
+
+    def evict(self):
+        """
+        Deletes the oldest files until the archive is within its bounds.
+        """
+        while self.files and (len(self.files) > self.max_files or self.total_bytes > self.max_bytes):
+            filename, size = self.files.popleft()
+            self.total_bytes -= size
+            self.evicted += 1
+            try:
+                os.remove(os.path.join(self.directory, filename))
+            except FileNotFoundError:
+                pass
+
+    def flush(self):
+        """
+        Waits until every queued entry has been written.
+        """
+        if self.writer is not None:
+            self.entries.join()
+
+    def summary(self):
+        return f"Screenshot archive: {len(self.files)}/{self.max_files} files, " \
+               f"{self.total_bytes / 2 ** 20:.0f}/{self.max_bytes / 2 ** 20:.0f} MiB, {self.written} written, " \
+               f"{self.evicted} evicted, {self.dropped} dropped"
+
+
+screenshot_archive = ScreenshotArchive()
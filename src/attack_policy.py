@@ -0,0 +1,379 @@
+import argparse
+import json
+import logging
+import os
+from datetime import datetime
+
+import numpy as np
+
+from run_log import RUN_LOG_PATH
+from stats import load_scans
+
+ATTACK_POLICY_PATH = '../model/attack_policy.json'
+# 'learned' decides on the expected loot per second of the fitted policy when ATTACK_POLICY_PATH exists, 'thresholds'
+# always uses the fixed resource and defence thresholds
+ATTACK_POLICY = 'learned'
+# Lower edges of the defence count buckets the looted share of resources is estimated for
+DEFENCE_BUCKETS = [0, 3, 5, 8, 12]
+# Weight, in attacks, of the overall looted share in the estimate of every bucket, so sparse buckets stay sensible
+EFFICIENCY_PRIOR_WEIGHT = 5
+# Seconds a skipped and an attacked enemy cost until the next enemy is scanned, used until enough runs are logged
+DEFAULT_SKIP_SECONDS = 8
+DEFAULT_ATTACK_SECONDS = 90
+MIN_TIMED_ENEMIES = 20
+LOOT_RATE_ITERATIONS = 50
+
+attack_policy = None
+attack_policy_loaded = False
+
+
+def cost_seconds(scans):
+    """
+    Measures the time a skipped and an attacked enemy cost, from the uptime between consecutive enemies of a run.
+
+    Params:
+        scans (dict): Columns returned by stats.load_scans
+
+    Returns:
+        A tuple (skip_seconds, attack_seconds) containing the median cost of each choice, the defaults if too few
+        enemies were logged
+    """
+    same_run = scans['run_index'][1:] == scans['run_index'][:-1]
+    deltas = np.diff(scans['uptime'])[same_run]
+    attacked = scans['is_worth'][:-1][same_run]
+    skips, attacks = deltas[~attacked], deltas[attacked]
+    skip_seconds = float(np.median(skips)) if len(skips) >= MIN_TIMED_ENEMIES else DEFAULT_SKIP_SECONDS
+    attack_seconds = float(np.median(attacks)) if len(attacks) >= MIN_TIMED_ENEMIES else DEFAULT_ATTACK_SECONDS
+    return skip_seconds, attack_seconds
+
+
+class AttackPolicy:
+    """
+    Decides whether to attack an enemy by the loot it's expected to bring compared with the time it costs. The share
+    of an enemy's resources that gets looted is estimated per defence count bucket and base position from the logged
+    attacks, and the policy attacks when the expected loot is worth more than the extra time of an attack at the best
+    loot rate achievable over the scanned enemies: the threshold maximizing loot per second of the whole loop rather
+    than loot per attack. Defences that were never attacked are assumed to be as bad as the worst attacked ones.
+    """
+
+    def __init__(self, efficiencies, overall_efficiency, skip_seconds, attack_seconds, loot_rate, fitted_on=None):
+        """
+        Params:
+            efficiencies (list): Looted share of resources per defence bucket, [not on edge, on edge] for each
+            overall_efficiency (float): Looted share of resources over all attacks, used without defence features
+            skip_seconds (float): Seconds a skipped enemy costs
+            attack_seconds (float): Seconds an attacked enemy costs, including troop training and the next search
+            loot_rate (float): Loot per second of the loop when following the policy
+            fitted_on (dict | None): Description of the data the policy was fitted on
+        """
+        self.efficiencies = np.array(efficiencies, dtype=np.float64)
+        self.overall_efficiency = overall_efficiency
+        self.skip_seconds = skip_seconds
+        self.attack_seconds = attack_seconds
+        self.loot_rate = loot_rate
+        self.fitted_on = fitted_on or {}
+
+    @property
+    def loot_threshold(self):
+        """
+        Expected loot above which attacking is worth the extra time it takes over skipping.
+        """
+        return self.loot_rate * (self.attack_seconds - self.skip_seconds)
+
+    @classmethod
+    def fit(cls, scans):
+        """
+        Fits the policy on logged runs.
+
+        Params:
+            scans (dict): Columns returned by stats.load_scans
+
+        Returns:
+            AttackPolicy: The fitted policy
+        """
+        resources = np.nan_to_num(scans['gold_value']) + np.nan_to_num(scans['mineral_value'])
+        loot = np.nan_to_num(scans['loot_gold_value']) + np.nan_to_num(scans['loot_mineral_value'])
+        # Attacks whose loot couldn't be read say nothing about the looted share
+        attacked = scans['is_worth'] & (resources > 0) & loot_read(scans)
+        shares = np.clip(loot[attacked] / resources[attacked], 0, 1)
+        overall_efficiency = float(shares.mean()) if shares.size else 0.0
+
+        efficiencies = np.full((len(DEFENCE_BUCKETS), 2), overall_efficiency)
+        counts = np.zeros(efficiencies.shape, dtype=np.int64)
+        known = ~np.isnan(scans['defences'][attacked])
+        buckets = defence_bucket(scans['defences'][attacked][known])
+        on_edge = scans['base_on_edge'][attacked][known] > 0
+        for bucket in range(len(DEFENCE_BUCKETS)):
+            for edge in (0, 1):
+                cell = shares[known][(buckets == bucket) & (on_edge == edge)]
+                counts[bucket, edge] = cell.size
+                efficiencies[bucket, edge] = (cell.sum() + EFFICIENCY_PRIOR_WEIGHT * overall_efficiency) \
+                    / (cell.size + EFFICIENCY_PRIOR_WEIGHT)
+        # Defences that were never attacked are assumed to be as bad as the worst attacked ones, not average
+        if counts.any():
+            efficiencies[counts == 0] = efficiencies[counts > 0].min()
+
+        skip_seconds, attack_seconds = cost_seconds(scans)
+        policy = cls(efficiencies, overall_efficiency, skip_seconds, attack_seconds, 0.0, {
+            'runs': len(scans['runs']), 'scans': len(resources), 'attacks': int(attacked.sum()),
+            'attacks_with_defences': int(known.sum()), 'fitted_at': datetime.now().isoformat(timespec='seconds')})
+        policy.loot_rate = optimal_loot_rate(policy.expected_loot(scans), skip_seconds, attack_seconds)
+        return policy
+
+    def expected_loot(self, scans):
+        """
+        Estimates the loot of attacking enemies.
+
+        Params:
+            scans (dict): Columns 'gold_value', 'mineral_value', 'defences' and 'base_on_edge'; defence features may be
+                NaN when the detector didn't run
+
+        Returns:
+            numpy.ndarray: Expected loot of every enemy
+        """
+        resources = np.nan_to_num(scans['gold_value']) + np.nan_to_num(scans['mineral_value'])
+        defences = np.asarray(scans['defences'], dtype=np.float64)
+        known = ~np.isnan(defences)
+        shares = np.full(resources.shape, self.overall_efficiency)
+        shares[known] = self.efficiencies[defence_bucket(defences[known]),
+                                          (np.asarray(scans['base_on_edge'])[known] > 0).astype(np.int64)]
+        return shares * resources
+
+    def worth_detecting(self, gold_value, mineral_value):
+        """
+        Tells whether the defences of an enemy can make it worth attacking, i.e. whether running the detector on it
+        can change the decision.
+
+        Params:
+            gold_value (int): Gold of the enemy
+            mineral_value (int): Minerals of the enemy
+
+        Returns:
+            bool: False if the enemy isn't worth attacking even with the most favourable defences
+        """
+        return bool(self.efficiencies.max() * (gold_value + mineral_value) >= self.loot_threshold)
+
+    def decide(self, gold_value, mineral_value, defences, base_on_edge):
+        """
+        Decides whether to attack an enemy.
+
+        Params:
+            gold_value (int): Gold of the enemy
+            mineral_value (int): Minerals of the enemy
+            defences (int | None): Number of detected defences, None if the detector didn't run
+            base_on_edge (bool | None): True if the base is on the edge of its defences
+
+        Returns:
+            A tuple (attack, expected_loot) containing:
+            - attack (bool): True if the enemy is worth attacking
+            - expected_loot (float): Expected loot of attacking it
+        """
+        expected_loot = float(self.expected_loot({
+            'gold_value': np.array([gold_value], dtype=np.float64),
+            'mineral_value': np.array([mineral_value], dtype=np.float64),
+            'defences': np.array([np.nan if defences is None else defences]),
+            'base_on_edge': np.array([bool(base_on_edge)]),
+        })[0])
+        return bool(expected_loot >= self.loot_threshold), expected_loot
+
+    def save(self, path=ATTACK_POLICY_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({'efficiencies': self.efficiencies.tolist(), 'overall_efficiency': self.overall_efficiency,
+                       'skip_seconds': self.skip_seconds, 'attack_seconds': self.attack_seconds,
+                       'loot_rate': self.loot_rate, 'fitted_on': self.fitted_on}, f, indent=2)
+
+    @classmethod
+    def load(cls, path=ATTACK_POLICY_PATH):
+        with open(path) as f:
+            return cls(**json.load(f))
+
+    def summary(self):
+        return f"Attack policy: attack above {self.loot_threshold:,.0f} expected loot " \
+               f"({self.loot_rate * 3600:,.0f} loot/h, {self.skip_seconds:.1f}s per skip, " \
+               f"{self.attack_seconds:.1f}s per attack), looted share {self.overall_efficiency:.2%} overall"
+
+
+def get_attack_policy():
+    """
+    Returns the fitted policy, loading it on first use.
+
+    Returns:
+        AttackPolicy | None: The policy, None if ATTACK_POLICY is 'thresholds' or no policy has been fitted
+    """
+    global attack_policy, attack_policy_loaded
+    if not attack_policy_loaded:
+        attack_policy_loaded = True
+        if ATTACK_POLICY == 'learned' and os.path.exists(ATTACK_POLICY_PATH):
+            attack_policy = AttackPolicy.load(ATTACK_POLICY_PATH)
+            logging.info(attack_policy.summary())
+        else:
+            logging.info(f"No attack policy at {ATTACK_POLICY_PATH} or learned policy disabled, "
+                         f"using the fixed thresholds")
+    return attack_policy
+
+
+def defence_bucket(defences):
+    """
+    Returns the index of the DEFENCE_BUCKETS bucket of every defence count.
+    """
+    return np.searchsorted(DEFENCE_BUCKETS, defences, side='right') - 1
+
+
+def optimal_loot_rate(expected_loot, skip_seconds, attack_seconds):
+    """
+    Finds the loot per second of attacking every enemy whose expected loot is worth the extra time of an attack at
+    that same rate, by fixed-point iteration (Dinkelbach's method), which converges to the best achievable rate.
+
+    Params:
+        expected_loot (numpy.ndarray): Expected loot of the scanned enemies
+        skip_seconds (float): Seconds a skipped enemy costs
+        attack_seconds (float): Seconds an attacked enemy costs
+
+    Returns:
+        float: The loot per second
+    """
+    rate = 0.0
+    for _ in range(LOOT_RATE_ITERATIONS):
+        attack = expected_loot > rate * (attack_seconds - skip_seconds)
+        new_rate = throughput(expected_loot, attack, skip_seconds, attack_seconds)
+        if np.isclose(new_rate, rate):
+            break
+        rate = new_rate
+    return rate
+
+
+def loot_read(scans):
+    """
+    Returns:
+        numpy.ndarray: True for every enemy whose loot was read, i.e. every skipped one and the attacked ones whose
+            loot reading didn't fail
+    """
+    return ~np.isnan(scans['loot_gold_value']) & ~np.isnan(scans['loot_mineral_value'])
+
+
+def throughput(loot, attack, skip_seconds, attack_seconds):
+    """
+    Returns the loot per second of a sequence of decisions.
+    """
+    seconds = np.where(attack, attack_seconds, skip_seconds).sum()
+    return float(loot[attack].sum() / seconds) if seconds > 0 else 0.0
+
+
+def threshold_decisions(scans, thresholds):
+    """
+    Replays the fixed thresholds on logged enemies. Enemies passing the resource thresholds without logged defence
+    features keep their logged decision.
+
+    Params:
+        scans (dict): Columns returned by stats.load_scans
+        thresholds (tuple): (gold value, mineral value, defensive buildings amount) thresholds
+
+    Returns:
+        numpy.ndarray: True for every enemy the thresholds attack
+    """
+    gold_threshold, mineral_threshold, defences_threshold = thresholds
+    resources_pass = (np.nan_to_num(scans['gold_value']) > gold_threshold) \
+        & (np.nan_to_num(scans['mineral_value']) > mineral_threshold)
+    defences = scans['defences']
+    defences_pass = np.where(np.isnan(defences), scans['is_worth'],
+                             (np.nan_to_num(defences) < defences_threshold) | (scans['base_on_edge'] > 0))
+    return resources_pass & defences_pass
+
+
+def select_runs(scans, mask):
+    """
+    Returns the columns of the enemies of the selected runs.
+    """
+    selected = mask[scans['run_index']]
+    columns = {name: values[selected] for name, values in scans.items() if name not in ('runs', 'run_index')}
+    runs, columns['run_index'] = np.unique(scans['run_index'][selected], return_inverse=True)
+    columns['runs'] = scans['runs'][runs]
+    return columns
+
+
+def evaluate(scans, thresholds, test_runs):
+    """
+    Fits the policy on all but the last runs and compares its loot per hour with the fixed thresholds on the last
+    ones. Both are only scored on realized outcomes: skipping any enemy realizes no loot and attacking an enemy
+    realizes the logged loot, so enemies that either would attack but that weren't attacked, or whose loot couldn't be
+    read, have no realized outcome and are left out of the comparison. The comparison is conservative for the policy
+    that attacks more of the enemies that were skipped.
+
+    Params:
+        scans (dict): Columns returned by stats.load_scans
+        thresholds (tuple): (gold value, mineral value, defensive buildings amount) thresholds
+        test_runs (int): Number of last runs held out for the evaluation
+
+    Returns:
+        dict: The evaluation results
+    """
+    run_count = len(scans['runs'])
+    test_mask = np.arange(run_count) >= run_count - test_runs
+    if test_mask.all():
+        logging.warning("Not enough runs to hold some out, the policy is evaluated on the runs it was fitted on")
+        train = test = scans
+    else:
+        train, test = select_runs(scans, ~test_mask), select_runs(scans, test_mask)
+
+    policy = AttackPolicy.fit(train)
+    realized = test['is_worth'] & loot_read(test)
+    loot = np.where(realized, np.nan_to_num(test['loot_gold_value']) + np.nan_to_num(test['loot_mineral_value']), 0.0)
+
+    fixed = threshold_decisions(test, thresholds)
+    learned = policy.expected_loot(test) >= policy.loot_threshold
+    scored = (realized | ~fixed) & (realized | ~learned)
+    fixed_rate = throughput(loot[scored], fixed[scored], policy.skip_seconds, policy.attack_seconds)
+    learned_rate = throughput(loot[scored], learned[scored], policy.skip_seconds, policy.attack_seconds)
+    return {
+        'policy': policy,
+        'runs': len(test['runs']),
+        'scans': len(loot),
+        'scored': int(scored.sum()),
+        'fixed_without_outcome': int((fixed & ~realized).sum()),
+        'learned_without_outcome': int((learned & ~realized).sum()),
+        'without_defences': int(np.isnan(test['defences']).sum()),
+        'fixed_attacks': int(fixed[scored].sum()),
+        'learned_attacks': int(learned[scored].sum()),
+        'changed': int((fixed != learned)[scored].sum()),
+        'fixed_loot_per_hour': fixed_rate * 3600,
+        'learned_loot_per_hour': learned_rate * 3600,
+        'gain': learned_rate / fixed_rate - 1 if fixed_rate > 0 else np.nan,
+    }
+
+
+def print_evaluation(evaluation):
+    print(evaluation['policy'].summary())
+    print(f"Evaluated on {evaluation['runs']} runs, {evaluation['scans']} enemies "
+          f"({evaluation['without_defences']} without defence features, scored by resources only)")
+    print(f"Scored on the {evaluation['scored']} enemies with a realized outcome for both; attacks without one: "
+          f"{evaluation['fixed_without_outcome']} by the fixed thresholds, "
+          f"{evaluation['learned_without_outcome']} by the learned policy")
+    print(f"Fixed thresholds: {evaluation['fixed_attacks']} attacks, "
+          f"{evaluation['fixed_loot_per_hour']:,.0f} loot/h")
+    print(f"Learned policy: {evaluation['learned_attacks']} attacks, "
+          f"{evaluation['learned_loot_per_hour']:,.0f} loot/h")
+    print(f"Throughput gain: {evaluation['gain']:+.1%}, {evaluation['changed']} decisions changed")
+
+
+if __name__ == '__main__':
+    from image_processing import GOLD_VALUE_THRESHOLD, MINERAL_VALUE_THRESHOLD, DEFENSIVE_BUILDINGS_AMOUNT_THRESHOLD
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Fit the attack policy on the run log, or evaluate it offline "
+                                                 "against the fixed thresholds.")
+    parser.add_argument('command', choices=['fit', 'evaluate'])
+    parser.add_argument('--path', default=RUN_LOG_PATH, help="path to the run log database")
+    parser.add_argument('--test-runs', type=int, default=1, help="last runs held out for the evaluation")
+    args = parser.parse_args()
+
+    all_scans = load_scans(args.path)
+    if all_scans is None:
+        print("No scans logged yet.")
+    elif args.command == 'fit':
+        fitted_policy = AttackPolicy.fit(all_scans)
+        fitted_policy.save()
+        print(f"{fitted_policy.summary()}\nSaved to {ATTACK_POLICY_PATH}")
+    else:
+        print_evaluation(evaluate(all_scans, (GOLD_VALUE_THRESHOLD, MINERAL_VALUE_THRESHOLD,
+                                              DEFENSIVE_BUILDINGS_AMOUNT_THRESHOLD), args.test_runs))
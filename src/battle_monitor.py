@@ -0,0 +1,114 @@
+import logging
+import time
+
+import numpy as np
+
+from image_processing import grab_region, read_resource_values, split_region_of_interest, SCAN_WINDOW_DATA
+from utils import BATTLE_END_SCREEN
+
+# During a battle the enemy's resource counters stay where they were shown while scanning and go down as it's looted.
+# The first battle checks that both halves of the region read as numbers and warns otherwise
+BATTLE_LOOT_WINDOW_DATA = SCAN_WINDOW_DATA
+BATTLE_TIMEOUT = 50
+BATTLE_MIN_DURATION = 10
+BATTLE_SAMPLE_INTERVAL = 1
+# Seconds the loot counters have to stay the same after they first changed for the battle to be considered over
+BATTLE_STABLE_DURATION = 6
+# Seconds after which a battle whose loot counters never changed is considered over, nothing is being looted
+BATTLE_NO_LOOT_TIMEOUT = 30
+# Mean absolute difference of grayscale pixels above which the loot counters are considered changed
+BATTLE_LOOT_CHANGE_THRESHOLD = 2.0
+
+
+class BattleMonitor:
+    """
+    Watches a running battle and reports its end as soon as the loot counters stop changing, the battle end screen
+    shows up or the timeout passes. Keeps the duration of every monitored battle and the number of battles in which
+    the loot counters never changed.
+    """
+
+    def __init__(self, timeout=BATTLE_TIMEOUT):
+        self.timeout = timeout
+        self.durations = []
+        self.without_loot = 0
+        self.region_checked = False
+
+    def check_loot_region(self, loot):
+        """
+        Warns when the loot region doesn't show the two resource counters, in which case battles only end on the
+        battle end screen or after BATTLE_NO_LOOT_TIMEOUT.
+
+        Params:
+            loot (numpy.ndarray): The grayscale loot region at the start of the battle
+        """
+        self.region_checked = True
+        try:
+            values = [read_resource_values(half) for half in split_region_of_interest(loot, 'horizontal')]
+        except Exception as e:
+            logging.warning(f"Couldn't read the loot counters in BATTLE_LOOT_WINDOW_DATA: {e}")
+            return
+        if not all(values):
+            logging.warning(f"BATTLE_LOOT_WINDOW_DATA {BATTLE_LOOT_WINDOW_DATA} doesn't show the loot counters "
+                            f"(read {values}), battles will only end on the battle end screen or after "
+                            f"{BATTLE_NO_LOOT_TIMEOUT}s")
+
+    def wait_for_battle_end(self):
+        """
+        Waits until the battle is over.
+
+        Returns:
+            float: The number of seconds the battle took
+        """
+        start = time.monotonic()
+        deadline = start + self.timeout
+        loot = grab_region(BATTLE_LOOT_WINDOW_DATA)
+        if not self.region_checked:
+            self.check_loot_region(loot)
+        previous_loot = loot.astype(np.int16)
+        # None until the counters change for the first time, so a battle can't end before anything was looted
+        last_change = None
+        reason = "timeout"
+
+        while time.monotonic() < deadline:
+            time.sleep(min(BATTLE_SAMPLE_INTERVAL, max(deadline - time.monotonic(), 0)))
+            now = time.monotonic()
+
+            loot = grab_region(BATTLE_LOOT_WINDOW_DATA).astype(np.int16)
+            if np.abs(loot - previous_loot).mean() > BATTLE_LOOT_CHANGE_THRESHOLD:
+                last_change = now
+            previous_loot = loot
+
+            if BATTLE_END_SCREEN.is_visible():
+                reason = "battle end screen"
+                break
+            if last_change is None:
+                if now - start >= BATTLE_NO_LOOT_TIMEOUT:
+                    reason = "nothing looted"
+                    break
+            elif now - start >= BATTLE_MIN_DURATION and now - last_change >= BATTLE_STABLE_DURATION:
+                reason = "loot stopped changing"
+                break
+
+        duration = time.monotonic() - start
+        self.durations.append(duration)
+        if last_change is None:
+            self.without_loot += 1
+        logging.info(f"Battle ended after {duration:.1f}s ({reason}), {self.summary()}")
+        return duration
+
+    def summary(self):
+        """
+        Summarises the monitored battles.
+
+        Returns:
+            str: Number of battles, their average duration, the time saved compared to always waiting the timeout and
+            the number of battles without any loot counter change
+        """
+        if not self.durations:
+            return "no battles monitored"
+        saved = sum(self.timeout - duration for duration in self.durations)
+        return (f"{len(self.durations)} battles, average {np.mean(self.durations):.1f}s, "
+                f"{saved:.0f}s saved over {self.timeout}s waits, {self.without_loot} without loot change")
+
+
+battle_monitor = BattleMonitor()
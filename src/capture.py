@@ -0,0 +1,217 @@
+import logging
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from frame import Frame
+
+try:
+    import mss
+except ImportError:
+    mss = None
+
+
+class CaptureBackend:
+    """
+    Grabs a region of the screen, or the full screen, as BGR pixels into a caller provided buffer.
+    """
+
+    def screen_size(self):
+        """
+        Returns:
+            tuple: (width, height) of the screen
+        """
+        raise NotImplementedError
+
+    def grab(self, window_data, out):
+        """
+        Captures a region of the screen into a buffer.
+
+        Params:
+            window_data (tuple): A tuple (x, y, width, height) describing the region
+            out (numpy.ndarray): A height x width x 3 uint8 buffer to write the BGR pixels into
+
+        Returns:
+            numpy.ndarray: The filled buffer
+        """
+        raise NotImplementedError
+
+
+class MssCaptureBackend(CaptureBackend):
+    """
+    Captures the screen through mss, which reads only the requested region straight from the display server.
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def get_mss(self):
+        # mss handles can't be shared between threads
+        if not hasattr(self.local, 'sct'):
+            self.local.sct = mss.mss()
+        return self.local.sct
+
+    def screen_size(self):
+        monitor = self.get_mss().monitors[1]
+        return monitor['width'], monitor['height']
+
+    def grab(self, window_data, out):
+        x, y, width, height = window_data
+        shot = self.get_mss().grab({'left': x, 'top': y, 'width': width, 'height': height})
+        bgra = np.frombuffer(shot.raw, dtype=np.uint8).reshape(height, width, 4)
+        return cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR, dst=out)
+
+
+class PyAutoGuiCaptureBackend(CaptureBackend):
+    """
+    Captures the screen through pyautogui, used when mss isn't installed.
+    """
+
+    def __init__(self):
+        import pyautogui
+        self.pyautogui = pyautogui
+
+    def screen_size(self):
+        return tuple(self.pyautogui.size())
+
+    def grab(self, window_data, out):
+        screenshot = self.pyautogui.screenshot(region=tuple(window_data))
+        if screenshot.mode != 'RGB':
+            screenshot = screenshot.convert('RGB')
+        return cv2.cvtColor(np.asarray(screenshot), cv2.COLOR_RGB2BGR, dst=out)
+
+
+class FakeCaptureBackend(CaptureBackend):
+    """
+    Serves screens from image files instead of the display, so capturing can be exercised headless. The current image
+    stays on screen until `advance` is called.
+    """
+
+    def __init__(self, image_paths):
+        self.image_paths = list(image_paths)
+        self.index = -1
+        self.image = None
+        self.advance()
+
+    @classmethod
+    def from_directory(cls, directory, extensions=('.png', '.jpg', '.jpeg', '.webp')):
+        """
+        Creates a backend serving every image of a directory in name order.
+
+        Params:
+            directory (str): The directory containing the images
+            extensions (tuple): Extensions of the files treated as images
+
+        Returns:
+            FakeCaptureBackend: The backend
+        """
+        names = sorted(name for name in os.listdir(directory) if name.lower().endswith(extensions))
+        return cls(os.path.join(directory, name) for name in names)
+
+    def advance(self):
+        """
+        Moves to the next image.
+
+        Returns:
+            bool: True if there was a next image, False if all images have been served
+        """
+        if self.index + 1 >= len(self.image_paths):
+            return False
+        self.index += 1
+        self.image = cv2.imread(self.image_paths[self.index], cv2.IMREAD_COLOR)
+        if self.image is None:
+            raise FileNotFoundError(f"Image not found at {self.image_paths[self.index]}")
+        return True
+
+    @property
+    def current_path(self):
+        return self.image_paths[self.index]
+
+    def screen_size(self):
+        return self.image.shape[1], self.image.shape[0]
+
+    def grab(self, window_data, out):
+        # Parts of the region outside of the image, e.g. when it's smaller than the screen, are black
+        x, y, width, height = window_data
+        region = self.image[y:y + height, x:x + width]
+        if region.shape != out.shape:
+            out.fill(0)
+        out[:region.shape[0], :region.shape[1]] = region
+        return out
+
+
+capture_backend = None
+region_buffers = {}
+
+
+def get_capture_backend():
+    """
+    Returns the capture backend, picking mss if it is installed and pyautogui otherwise.
+
+    Returns:
+        CaptureBackend: The capture backend in use
+    """
+    global capture_backend
+    if capture_backend is None:
+        capture_backend = MssCaptureBackend() if mss is not None else PyAutoGuiCaptureBackend()
+        logging.info(f"Using {type(capture_backend).__name__} for screen capture")
+    return capture_backend
+
+
+def set_capture_backend(backend):
+    """
+    Replaces the capture backend, e.g. with a FakeCaptureBackend.
+
+    Params:
+        backend (CaptureBackend): The capture backend to use
+    """
+    global capture_backend
+    capture_backend = backend
+    region_buffers.clear()
+
+
+def full_screen_window_data():
+    """
+    Returns:
+        list: Window data [0, 0, width, height] covering the whole screen
+    """
+    width, height = get_capture_backend().screen_size()
+    return [0, 0, width, height]
+
+
+def capture_frame(window_data=None):
+    """
+    Captures a region of the screen, or the full screen, into a new frame.
+
+    Params:
+        window_data (tuple | None): A tuple (x, y, width, height) describing the region, None for the full screen
+
+    Returns:
+        Frame: The captured frame
+    """
+    full_screen = window_data is None
+    if full_screen:
+        window_data = full_screen_window_data()
+    pixels = np.empty((window_data[3], window_data[2], 3), dtype=np.uint8)
+    get_capture_backend().grab(window_data, pixels)
+    return Frame(pixels, window_data=None if full_screen else list(window_data))
+
+
+def grab_region_into_buffer(window_data):
+    """
+    Captures a region of the screen into a buffer reused between calls with the same region size. The returned pixels
+    are overwritten by the next capture of a region of that size, so they have to be consumed right away.
+
+    Params:
+        window_data (tuple): A tuple (x, y, width, height) describing the region
+
+    Returns:
+        numpy.ndarray: The BGR pixels of the region
+    """
+    shape = (window_data[3], window_data[2], 3)
+    buffer = region_buffers.get((threading.get_ident(), shape))
+    if buffer is None:
+        buffer = region_buffers[(threading.get_ident(), shape)] = np.empty(shape, dtype=np.uint8)
+    return get_capture_backend().grab(window_data, buffer)
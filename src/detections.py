@@ -0,0 +1,125 @@
+import numpy as np
+
+BASE_CLASS_ID = 7
+
+
+class Detections:
+    """
+    Detections of a single frame stored as arrays: boxes (N x 4, x1 y1 x2 y2), scores (N) and class ids (N).
+    """
+
+    def __init__(self, boxes, scores, classes, names=None):
+        self.boxes = boxes
+        self.scores = scores
+        self.classes = classes
+        self.names = names or {}
+
+    @classmethod
+    def from_results(cls, results):
+        """
+        Builds detections straight from the YOLO results tensor.
+
+        Params:
+            results: Detection results from the YOLO model
+
+        Returns:
+            Detections: The detections of the frame
+        """
+        return cls.from_array(results.boxes.data.cpu().numpy(), results.names)
+
+    @classmethod
+    def from_array(cls, data, names=None):
+        """
+        Builds detections from an N x 6 array of x1, y1, x2, y2, score, class id rows.
+
+        Params:
+            data (numpy.ndarray): The detections array
+            names (dict | None): Class id to class name
+
+        Returns:
+            Detections: The detections of the frame
+        """
+        return cls(data[:, :4], data[:, 4], data[:, 5].astype(np.int64), names)
+
+    def to_array(self):
+        """
+        Returns:
+            numpy.ndarray: The detections as an N x 6 array, see from_array
+        """
+        return np.column_stack([self.boxes, self.scores, self.classes]).astype(np.float32)
+
+    def __len__(self):
+        return len(self.scores)
+
+    def filter(self, min_score):
+        """
+        Returns only detections scored above a given threshold.
+
+        Params:
+            min_score (float): Minimal score of a kept detection
+
+        Returns:
+            Detections: The filtered detections
+        """
+        mask = self.scores > min_score
+        return Detections(self.boxes[mask], self.scores[mask], self.classes[mask], self.names)
+
+    def offset(self, dx, dy):
+        """
+        Returns the detections moved by an offset, e.g. from the coordinates of a cropped region to the screen.
+
+        Params:
+            dx (int): Horizontal offset
+            dy (int): Vertical offset
+
+        Returns:
+            Detections: The moved detections
+        """
+        return Detections(self.boxes + np.array([dx, dy, dx, dy], dtype=self.boxes.dtype), self.scores, self.classes,
+                          self.names)
+
+    @property
+    def base_box(self):
+        """
+        numpy.ndarray | None: Box of the highest scored base (class 7), None if the base wasn't detected.
+        """
+        base_indices = np.flatnonzero(self.classes == BASE_CLASS_ID)
+        if base_indices.size == 0:
+            return None
+        return self.boxes[base_indices[np.argmax(self.scores[base_indices])]]
+
+    def encompassing_rectangle(self):
+        """
+        Calculates the rectangle encompassing all detections.
+
+        Returns:
+            numpy.ndarray | None: (min x1, max x2, min y1, max y2) of all boxes, None if there are no detections
+        """
+        if len(self) == 0:
+            return None
+        return np.array([self.boxes[:, 0].min(), self.boxes[:, 2].max(),
+                         self.boxes[:, 1].min(), self.boxes[:, 3].max()])
+
+    def label(self, index):
+        """
+        Returns the class name of a detection.
+
+        Params:
+            index (int): Index of the detection
+
+        Returns:
+            str: The class name
+        """
+        return self.names.get(int(self.classes[index]), str(self.classes[index]))
+
+    def to_text(self):
+        """
+        Formats the detections the same way the detection results files have always been written.
+
+        Returns:
+            str: The formatted detections
+        """
+        lines = [f"Total detected boxes: {len(self)}", "Detected boxes and their scores:"]
+        for (x1, y1, x2, y2), score, class_id in zip(self.boxes.tolist(), self.scores.tolist(), self.classes.tolist()):
+            lines.append(f"{class_id},{score},{x1},{y1},{x2},{y2}")
+        return "\n".join(lines) + "\n"
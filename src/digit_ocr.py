@@ -0,0 +1,283 @@
+import argparse
+import logging
+import os
+import time
+import zlib
+
+import cv2
+import numpy as np
+
+DIGIT_TEMPLATES_PATH = '../model/digits/digit_templates.npz'
+OCR_CROPS_DIRECTORY = '../logs/ocr_crops'
+DIGIT_TEMPLATE_SIZE = (12, 18)
+DIGIT_CONFIDENCE_THRESHOLD = 0.85
+# Components lower than this part of the tallest one are separators or noise, not digits
+MIN_GLYPH_HEIGHT_RATIO = 0.6
+# Part of the crops held out from building the templates, the report only scores these
+DIGIT_HOLDOUT_FRACTION = 0.2
+
+
+def binarize(region_of_interest):
+    """
+    Binarizes a grayscale region with Otsu's threshold so that the glyphs are white on black.
+
+    Params:
+        region_of_interest (numpy.ndarray): The grayscale region
+
+    Returns:
+        numpy.ndarray: The binary region
+    """
+    _, binary = cv2.threshold(region_of_interest, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    if np.count_nonzero(binary) > binary.size // 2:
+        binary = cv2.bitwise_not(binary)
+    return binary
+
+
+def normalize_glyph(glyph):
+    """
+    Resizes a binary glyph to the template size and normalizes it to zero mean and unit length.
+
+    Params:
+        glyph (numpy.ndarray): The binary glyph
+
+    Returns:
+        numpy.ndarray: The flattened, normalized glyph
+    """
+    vector = cv2.resize(glyph, DIGIT_TEMPLATE_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32).ravel()
+    vector -= vector.mean()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def segment_glyphs(region_of_interest):
+    """
+    Splits a grayscale region into glyphs ordered from left to right.
+
+    Params:
+        region_of_interest (numpy.ndarray): The grayscale region
+
+    Returns:
+        numpy.ndarray: A (glyphs x template pixels) array of normalized glyphs
+    """
+    binary = binarize(region_of_interest)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    boxes = stats[1:, :4]
+    if len(boxes) == 0:
+        return np.empty((0, DIGIT_TEMPLATE_SIZE[0] * DIGIT_TEMPLATE_SIZE[1]), dtype=np.float32)
+
+    boxes = boxes[boxes[:, 3] >= MIN_GLYPH_HEIGHT_RATIO * boxes[:, 3].max()]
+    boxes = boxes[np.argsort(boxes[:, 0])]
+    return np.stack([normalize_glyph(binary[y:y + height, x:x + width]) for x, y, width, height in boxes])
+
+
+class DigitRecognizer:
+    """
+    Reads numbers rendered in the game's fixed font by matching segmented glyphs against one template per digit.
+    Templates are built from crops labeled by EasyOCR with `python digit_ocr.py build`.
+    """
+
+    def __init__(self, templates_path=DIGIT_TEMPLATES_PATH):
+        self.templates_path = templates_path
+        self.templates = None
+        self.templates_loaded = False
+
+    def load_templates(self):
+        """
+        Loads the digit templates on first use.
+
+        Returns:
+            numpy.ndarray | None: A (10 x template pixels) array of templates, None if they haven't been built
+        """
+        if not self.templates_loaded:
+            self.templates_loaded = True
+            if os.path.exists(self.templates_path):
+                self.templates = np.load(self.templates_path)['templates']
+            else:
+                logging.info(f"No digit templates at {self.templates_path}, using EasyOCR only")
+        return self.templates
+
+    def recognize(self, region_of_interest):
+        """
+        Reads a number from a grayscale region.
+
+        Params:
+            region_of_interest (numpy.ndarray): The grayscale region
+
+        Returns:
+            A tuple (value, confidence) containing:
+            - value (str): The recognized digits
+            - confidence (float): Correlation of the worst matching glyph with its template, 0 if nothing was read
+        """
+        templates = self.load_templates()
+        if templates is None:
+            return '', 0.0
+
+        glyphs = segment_glyphs(region_of_interest)
+        if len(glyphs) == 0:
+            return '', 0.0
+
+        scores = glyphs @ templates.T
+        digits = scores.argmax(axis=1)
+        confidence = float(scores[np.arange(len(digits)), digits].min())
+        return ''.join(map(str, digits)), confidence
+
+
+def build_templates(crops, labels):
+    """
+    Builds digit templates by averaging glyphs of crops whose glyph count matches their label.
+
+    Params:
+        crops (list): Grayscale crops
+        labels (list): Values read from the crops by EasyOCR
+
+    Returns:
+        A tuple (templates, counts) containing:
+        - templates (numpy.ndarray): A (10 x template pixels) array of templates
+        - counts (numpy.ndarray): Number of glyphs averaged into each template
+    """
+    sums = np.zeros((10, DIGIT_TEMPLATE_SIZE[0] * DIGIT_TEMPLATE_SIZE[1]), dtype=np.float32)
+    counts = np.zeros(10, dtype=np.int64)
+    for crop, label in zip(crops, labels):
+        glyphs = segment_glyphs(crop)
+        if not label or len(glyphs) != len(label):
+            continue
+        digits = np.array([int(digit) for digit in label])
+        np.add.at(sums, digits, glyphs)
+        np.add.at(counts, digits, 1)
+
+    norms = np.linalg.norm(sums, axis=1, keepdims=True)
+    templates = np.divide(sums, norms, out=np.zeros_like(sums), where=norms > 0)
+    return templates, counts
+
+
+def load_crops(directory):
+    """
+    Loads every grayscale crop of a directory.
+
+    Params:
+        directory (str): The directory containing the crops
+
+    Returns:
+        A tuple (names, crops) containing:
+        - names (list): File names of the crops
+        - crops (list): The grayscale crops
+    """
+    names = sorted(name for name in os.listdir(directory) if name.lower().endswith('.png'))
+    return names, [cv2.imread(os.path.join(directory, name), cv2.IMREAD_GRAYSCALE) for name in names]
+
+
+def split_crops(names, holdout_fraction=DIGIT_HOLDOUT_FRACTION):
+    """
+    Splits the crops into the ones the templates are built from and the held-out ones they are scored on. Crops are
+    assigned by a hash of the second they were saved in, so the split is the same on every run as the corpus grows,
+    and both counters of an enemy fall on the same side.
+
+    Params:
+        names (list): File names of the crops, starting with the time they were saved at
+        holdout_fraction (float): Part of the crops to hold out
+
+    Returns:
+        A tuple (training, held_out) containing:
+        - training (list): Indices of the crops to build the templates from
+        - held_out (list): Indices of the crops to score the templates on
+    """
+    training, held_out = [], []
+    for index, name in enumerate(names):
+        held = zlib.crc32(name[:15].encode()) % 1000 < holdout_fraction * 1000
+        (held_out if held else training).append(index)
+    return training, held_out
+
+
+def read_with_easyocr(crops):
+    """
+    Reads every crop with EasyOCR.
+
+    Params:
+        crops (list): Grayscale crops
+
+    Returns:
+        A tuple (labels, latencies) containing:
+        - labels (list): The digits read from each crop
+        - latencies (numpy.ndarray): Seconds spent on each crop
+    """
+    from model_registry import model_registry
+
+    reader = model_registry.get_reader()
+    labels, latencies = [], []
+    for crop in crops:
+        start = time.perf_counter()
+        result = reader.readtext(crop, detail=0)
+        latencies.append(time.perf_counter() - start)
+        labels.append(''.join(filter(str.isdigit, ''.join(result))))
+    return labels, np.array(latencies)
+
+
+def report(names, crops, labels, easyocr_latencies, recognizer):
+    """
+    Prints accuracy and latency of the digit recognizer compared to EasyOCR.
+
+    Params:
+        names (list): File names of the crops
+        crops (list): Grayscale crops
+        labels (list): Values read from the crops by EasyOCR
+        easyocr_latencies (numpy.ndarray): Seconds EasyOCR spent on each crop
+        recognizer (DigitRecognizer): The recognizer to evaluate
+    """
+    readings, confidences, latencies = [], [], []
+    for crop in crops:
+        start = time.perf_counter()
+        value, confidence = recognizer.recognize(crop)
+        latencies.append(time.perf_counter() - start)
+        readings.append(value)
+        confidences.append(confidence)
+
+    matches = np.array([value == label for value, label in zip(readings, labels)])
+    confident = np.array(confidences) >= DIGIT_CONFIDENCE_THRESHOLD
+    latencies = np.array(latencies)
+
+    print(f"Crops: {len(crops)}")
+    print(f"Agreement with EasyOCR: {matches.mean():.2%} of all crops, "
+          f"{matches[confident].mean() if confident.any() else 0:.2%} of confident crops")
+    print(f"Confident crops (no EasyOCR fallback): {confident.mean():.2%}")
+    for name, values in (("Digit recognizer", latencies), ("EasyOCR", easyocr_latencies)):
+        print(f"{name} latency: mean {values.mean() * 1000:.3f}ms, p50 {np.percentile(values, 50) * 1000:.3f}ms, "
+              f"p99 {np.percentile(values, 99) * 1000:.3f}ms")
+    for name, value, label, confidence in zip(names, readings, labels, confidences):
+        if value != label and confidence >= DIGIT_CONFIDENCE_THRESHOLD:
+            print(f"Confident mismatch on crop {name}: read {value!r}, EasyOCR read {label!r} ({confidence:.3f})")
+
+
+digit_recognizer = DigitRecognizer()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Build and evaluate the fixed-font digit recognizer.")
+    parser.add_argument('command', choices=['build', 'report'])
+    parser.add_argument('--crops', default=OCR_CROPS_DIRECTORY, help="directory of grayscale resource value crops")
+    parser.add_argument('--templates', default=DIGIT_TEMPLATES_PATH)
+    parser.add_argument('--holdout', type=float, default=DIGIT_HOLDOUT_FRACTION,
+                        help="part of the crops held out from building the templates and scored by the report")
+    args = parser.parse_args()
+
+    crop_names, crop_images = load_crops(args.crops)
+    training_crops, held_out_crops = split_crops(crop_names, args.holdout)
+    if not held_out_crops:
+        parser.error("no crops are held out for the report, collect more crops or raise --holdout")
+    # Only the crops a command uses are read with EasyOCR
+    used_crops = sorted(training_crops + held_out_crops) if args.command == 'build' else held_out_crops
+    easyocr_labels, easyocr_times = read_with_easyocr([crop_images[index] for index in used_crops])
+    labels = dict(zip(used_crops, easyocr_labels))
+    times = dict(zip(used_crops, easyocr_times))
+
+    if args.command == 'build':
+        digit_templates, digit_counts = build_templates([crop_images[index] for index in training_crops],
+                                                        [labels[index] for index in training_crops])
+        os.makedirs(os.path.dirname(args.templates), exist_ok=True)
+        np.savez(args.templates, templates=digit_templates, counts=digit_counts)
+        print(f"Templates built from {len(training_crops)} crops saved to {args.templates}, glyphs per digit: "
+              f"{digit_counts.tolist()}")
+    print("Held-out crops, not used to build the templates:")
+    report([crop_names[index] for index in held_out_crops], [crop_images[index] for index in held_out_crops],
+           [labels[index] for index in held_out_crops], np.array([times[index] for index in held_out_crops]),
+           DigitRecognizer(args.templates))
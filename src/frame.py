@@ -0,0 +1,60 @@
+from datetime import datetime
+
+import cv2
+
+
+class Frame:
+    """
+    A single captured screen, or a region of it, kept in memory as a BGR NumPy buffer. OCR, detection and annotation
+    all work on views of this buffer, so a screen is decoded only once per capture.
+    """
+
+    def __init__(self, pixels, timestamp=None, window_data=None):
+        self.pixels = pixels
+        self.timestamp = timestamp or datetime.now()
+        self.name = self.timestamp.strftime("%Y%m%d_%H%M%S")
+        self.window_data = window_data
+
+    @property
+    def is_full_screen(self):
+        """
+        bool: True if the frame covers the full screen, False if it only holds a region of it.
+        """
+        return self.window_data is None
+
+    def crop(self, window_data):
+        """
+        Returns a view of a region of the frame given in screen coordinates.
+
+        Params:
+            window_data (tuple): A tuple containing the window data consisting of:
+            - x (int): X-coordinate of the top-left corner
+            - y (int): Y-coordinate of the top-left corner
+            - width (int): Width of the region
+            - height (int): Height of the region
+
+        Returns:
+            numpy.ndarray: The view of the region
+        """
+        x, y, width, height = window_data
+        if self.window_data is not None:
+            x, y = x - self.window_data[0], y - self.window_data[1]
+        return self.pixels[y:y + height, x:x + width]
+
+    def copy_pixels(self):
+        """
+        Returns a copy of the frame buffer that can be drawn on without touching the frame itself.
+
+        Returns:
+            numpy.ndarray: The copied BGR buffer
+        """
+        return self.pixels.copy()
+
+    def save(self, path):
+        """
+        Writes the frame to disk.
+
+        Params:
+            path (str): Destination path, the extension selects the encoding
+        """
+        cv2.imwrite(path, self.pixels)
@@ -1,7 +1,22 @@
 from utils import ATTACK_BUTTON, FIND_TARGET_BUTTON, FIGHT_NOW_BUTTON, SPEED_UP_X2_BUTTON, END_BATTLE_BUTTON, \
     GO_HOME_BUTTON, TRAINING_CAMP_1_BUTTON, TRAINING_CAMP_2_BUTTON, ADD_LOOTERS_TO_TRAINING_LIST_BUTTON, \
     CHOOSE_LOOTER_UNIT_WHEN_ATTACKING_BUTTON, CLOSE_TRAINING_VIEW_BUTTON
+from utils import ATTACK_MENU_SCREEN, FIGHT_NOW_SCREEN, ENEMY_BASE_SCREEN, BATTLE_END_SCREEN, HOME_BASE_SCREEN
 from utils import click_and_wait, get_screenshot
+from image_processing import ATTACK_WINDOW_DATA
+from battle_monitor import battle_monitor
+from input_dispatcher import input_dispatcher
+
+DEPLOY_COORDINATES = [
+    (1460, 290), (1695, 435), (1870, 525), (1980, 590), (2090, 620),
+    (2210, 685), (2340, 800), (2210, 870), (2060, 955), (1915, 1030),
+    (1800, 1090), (1650, 1150), (1420, 1230), (1135, 1220), (855, 1160),
+    (600, 1055), (490, 930), (445, 740), (480, 620), (630, 500),
+    (840, 405), (1000, 310)
+]
+# Seconds between consecutive clicks of a sequence the game registers as separate clicks
+CLICK_PACING = 0.1
+TROOPS_ADDED_PER_CAMP = 15
 
 
 def search_for_enemy():
@@ -9,10 +24,10 @@ def search_for_enemy():
     Performs the sequence of clicks to search for an enemy base.
     """
     try:
-        click_and_wait(ATTACK_BUTTON, 1.5)
-        click_and_wait(FIND_TARGET_BUTTON, 1.5)
+        click_and_wait(ATTACK_BUTTON, 1.5, ATTACK_MENU_SCREEN)
+        click_and_wait(FIND_TARGET_BUTTON, 1.5, FIGHT_NOW_SCREEN)
         click_and_wait(FIGHT_NOW_BUTTON, 1.5)
-        click_and_wait(FIGHT_NOW_BUTTON, 8)
+        click_and_wait(FIGHT_NOW_BUTTON, 8, ENEMY_BASE_SCREEN)
     except Exception as e:
         raise e
 
@@ -22,18 +37,19 @@ def attack():
     Performs an attack sequence including troop deployment and battle management.
 
     Returns:
-        end_battle_screenshot (Image): screenshot of the end battle screen containing data about the loot
+        end_battle_screenshot (Frame): screenshot of the end battle screen containing data about the loot
+        battle_duration (float): number of seconds the battle took
     """
 
     try:
         deploy_troops()
-        click_and_wait(SPEED_UP_X2_BUTTON, 0)
-        click_and_wait(SPEED_UP_X2_BUTTON, 50)  # Wait for the battle to end (x4 speed)
-        click_and_wait(END_BATTLE_BUTTON, 5)
-        end_battle_screenshot = get_screenshot("Galaxy Life")
+        input_dispatcher.click_sequence([(SPEED_UP_X2_BUTTON, CLICK_PACING), (SPEED_UP_X2_BUTTON, 0)])  # x4 speed
+        battle_duration = battle_monitor.wait_for_battle_end()
+        click_and_wait(END_BATTLE_BUTTON, 5, BATTLE_END_SCREEN)
+        end_battle_screenshot = get_screenshot(window_data=ATTACK_WINDOW_DATA)
 
-        click_and_wait(GO_HOME_BUTTON, 10)
-        return end_battle_screenshot
+        click_and_wait(GO_HOME_BUTTON, 10, HOME_BASE_SCREEN)
+        return end_battle_screenshot, battle_duration
 
     except Exception as e:
         raise e
@@ -45,16 +61,8 @@ def deploy_troops():
     """
 
     try:
-        click_and_wait(CHOOSE_LOOTER_UNIT_WHEN_ATTACKING_BUTTON, 0.5)
-        coordinates = [
-            (1460, 290), (1695, 435), (1870, 525), (1980, 590), (2090, 620),
-            (2210, 685), (2340, 800), (2210, 870), (2060, 955), (1915, 1030),
-            (1800, 1090), (1650, 1150), (1420, 1230), (1135, 1220), (855, 1160),
-            (600, 1055), (490, 930), (445, 740), (480, 620), (630, 500),
-            (840, 405), (1000, 310)
-        ]
-        for x, y in coordinates:
-            click_and_wait((x, y), 0.1)
+        input_dispatcher.click_sequence([(CHOOSE_LOOTER_UNIT_WHEN_ATTACKING_BUTTON, 0.5)] +
+                                        [(coordinates, CLICK_PACING) for coordinates in DEPLOY_COORDINATES])
     except Exception as e:
         raise e
 
@@ -64,14 +72,11 @@ def add_troops_to_training():
     Adds troops to the training queue in the training camps.
     """
     try:
-        click_and_wait(TRAINING_CAMP_1_BUTTON, 0.1)
-        click_and_wait(TRAINING_CAMP_1_BUTTON, 1.5)
-        for _ in range(15):
-            click_and_wait(ADD_LOOTERS_TO_TRAINING_LIST_BUTTON, 0.1)
-        click_and_wait(TRAINING_CAMP_2_BUTTON, 0.1)
-        click_and_wait(TRAINING_CAMP_2_BUTTON, 1.5)
-        for _ in range(15):
-            click_and_wait(ADD_LOOTERS_TO_TRAINING_LIST_BUTTON, 0.1)
-        click_and_wait(CLOSE_TRAINING_VIEW_BUTTON, 1)
+        steps = []
+        for camp_button in [TRAINING_CAMP_1_BUTTON, TRAINING_CAMP_2_BUTTON]:
+            steps += [(camp_button, CLICK_PACING), (camp_button, 1.5)]
+            steps += [(ADD_LOOTERS_TO_TRAINING_LIST_BUTTON, CLICK_PACING)] * TROOPS_ADDED_PER_CAMP
+        steps.append((CLOSE_TRAINING_VIEW_BUTTON, 1))
+        input_dispatcher.click_sequence(steps, until_screen=HOME_BASE_SCREEN)
     except Exception as e:
         raise e
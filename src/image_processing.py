@@ -1,164 +1,252 @@
 import logging
-import time
+import os
 from datetime import datetime
 
 import cv2
-import easyocr
 import numpy as np
-import pyautogui
-import torch
-from pygetwindow import getWindowsWithTitle
-from ultralytics import YOLO
+
+from archive import screenshot_archive
+from attack_policy import get_attack_policy
+from capture import capture_frame, grab_region_into_buffer
+from detections import Detections
+from digit_ocr import digit_recognizer, DIGIT_CONFIDENCE_THRESHOLD, OCR_CROPS_DIRECTORY
+from inference_service import inference_client
+from metrics import metrics
+from model_registry import model_registry
+from ocr_cache import ocr_cache
+from window import get_game_window
 
 SCAN_WINDOW_DATA = [985, 100, 65, 50]
 ATTACK_WINDOW_DATA = [1000, 855, 280, 45]
 
-
-def save_detection_results(screen_path, results):
+# Screenshots and detection results go to the screenshot archive, see archive.py for its policy and bounds
+SAVE_SCREENSHOTS = True
+SAVE_DETECTION_RESULTS = True
+SAVE_OCR_CROPS = False
+
+GOLD_VALUE_THRESHOLD = 500000
+MINERAL_VALUE_THRESHOLD = 1000000
+DEFENSIVE_BUILDINGS_AMOUNT_THRESHOLD = 5
+
+# Detections scored at or below this threshold are ignored by the defence analysis and not drawn
+DETECTION_SCORE_THRESHOLD = 0.2
+# Region of the enemy planet, without the resource panel, the buttons and the empty space around it
+PLAYFIELD_WINDOW_DATA = [320, 220, 1920, 1020]
+# Region the detector sees, None to run it on the full screen as train104 was trained. Cropping changes the scale of
+# the sprites and may cut off defences near the edges, so only set it to PLAYFIELD_WINDOW_DATA once
+# replay.py --compare-detection agrees with full screen detection on recorded frames
+DETECTION_WINDOW_DATA = None
+# Input size of the detector; sizes other than the one the model was trained at (640 for train104) need a model
+# trained at that size, see model_training/train_light.py
+DETECTION_IMAGE_SIZE = 640
+# Archived detection images only show the detection region instead of the full screen
+ARCHIVE_DETECTION_REGION_ONLY = True
+# An analysis with a kept detection scored below this, or without the base, counts as low confidence for the archive
+LOW_CONFIDENCE_DETECTION_SCORE = 0.5
+
+
+def draw_detections(image, detections):
     """
-    Saves detection results to a file and draws bounding boxes on the image.
+    Draws bounding boxes and class names of detections on the image.
 
     Params:
-        screen_path (str): Path to the screenshot image
-        results: Detection results from the YOLO model
-
-    Returns:
-        A tuple (result_path, image) containing:
-        - result_path (str): Path to the detection results file
-        - image: Image with bounding boxes drawn
+        image: The image to draw on
+        detections (Detections): Detections to draw
     """
     try:
-        result_path = f"{screen_path}.txt"
-        image = cv2.imread(screen_path)
-
-        with open(result_path, 'w') as f:
-            f.write(f"Total detected boxes: {len(results.boxes.data)}\n")
-            f.write("Detected boxes and their scores:\n")
-            for result in results.boxes.data.tolist():
-                x1, y1, x2, y2, score, class_id = result
-                f.write(f"{class_id},{score},{x1},{y1},{x2},{y2}\n")
-                if score > 0.2:
-                    cv2.rectangle(image, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 4)
-                    cv2.putText(image, results.names[int(class_id)].upper(), (int(x1), int(y1) - 10),
-                                cv2.FONT_HERSHEY_SIMPLEX, 1.3, (0, 255, 0), 2, cv2.LINE_AA)
-
-        return result_path, image
+        for index, (x1, y1, x2, y2) in enumerate(detections.boxes.astype(int).tolist()):
+            cv2.rectangle(image, (x1, y1), (x2, y2), (0, 255, 0), 4)
+            cv2.putText(image, detections.label(index).upper(), (x1, y1 - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1.3, (0, 255, 0), 2, cv2.LINE_AA)
     except Exception as e:
         raise e
 
 
-def is_worth_based_on_defences(screen_path):
+def render_detections(frame, detections, deltas):
+    """
+    Draws detections and their encompassing rectangle on a copy of the frame.
+
+    Params:
+        frame (Frame): The analysed frame
+        detections (Detections): Detections of the frame, already filtered by score
+        deltas (numpy.ndarray | None): The rectangle encompassing all detections
+
+    Returns:
+        numpy.ndarray: The annotated image, cropped to the detection region if only the region is archived
+    """
+    image = frame.copy_pixels()
+    draw_detections(image, detections)
+    if deltas is not None:
+        draw_encompassing_rectangle(image, deltas)
+    if ARCHIVE_DETECTION_REGION_ONLY and DETECTION_WINDOW_DATA is not None:
+        x, y, width, height = DETECTION_WINDOW_DATA
+        image = image[y:y + height, x:x + width]
+    return image
+
+
+def archive_detections(frame, all_detections, detections, deltas, is_worth):
+    """
+    Queues the detection results and the annotated frame for the screenshot archive, if its policy wants them.
+
+    Params:
+        frame (Frame): The analysed frame
+        all_detections (Detections): All detections of the frame
+        detections (Detections): Detections of the frame, already filtered by score
+        deltas (numpy.ndarray | None): The rectangle encompassing all detections, None if the base wasn't found
+        is_worth (bool): The base is going to be attacked
+    """
+    low_confidence = deltas is None or bool(np.any(detections.scores < LOW_CONFIDENCE_DETECTION_SCORE))
+    if not screenshot_archive.wants(is_worth, low_confidence):
+        return
+    if SAVE_DETECTION_RESULTS:
+        screenshot_archive.submit(f"{frame.name}.txt", all_detections.to_text)
+    if SAVE_SCREENSHOTS:
+        screenshot_archive.submit(f"{frame.name}_detections", render_detections, frame, detections, deltas)
+
+
+def is_worth_based_on_defences(frame):
     """
     Determines if a base is worth attacking based on defenses recognized by model.
 
     Params:
-        screen_path (str): Path to the screenshot image
+        frame (Frame): The captured enemy base
 
     Returns:
         bool: True if the base is located on the edge of all defensive buildings OR amount of defensive
-            buildings is smaller than <defensive_buildings_amount_threshold> (we assume that the base is not protected
+            buildings is smaller than <DEFENSIVE_BUILDINGS_AMOUNT_THRESHOLD> (we assume that the base is not protected
             well then), False otherwise
     """
-    defensive_buildings_amount_threshold = 5
     try:
-        image = cv2.imread(screen_path)
-        if image is None:
-            raise FileNotFoundError(f"Image not found at {screen_path}")
+        return analyse_defences(frame)[0]
+    except Exception as e:
+        raise e
 
-        model_path = "../model/train104/weights/best.pt"
 
-        results = YOLO(model_path)(image)[0]
-        result_path, image = save_detection_results(screen_path, results)
+def analyse_defences(frame, all_detections=None):
+    """
+    Detects the defences of a base and decides on them with the fixed threshold.
 
-        base_coords, detections = parse_detection_file(result_path)
-        if base_coords is not None:
+    Params:
+        frame (Frame): The captured enemy base
+        all_detections (Detections | None): Detections already made on the frame, the detector runs if None
 
-            deltas, is_base_on_edge = calculate_detections_deltas(detections, base_coords)
-            if deltas:
-                draw_encompassing_rectangle(image, tuple(deltas))
-                cv2.imwrite(f"{screen_path}_detections.png", image)
-            else:
-                logging.error("No valid boxes found to calculate average location and deltas.")
-                return True
-        else:
-            logging.error("Base not found in detections.")
-            is_base_on_edge = False
+    Returns:
+        A tuple (result, defences, is_base_on_edge) containing:
+        - result (bool): True if the base is worth attacking based on its defences, see is_worth_based_on_defences
+        - defences (int): Number of detected defensive buildings
+        - is_base_on_edge (bool): True if the base is on the edge
+    """
+    if all_detections is None:
+        all_detections = detect_defences(frame)
+    detections = all_detections.filter(DETECTION_SCORE_THRESHOLD)
+    result, deltas, is_base_on_edge = decide_on_defences(detections)
+    archive_detections(frame, all_detections, detections, deltas, result)
 
-        # Worth attacking if base is on edge or defensive buildings amount is smaller than set threshold
-        result = len(results.boxes.data) < defensive_buildings_amount_threshold or is_base_on_edge
-        logging.info(f"Is worth attacking based on defences: {result}")
-        return result
-    except Exception as e:
-        raise e
+    logging.info(f"Is worth attacking based on defences: {result}")
+    return result, len(detections), is_base_on_edge
 
 
-def parse_detection_file(result_path):
+def detect_defences(frame):
     """
-    Parses a detection file to extract base coordinates and detections.
+    Runs the defence detector on the detection region of a frame at the detection image size.
 
     Params:
-        result_path (str): The path to the detection results file.
+        frame (Frame): The captured enemy base
 
     Returns:
-        A tuple (base_coords, detections) containing:
-        - base_coords (tuple of 4 floats | None): Coordinates of the base, or None if not found.
-        - detections (list): A list of tuples (each consisting of 4 floats) detection coordinates.
+        Detections: All detections, in screen coordinates
     """
+    region = frame.pixels if DETECTION_WINDOW_DATA is None else frame.crop(DETECTION_WINDOW_DATA)
+    with metrics.span('yolo'):
+        detections = run_detector(region)
+    if DETECTION_WINDOW_DATA is None:
+        return detections
+    return detections.offset(DETECTION_WINDOW_DATA[0], DETECTION_WINDOW_DATA[1])
 
-    try:
-        with open(result_path, 'r') as file:
-            lines = file.readlines()
 
-        base_coords = None
-        detections = []
+def run_detector(image):
+    """
+    Runs the defence detector in the inference service if it's running, in this process otherwise or if the service
+    fails.
 
-        for line in lines:
-            parts = line.strip().split(',')
-            if len(parts) == 6:
-                class_id, score, x1, y1, x2, y2 = map(float, parts)
-                if int(class_id) == 7:
-                    base_coords = (x1, y1, x2, y2)
-                detections.append((x1, y1, x2, y2))
+    Params:
+        image (numpy.ndarray): The BGR image, possibly a view of a larger one
 
-        return base_coords, detections
-    except Exception as e:
-        raise e
+    Returns:
+        Detections: All detections, in the coordinates of the image
+    """
+    if inference_client.available():
+        try:
+            return inference_client.detect(image, DETECTION_IMAGE_SIZE)
+        except (ConnectionError, RuntimeError) as e:
+            logging.warning(f"{e}, running the detector in the bot")
+    results = model_registry.get_detector()(np.ascontiguousarray(image), imgsz=DETECTION_IMAGE_SIZE)[0]
+    return Detections.from_results(results)
 
 
-def calculate_detections_deltas(detections, base_coords):
+def read_text(region_of_interest, reader=None):
     """
-    Calculates deltas of detections (max and min for both x and y values), and determines if the base is on the edge.
+    Reads a region with EasyOCR, in the inference service if it's running and no reader is given, in this process
+    otherwise or if the service fails.
 
     Params:
-        detections (list): A list of tuples (each consisting of 4 floats) detection coordinates.
-        base_coords (tuple of 4 floats | None): Coordinates of the base, or None if not found.
+        region_of_interest (numpy.ndarray): The grayscale region to read from
+        reader: An EasyOCR reader object, the shared one is used if not given
 
     Returns:
-        A tuple (deltas, is_base_on_edge) containing:
-        - deltas (tuple of 4 floats): The delta values for the rectangle corners
+        list: The read text fragments
+    """
+    if reader is None and inference_client.available():
+        try:
+            return inference_client.read_text(region_of_interest)
+        except (ConnectionError, RuntimeError) as e:
+            logging.warning(f"{e}, running EasyOCR in the bot")
+    reader = reader or model_registry.get_reader()
+    return reader.readtext(np.ascontiguousarray(region_of_interest), detail=0)
+
+
+def decide_on_defences(detections):
+    """
+    Decides whether a base is worth attacking based on its detected defences.
+
+    Params:
+        detections (Detections): Detections of the frame, already filtered by score
+
+    Returns:
+        A tuple (result, deltas, is_base_on_edge) containing:
+        - result (bool): True if the base is worth attacking
+        - deltas (numpy.ndarray | None): The rectangle encompassing all detections, None if the base wasn't found
         - is_base_on_edge (bool): True if the base is on the edge
     """
-    # TODO: decide whether delta should be for all detections or just these with score > 0.2 (its for all now probably)
+    deltas, is_base_on_edge = calculate_detections_deltas(detections)
+    if deltas is None:
+        logging.error("Base not found in detections.")
 
-    try:
-        if not detections or base_coords is None:
-            return
+    # Worth attacking if base is on edge or defensive buildings amount is smaller than set threshold
+    result = len(detections) < DEFENSIVE_BUILDINGS_AMOUNT_THRESHOLD or is_base_on_edge
+    return result, deltas, is_base_on_edge
 
-        x1_values = [coords[0] for coords in detections]
-        x2_values = [coords[2] for coords in detections]
-        y1_values = [coords[1] for coords in detections]
-        y2_values = [coords[3] for coords in detections]
 
-        deltas = [
-            min(x1_values),
-            max(x2_values),
-            min(y1_values),
-            max(y2_values)
-        ]
+def calculate_detections_deltas(detections):
+    """
+    Calculates deltas of detections (max and min for both x and y values), and determines if the base is on the edge.
+
+    Params:
+        detections (Detections): Detections of the frame, already filtered by score
+
+    Returns:
+        A tuple (deltas, is_base_on_edge) containing:
+        - deltas (numpy.ndarray | None): The delta values for the rectangle corners, None if the base wasn't found
+        - is_base_on_edge (bool): True if the base is on the edge
+    """
+    try:
+        base_box = detections.base_box
+        if base_box is None:
+            return None, False
 
-        is_base_on_edge = (base_coords and
-                           (base_coords[0] == deltas[0] or base_coords[2] == deltas[1] or
-                            base_coords[1] == deltas[2] or base_coords[3] == deltas[3]))
+        deltas = detections.encompassing_rectangle()
+        # Base box in the same (x1, x2, y1, y2) order as the deltas
+        is_base_on_edge = bool(np.any(base_box[[0, 2, 1, 3]] == deltas))
 
         logging.info(f"Base on edge: {is_base_on_edge}")
 
@@ -167,31 +255,65 @@ def calculate_detections_deltas(detections, base_coords):
         raise e
 
 
-def read_resource_values(region_of_interest, reader):
+def save_ocr_crop(region_of_interest):
+    """
+    Saves a region read by OCR, building the corpus used to create and evaluate the digit templates.
+
+    Params:
+        region_of_interest (numpy.ndarray): The grayscale region
+    """
+    try:
+        os.makedirs(OCR_CROPS_DIRECTORY, exist_ok=True)
+        cv2.imwrite(f"{OCR_CROPS_DIRECTORY}/{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.png", region_of_interest)
+    except Exception as e:
+        logging.error(f"Couldn't save OCR crop: {e}")
+
+
+def read_resource_values(region_of_interest, reader=None):
     """
-    Reads resource values from a region of interest using OCR.
+    Reads resource values from a region of interest. Regions that have been read before are answered from the OCR
+    cache, otherwise the fixed-font digit recognizer is tried first and EasyOCR is used when it isn't confident about
+    the reading.
 
     Params:
-        region_of_interest (numpy.ndarray): The region to read from
-        reader: An EasyOCR reader object
+        region_of_interest (numpy.ndarray): The grayscale region to read from
+        reader: An EasyOCR reader object, the shared one is used if not given
 
     Returns:
         str: The extracted numeric value as a string
     """
 
     try:
-        result = reader.readtext(np.array(region_of_interest), detail=0)
-        return ''.join(filter(str.isdigit, ''.join(result)))
+        if SAVE_OCR_CROPS:
+            save_ocr_crop(region_of_interest)
+
+        with metrics.span('ocr'):
+            key = ocr_cache.key(region_of_interest)
+            value = ocr_cache.get(key)
+            if value is not None:
+                return value
+
+            value, confidence = digit_recognizer.recognize(region_of_interest)
+            if confidence < DIGIT_CONFIDENCE_THRESHOLD:
+                logging.debug(f"Digit recognizer read {value!r} with confidence {confidence:.3f}, "
+                              f"falling back to EasyOCR")
+                with metrics.span('easyocr'):
+                    result = read_text(region_of_interest, reader)
+                value = ''.join(filter(str.isdigit, ''.join(result)))
+
+            ocr_cache.put(key, value)
+            return value
     except Exception as e:
         raise e
 
 
-def get_gold_and_minerals(screenshot, window_data, screenshot_type='normal'):
+def get_gold_and_minerals(frame, window_data, screenshot_type='normal'):
     """
-    Extracts gold and mineral values from a screenshot.
+    Extracts gold and mineral values from a captured frame. Only the region of interest is converted to grayscale.
 
     Params:
-        screenshot: The screenshot image.
+        frame (Frame): The captured frame.
+        window_data (tuple): The region of the frame containing the resource values.
         screenshot_type (str): Type of screenshot ('normal' or 'battle').
 
     Returns:
@@ -200,18 +322,14 @@ def get_gold_and_minerals(screenshot, window_data, screenshot_type='normal'):
         - mineral_value (str): The extracted mineral value.
     """
     try:
-        screenshot_np = np.array(screenshot.convert('L'))
-        region_of_interest = extract_region_of_interest(screenshot_np, window_data)
+        region_of_interest = cv2.cvtColor(frame.crop(window_data), cv2.COLOR_BGR2GRAY)
 
         split_axis = 'horizontal' if screenshot_type == 'normal' else 'vertical'
 
-        with torch.no_grad():
-            reader = easyocr.Reader(['en'], gpu=torch.cuda.is_available())
-
         split_regions_of_interest = split_region_of_interest(region_of_interest, split_axis)
 
-        gold_value = read_resource_values(split_regions_of_interest[0], reader)
-        mineral_value = read_resource_values(split_regions_of_interest[1], reader)
+        gold_value = read_resource_values(split_regions_of_interest[0])
+        mineral_value = read_resource_values(split_regions_of_interest[1])
 
         logging.info(f"Gold value: {gold_value}")
         logging.info(f"Mineral value: {mineral_value}")
@@ -221,27 +339,6 @@ def get_gold_and_minerals(screenshot, window_data, screenshot_type='normal'):
         raise e
 
 
-def extract_region_of_interest(image, window_data):
-    """
-    Extracts a region of interest from an image.
-
-    Params:
-        image: The source image
-        window_data (tuple): A tuple containing the window data consisting of:
-        - x (int): X-coordinate of the top-left corner
-        - y (int): Y-coordinate of the top-left corner
-        - width (int): Width of the region
-        - height (int): Height of the region
-
-    Returns:
-        numpy.ndarray: The extracted region of interest
-    """
-    try:
-        return image[window_data[1]:window_data[1] + window_data[3], window_data[0]:window_data[0] + window_data[2]]
-    except Exception as e:
-        raise e
-
-
 def split_region_of_interest(region_of_interest, split_axis):
     """
     Splits a region of interest into two parts based on the specified axis.
@@ -267,33 +364,75 @@ def split_region_of_interest(region_of_interest, split_axis):
         raise e
 
 
-def get_screenshot(window_title):
+def focus_window(window_title=None):
+    """
+    Makes sure a specified window is active, maximized and in the top-left corner of the screen. The window is only
+    placed again if it has moved or lost focus since the last call.
+
+    Params:
+        window_title (str | None): The title of the window to focus, the game window if not given
+    """
+    get_game_window(window_title).ensure_placed()
+
+
+def get_screenshot(window_title=None, window_data=None):
     """
     Captures a screenshot of a specified window.
 
     Params:
-        window_title (str): The title of the window to capture
+        window_title (str | None): The title of the window to capture, the game window if not given
+        window_data (tuple | None): The region of the screen to capture, None for the full screen
 
     Returns:
-        Image: The captured screenshot
+        Frame: The captured screenshot
+    """
+    with metrics.span('screenshot'):
+        focus_window(window_title)
+        return capture_frame(window_data)
+
+
+def grab_region(window_data):
+    """
+    Captures a small region of the screen in grayscale.
+
+    Params:
+        window_data (tuple): A tuple (x, y, width, height) describing the region
+
+    Returns:
+        numpy.ndarray: The captured grayscale region
     """
     try:
-        window = getWindowsWithTitle(window_title)[0]
-        window.activate()
-        time.sleep(0.25)
-        window.maximize()
-        time.sleep(0.25)
-        window.moveTo(0, 0)
-        time.sleep(0.25)
-    except IndexError:
-        logging.error("Window not found!")
-        exit()
-    return pyautogui.screenshot()
+        return cv2.cvtColor(grab_region_into_buffer(window_data), cv2.COLOR_BGR2GRAY)
+    except Exception as e:
+        raise e
+
+
+def save_screenshot(frame, is_worth=False, low_confidence=False):
+    """
+    Queues a captured frame for the screenshot archive if saving screenshots is enabled and the archive's policy wants
+    it.
+
+    Params:
+        frame (Frame): The frame to save
+        is_worth (bool): The enemy was attacked
+        low_confidence (bool): The readings of the enemy were uncertain
+
+    Returns:
+        bool: True if the frame was queued
+    """
+    if not SAVE_SCREENSHOTS or not screenshot_archive.wants(is_worth, low_confidence):
+        return False
+
+    try:
+        # Captured frames get their own buffer and are never drawn on, so the writer can encode them as they are
+        return screenshot_archive.submit(frame.name, lambda: frame.pixels)
+    except Exception as e:
+        raise e
 
 
 def process_screenshot(init_time):
     """
-    Processes a screenshot to extract gold and mineral values. Saves bot's uptime to a file.
+    Captures the resource counters to extract gold and mineral values and calculates bot's uptime.
 
     Params:
         init_time (datetime): The bot's initialization time
@@ -301,60 +440,100 @@ def process_screenshot(init_time):
     Returns:
         gold_value (str): gold value
         mineral_value (str): mineral value
-        screen_path (str): path to the saved screenshot
+        frame (Frame): the captured resource counters region
         uptime (timedelta): bot's uptime
     """
     try:
-        window_title = "Galaxy Life"
-        screenshot = get_screenshot(window_title)
-
-        if screenshot:
-            now = datetime.now()
-            uptime = now - init_time
+        frame = get_screenshot(window_data=SCAN_WINDOW_DATA)
 
-            timestamp = now.strftime("%Y%m%d_%H%M%S")
-            screen_path = f"../logs/screenshots/{timestamp}.png"
-            screenshot.save(screen_path)
+        if frame:
+            uptime = frame.timestamp - init_time
 
-            gold_value, mineral_value = get_gold_and_minerals(screenshot, SCAN_WINDOW_DATA)
+            gold_value, mineral_value = get_gold_and_minerals(frame, SCAN_WINDOW_DATA)
 
             logging.info(f"Uptime: {uptime}")
             logging.info(f"Gold Value: {gold_value}")
             logging.info(f"Mineral Value: {mineral_value}")
 
-            return gold_value, mineral_value, screen_path, uptime
+            return gold_value, mineral_value, frame, uptime
 
     except Exception as e:
         raise e
 
 
-def is_worth_attacking(gold_value, mineral_value, screen_path):
+def is_worth_attacking(gold_value, mineral_value, frame):
     """
-    Determines if a base is worth attacking based on resources and defences. Thresholds for mineral and gold values
-    making the function return true are set as <gold_value_threshold> and <mineral_value_threshold>
+    Determines if a base is worth attacking based on resources and defences, see evaluate_enemy.
 
     Params:
         gold_value (str): gold value
         mineral_value (str): mineral value
-        screen_path (str): Path to the screenshot image
+        frame (Frame): The captured enemy base, the full screen is captured if it only holds a region of it
 
     Returns:
         bool: True if the base is worth attacking based on current settings, False otherwise
     """
-    gold_value_threshold = 500000
-    mineral_value_threshold = 1000000
+    try:
+        return evaluate_enemy(gold_value, mineral_value, frame)[0]
+    except Exception as e:
+        raise e
+
+
+def evaluate_enemy(gold_value, mineral_value, frame, speculation=None):
+    """
+    Determines if a base is worth attacking. With a fitted attack policy the base is attacked if its expected loot is
+    worth the time of an attack, the detector only running when the resources alone can make it worth it. Otherwise
+    thresholds for mineral and gold values making the function return true are set as <GOLD_VALUE_THRESHOLD> and
+    <MINERAL_VALUE_THRESHOLD>, and the defences are checked for bases passing them. Bases with unreadable resources
+    are skipped.
 
+    Params:
+        gold_value (str): gold value
+        mineral_value (str): mineral value
+        frame (Frame): The captured enemy base, the full screen is captured if it only holds a region of it
+        speculation (SpeculativeDetection | None): Defence detection started when the enemy was captured, waited for
+            instead of running the detector
+
+    Returns:
+        A tuple (result, analysis) containing:
+        - result (bool): True if the base is worth attacking
+        - analysis (dict): 'policy' used, and 'defences', 'base_on_edge' and 'expected_loot' when they are known,
+          and the full screen 'frame' the defences were detected on
+    """
     try:
-        threshold_result = int(gold_value) > gold_value_threshold and int(mineral_value) > mineral_value_threshold
-        logging.info(f"Is worth attacking based on resources: {threshold_result}")
-        if threshold_result:
-            result = is_worth_based_on_defences(screen_path) and threshold_result
+        policy = get_attack_policy()
+        analysis = {'policy': 'learned' if policy else 'thresholds'}
+        try:
+            gold, minerals = int(gold_value), int(mineral_value)
+        except ValueError:
+            logging.warning(f"Unreadable resources {gold_value!r} and {mineral_value!r}, skipping")
+            return False, analysis
+
+        if policy:
+            candidate = policy.worth_detecting(gold, minerals)
         else:
-            result = False
+            candidate = gold > GOLD_VALUE_THRESHOLD and minerals > MINERAL_VALUE_THRESHOLD
+        logging.info(f"Is worth attacking based on resources: {candidate}")
+
+        result = False
+        if candidate:
+            all_detections = None
+            if speculation is not None:
+                frame, all_detections = speculation.result()
+            elif not frame.is_full_screen:
+                frame = capture_frame()
+            analysis['frame'] = frame
+            result, analysis['defences'], analysis['base_on_edge'] = analyse_defences(frame, all_detections)
+        if policy:
+            attack, analysis['expected_loot'] = policy.decide(gold, minerals, analysis.get('defences'),
+                                                              analysis.get('base_on_edge'))
+            result = candidate and attack
+            logging.info(f"Expected loot {analysis['expected_loot']:,.0f}, "
+                         f"threshold {policy.loot_threshold:,.0f}")
 
         logging.info(f"Is worth attacking: {result}")
 
-        return result
+        return result, analysis
     except Exception as e:
         raise e
 
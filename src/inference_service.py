@@ -0,0 +1,424 @@
+import argparse
+import atexit
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import AuthenticationError, resource_tracker
+from multiprocessing.connection import Client, Listener
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from detections import Detections
+
+# The service only listens on localhost
+INFERENCE_SERVICE_ADDRESS = ('127.0.0.1', 6010)
+# Requests are unpickled, so only processes knowing the key may connect. It's read from this environment variable, or
+# from a file only the user can read, generated by the first bot or service started
+INFERENCE_SERVICE_AUTHKEY_ENV = 'GALAXYLIFEBOT_INFERENCE_AUTHKEY'
+INFERENCE_SERVICE_AUTHKEY_PATH = os.path.join(os.path.expanduser('~'), '.galaxylifebot', 'inference_authkey')
+# Use the service when it is running, the bot loads the models itself otherwise
+USE_INFERENCE_SERVICE = True
+# Seconds before connecting is tried again after the service wasn't reachable
+INFERENCE_SERVICE_RETRY_INTERVAL = 30
+# Requests of all connected bots run in batches of at most this many, one forward pass per batch
+INFERENCE_BATCH_SIZE = 8
+# Seconds the worker waits for more requests to join a batch after the first one arrives
+INFERENCE_BATCH_WINDOW = 0.005
+
+
+def get_authkey(path=INFERENCE_SERVICE_AUTHKEY_PATH):
+    """
+    Returns the key authenticating the bots to the service, generating it on first use.
+
+    Params:
+        path (str): File the key is kept in when the environment variable isn't set
+
+    Returns:
+        bytes: The key
+    """
+    if os.environ.get(INFERENCE_SERVICE_AUTHKEY_ENV):
+        return os.environ[INFERENCE_SERVICE_AUTHKEY_ENV].encode()
+    try:
+        with open(path, 'rb') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    key = secrets.token_hex(32).encode()
+    try:
+        # Created readable by the user only; exclusive so two processes starting together keep the same key
+        descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(path, 'rb') as f:
+            return f.read().strip()
+    with os.fdopen(descriptor, 'wb') as f:
+        f.write(key)
+    logging.info(f"Generated the inference service key in {path}")
+    return key
+
+
+def attach_shared_memory(name):
+    """
+    Attaches to a shared memory segment owned by another process, without letting this process' resource tracker
+    destroy it at exit. Only POSIX has a resource tracker for shared memory; on Windows a segment lives as long as a
+    handle to it is open.
+
+    Params:
+        name (str): Name of the segment
+
+    Returns:
+        SharedMemory: The attached segment
+    """
+    try:
+        return SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python before 3.13
+        segment = SharedMemory(name=name)
+        if os.name == 'posix':
+            resource_tracker.unregister(segment._name, 'shared_memory')
+        return segment
+
+
+class InferenceServer:
+    """
+    Long-lived process keeping the defence detector and EasyOCR loaded and warm. Bots connect over a
+    multiprocessing.connection socket on localhost and send small request dicts; frames aren't sent over the socket
+    but written by the bot to a shared memory segment the request names. Every connection has its own thread, but the
+    models only run on a single worker thread: requests arriving from several bots within INFERENCE_BATCH_WINDOW are
+    batched into one forward pass, detector frames of the same input size together and OCR regions of the same shape
+    together.
+
+    Requests and their responses (every response also has 'ok', and 'error' when it's False):
+    - {'op': 'ping'}: {'pid', 'load_times', 'detector_runtime', 'connections', 'requests', 'batches'}
+    - {'op': 'detect', 'shm', 'shape', 'imgsz'}: {'detections' (N x 6 array), 'names'}
+    - {'op': 'read_text', 'region'}: {'text' (list of str)}
+    """
+
+    def __init__(self, address=INFERENCE_SERVICE_ADDRESS, authkey=None):
+        """
+        Params:
+            address (tuple): Host and port to listen on
+            authkey (bytes | None): Key the bots authenticate with, see get_authkey if not given
+        """
+        self.address = address
+        self.authkey = authkey
+        self.jobs = queue.Queue()
+        self.model_registry = None
+        self.requests = 0
+        self.connections = 0
+        # Guards the counters updated by the connection threads
+        self.counters_lock = threading.Lock()
+        self.batches = {'detect': [0, 0], 'read_text': [0, 0]}
+        self.batch_detection = True
+
+    def serve_forever(self):
+        from model_registry import model_registry
+
+        self.model_registry = model_registry
+        model_registry.warm_up()
+        threading.Thread(target=self.run_batches, name='inference-worker', daemon=True).start()
+        with Listener(self.address, authkey=self.authkey or get_authkey()) as listener:
+            logging.info(f"Inference service listening on {self.address[0]}:{self.address[1]}")
+            while True:
+                try:
+                    connection = listener.accept()
+                except Exception as e:
+                    # E.g. a client with the wrong authkey
+                    logging.warning(f"Rejected connection: {e}")
+                    continue
+                threading.Thread(target=self.handle, args=(connection,), daemon=True).start()
+
+    def handle(self, connection):
+        segments = {}
+        with self.counters_lock:
+            self.connections += 1
+            connections = self.connections
+        logging.info(f"Bot connected ({connections} connections)")
+        try:
+            while True:
+                try:
+                    request = connection.recv()
+                except (EOFError, OSError):
+                    break
+                try:
+                    response = {'ok': True, **self.dispatch(request, segments)}
+                except Exception as e:
+                    response = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+                connection.send(response)
+                with self.counters_lock:
+                    self.requests += 1
+        finally:
+            for segment in segments.values():
+                segment.close()
+            connection.close()
+            with self.counters_lock:
+                self.connections -= 1
+                connections = self.connections
+            logging.info(f"Bot disconnected ({connections} connections)")
+
+    def dispatch(self, request, segments):
+        operation = request['op']
+        if operation == 'ping':
+            return {'pid': os.getpid(), 'load_times': self.model_registry.load_times,
+                    'detector_runtime': self.model_registry.detector_runtime, 'connections': self.connections,
+                    'requests': self.requests, 'batches': self.batches}
+
+        if operation == 'detect':
+            name = request['shm']
+            if name not in segments:
+                # A client only keeps one segment, a new name means it grew it and unlinked the previous one
+                for segment in segments.values():
+                    segment.close()
+                segments.clear()
+                segments[name] = attach_shared_memory(name)
+            pixels = np.ndarray(request['shape'], dtype=np.uint8, buffer=segments[name].buf)
+            return self.submit(operation, request['imgsz'], pixels)
+
+        if operation == 'read_text':
+            return self.submit(operation, request['region'].shape, request['region'])
+
+        raise ValueError(f"Unknown operation {operation!r}")
+
+    def submit(self, operation, key, data):
+        """
+        Queues an input for the worker and waits for its result.
+
+        Params:
+            operation (str): 'detect' or 'read_text'
+            key: Inputs with the same operation and key can be batched together
+            data (numpy.ndarray): The frame or the region
+
+        Returns:
+            dict: The response fields of the input
+        """
+        future = Future()
+        self.jobs.put((operation, key, data, future))
+        return future.result()
+
+    def run_batches(self):
+        while True:
+            batch = [self.jobs.get()]
+            deadline = time.monotonic() + INFERENCE_BATCH_WINDOW
+            while len(batch) < INFERENCE_BATCH_SIZE:
+                try:
+                    batch.append(self.jobs.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+
+            groups = {}
+            for operation, key, data, future in batch:
+                groups.setdefault((operation, key), []).append((data, future))
+            for (operation, key), jobs in groups.items():
+                inputs = [data for data, _ in jobs]
+                try:
+                    results = self.run_batch(operation, key, inputs)
+                except Exception as e:
+                    for _, future in jobs:
+                        future.set_exception(e)
+                    continue
+                for (_, future), result in zip(jobs, results):
+                    future.set_result(result)
+                self.batches[operation][0] += 1
+                self.batches[operation][1] += len(jobs)
+
+    def run_batch(self, operation, key, inputs):
+        """
+        Runs a model on a batch of inputs of the same kind.
+
+        Returns:
+            list: The response fields of every input
+        """
+        if operation == 'detect':
+            detector = self.model_registry.get_detector()
+            if len(inputs) > 1 and self.batch_detection:
+                try:
+                    results = detector(inputs, imgsz=key, verbose=False)
+                except Exception as e:
+                    # E.g. an exported model with a fixed batch size of one
+                    logging.warning(f"Detector can't run batches ({e}), running frames one by one")
+                    self.batch_detection = False
+            if len(inputs) == 1 or not self.batch_detection:
+                results = [detector(pixels, imgsz=key, verbose=False)[0] for pixels in inputs]
+            return [{'detections': Detections.from_results(result).to_array(), 'names': result.names}
+                    for result in results]
+
+        reader = self.model_registry.get_reader()
+        if len(inputs) == 1:
+            return [{'text': reader.readtext(inputs[0], detail=0)}]
+        return [{'text': text} for text in reader.readtext_batched(inputs, detail=0)]
+
+
+class InferenceClient:
+    """
+    Connection of the bot to the inference service. Frames are copied into a shared memory segment owned by the
+    client and reused between requests, growing it when a larger frame comes. Requests from different threads are
+    serialized.
+    """
+
+    def __init__(self, address=INFERENCE_SERVICE_ADDRESS, authkey=None):
+        """
+        Params:
+            address (tuple): Host and port of the service
+            authkey (bytes | None): Key to authenticate with, see get_authkey if not given
+        """
+        self.address = address
+        self.authkey = authkey
+        self.connection = None
+        self.segment = None
+        self.retry_at = 0
+        self.lock = threading.Lock()
+        self.round_trips = 0
+        atexit.register(self.close)
+
+    def available(self):
+        """
+        Connects to the service if it isn't connected yet.
+
+        Returns:
+            bool: True if the service is connected
+        """
+        if not USE_INFERENCE_SERVICE:
+            return False
+        with self.lock:
+            if self.connection is not None:
+                return True
+            if time.monotonic() < self.retry_at:
+                return False
+            try:
+                self.connection = Client(self.address, authkey=self.authkey or get_authkey())
+                logging.info(f"Connected to the inference service at {self.address[0]}:{self.address[1]}")
+                return True
+            except (OSError, AuthenticationError) as e:
+                logging.warning(f"Inference service unavailable ({e}), running the models in the bot")
+                self.retry_at = time.monotonic() + INFERENCE_SERVICE_RETRY_INTERVAL
+                return False
+
+    def request(self, message):
+        # Callers hold the lock
+        try:
+            self.connection.send(message)
+            response = self.connection.recv()
+        except (EOFError, OSError) as e:
+            self.connection.close()
+            self.connection = None
+            raise ConnectionError(f"Lost the inference service: {e}")
+        self.round_trips += 1
+        if not response['ok']:
+            raise RuntimeError(f"Inference service failed: {response['error']}")
+        return response
+
+    def ping(self):
+        with self.lock:
+            return self.request({'op': 'ping'})
+
+    def detect(self, pixels, image_size):
+        """
+        Runs the defence detector on an image.
+
+        Params:
+            pixels (numpy.ndarray): The BGR image
+            image_size (int): Input size of the detector
+
+        Returns:
+            Detections: All detections, in the coordinates of the image
+        """
+        with self.lock:
+            if self.segment is None or self.segment.size < pixels.nbytes:
+                self.release_segment()
+                self.segment = SharedMemory(create=True, size=pixels.nbytes)
+            np.ndarray(pixels.shape, dtype=np.uint8, buffer=self.segment.buf)[...] = pixels
+            response = self.request({'op': 'detect', 'shm': self.segment.name, 'shape': pixels.shape,
+                                     'imgsz': image_size})
+        return Detections.from_array(response['detections'], response['names'])
+
+    def read_text(self, region):
+        """
+        Reads a small grayscale region with EasyOCR. Regions are a few kilobytes, so they are sent inline.
+
+        Returns:
+            list: The read text fragments
+        """
+        with self.lock:
+            return self.request({'op': 'read_text', 'region': np.ascontiguousarray(region)})['text']
+
+    def release_segment(self):
+        if self.segment is not None:
+            self.segment.close()
+            self.segment.unlink()
+            self.segment = None
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+            self.release_segment()
+
+
+inference_client = InferenceClient()
+
+
+def warm_up_inference():
+    """
+    Makes sure the models are ready before the first enemy: checks the service, or loads and warms up the models in
+    the bot if the service isn't running.
+    """
+    if inference_client.available():
+        service = inference_client.ping()
+        logging.info(f"Inference service pid {service['pid']}, detector runtime '{service['detector_runtime']}'")
+    else:
+        from model_registry import model_registry
+        model_registry.warm_up()
+
+
+def check(image_path=None, runs=20):
+    """
+    Sends a frame and a counter region to the running service and prints the round-trip latencies.
+
+    Params:
+        image_path (str | None): Frame to send, a blank 2560x1440 one if not given
+        runs (int): Requests of each kind
+    """
+    import cv2
+
+    if not inference_client.available():
+        raise ConnectionError(f"No inference service at {INFERENCE_SERVICE_ADDRESS[0]}:{INFERENCE_SERVICE_ADDRESS[1]}")
+    print(f"Service: {inference_client.ping()}")
+    pixels = cv2.imread(image_path) if image_path else np.zeros((1440, 2560, 3), dtype=np.uint8)
+    region = np.zeros((25, 65), dtype=np.uint8)
+
+    for name, function, args in [('detect', inference_client.detect, (pixels, 640)),
+                                 ('read_text', inference_client.read_text, (region,))]:
+        latencies = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            result = function(*args)
+            latencies.append(time.perf_counter() - start)
+        print(f"{name}: p50 {np.percentile(latencies, 50) * 1000:.1f}ms, max {max(latencies) * 1000:.1f}ms, "
+              f"last result: {result if name == 'read_text' else f'{len(result)} detections'}")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Run the inference service or check a running one.")
+    parser.add_argument('command', choices=['serve', 'check'])
+    parser.add_argument('--port', type=int, default=INFERENCE_SERVICE_ADDRESS[1])
+    parser.add_argument('--image', help="frame sent by the check, a blank one if not given")
+    parser.add_argument('--rebenchmark', action='store_true',
+                        help="benchmark the detector runtimes again instead of using the saved choice")
+    args = parser.parse_args()
+
+    service_address = (INFERENCE_SERVICE_ADDRESS[0], args.port)
+    if args.command == 'serve':
+        if args.rebenchmark:
+            import model_registry
+            model_registry.DETECTOR_REBENCHMARK = True
+        InferenceServer(service_address).serve_forever()
+    else:
+        inference_client.address = service_address
+        check(args.image)
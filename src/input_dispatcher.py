@@ -0,0 +1,124 @@
+import argparse
+import collections
+import logging
+import time
+
+import numpy as np
+
+from metrics import metrics
+from utils import get_input_backend, set_input_backend
+
+INPUT_LATENCY_HISTORY = 1000
+
+
+class FakeInputBackend:
+    """
+    Stand-in for pyautogui recording every click and key press with its time instead of sending it, optionally taking
+    a given time per call like a real backend would.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = []
+
+    def record(self, name, *args, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        self.calls.append((time.perf_counter(), name, args, kwargs))
+
+    def click(self, *args, **kwargs):
+        self.record('click', *args, **kwargs)
+
+    def keyDown(self, key):
+        self.record('keyDown', key)
+
+    def keyUp(self, key):
+        self.record('keyUp', key)
+
+
+class InputDispatcher:
+    """
+    Sends click sequences to the game as one operation. Every step is scheduled at a fixed offset from the previous
+    one, so the time a click takes is absorbed by the pause after it instead of being added to it, and the screen is
+    only verified once the whole sequence has been sent.
+    """
+
+    def __init__(self):
+        self.latencies = collections.deque(maxlen=INPUT_LATENCY_HISTORY)
+        self.sequences = 0
+        self.clicks = 0
+
+    def click_sequence(self, steps, until_screen=None, leave_first=False):
+        """
+        Clicks a sequence of buttons with explicit pacing.
+
+        Params:
+            steps (list): (button, pause) pairs, the pause being the seconds between the click and the next step
+            until_screen (ScreenState): The screen expected after the sequence; the pause of the last step then serves
+                as the timeout of waiting for it
+            leave_first (bool): Wait for the expected screen to disappear first, used when the sequence starts with
+                the expected screen already visible
+        """
+        backend = get_input_backend()
+        start = time.perf_counter()
+        next_step = start
+        for button, pause in steps:
+            self.sleep_until(next_step)
+            click_start = time.perf_counter()
+            backend.click(button)
+            self.record(time.perf_counter() - click_start)
+            next_step = max(next_step, click_start) + pause
+
+        if until_screen is None:
+            self.sleep_until(next_step)
+        else:
+            with metrics.span('wait'):
+                until_screen.wait(steps[-1][1], leave_first)
+
+        self.sequences += 1
+        metrics.observe('click_sequence', time.perf_counter() - start)
+
+    @staticmethod
+    def sleep_until(deadline):
+        delay = deadline - time.perf_counter()
+        if delay > 0:
+            with metrics.span('wait'):
+                time.sleep(delay)
+
+    def record(self, latency):
+        self.latencies.append(latency)
+        self.clicks += 1
+        metrics.observe('click', latency)
+
+    def summary(self):
+        if not self.latencies:
+            return "Input: no clicks sent yet"
+        latencies = np.array(self.latencies) * 1000
+        return f"Input: {self.clicks} clicks in {self.sequences} sequences, per-click latency " \
+               f"p50 {np.percentile(latencies, 50):.1f}ms, p99 {np.percentile(latencies, 99):.1f}ms, " \
+               f"max {latencies.max():.1f}ms"
+
+
+input_dispatcher = InputDispatcher()
+
+
+if __name__ == '__main__':
+    # The sequences use the dispatcher of the imported module, not the one of this script
+    from game_actions import deploy_troops, add_troops_to_training, input_dispatcher as game_input_dispatcher
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Send the deployment and training click sequences to a fake input "
+                                                 "backend and report their timing.")
+    parser.add_argument('--latency', type=float, default=0.005, help="simulated seconds per click")
+    args = parser.parse_args()
+
+    fake_backend = FakeInputBackend(args.latency)
+    set_input_backend(fake_backend)
+    for name, sequence in [('deploy_troops', deploy_troops), ('add_troops_to_training', add_troops_to_training)]:
+        sequence_start = time.perf_counter()
+        first_call = len(fake_backend.calls)
+        sequence()
+        click_times = [call[0] for call in fake_backend.calls[first_call:]]
+        print(f"{name}: {len(click_times)} clicks in {time.perf_counter() - sequence_start:.2f}s, "
+              f"first to last click {click_times[-1] - click_times[0]:.2f}s")
+    print(game_input_dispatcher.summary())
@@ -1,58 +1,147 @@
+import argparse
 import logging
+import os
+import sys
+import threading
+import time
 from datetime import datetime
 
-from game_actions import search_for_enemy, attack, add_troops_to_training
-from image_processing import process_screenshot, is_worth_attacking, get_gold_and_minerals, ATTACK_WINDOW_DATA
-from utils import clear_screenshots_directory, get_screenshot, click_and_wait, handle_error, ExcelLogger, \
-    SEARCH_AGAIN_BUTTON
+from startup import ImportTimer, check_setup
+
+# Heavy ML stacks aren't imported here, models are loaded by the inference service or by the warm-up thread
+with ImportTimer() as import_timer:
+    import model_registry
+    import window
+    from archive import screenshot_archive, ARCHIVE_DIRECTORY
+    from game_actions import search_for_enemy, attack, add_troops_to_training
+    from image_processing import get_screenshot, SCAN_WINDOW_DATA, GOLD_VALUE_THRESHOLD, MINERAL_VALUE_THRESHOLD, \
+        DEFENSIVE_BUILDINGS_AMOUNT_THRESHOLD
+    from inference_service import warm_up_inference
+    from input_dispatcher import input_dispatcher
+    from metrics import metrics, METRICS_PATH
+    from ocr_cache import ocr_cache
+    from pipeline import SearchPipeline
+    from run_log import RunLogger
+    from utils import focus_window, click_and_wait, SEARCH_AGAIN_BUTTON, ENEMY_BASE_SCREEN
+    from watchdog import Watchdog
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
 global init_time
-global workbook, sheet
 
 
 def main_loop():
     """
     Loop that manages the overall flow of searching for enemies and attacking.
     """
-    iterations = 0
+    resume_scanning = False
     while True:
         try:
-            search_for_enemy()
+            if not resume_scanning:
+                search_for_enemy()
+            resume_scanning = False
             while True:
                 logging.info("---------------------------------------new enemy---------------------------------------")
-                iterations += 1
-                if iterations % 50 == 0:
-                    raise Exception("Restarting the game after 50 iterations to avoid getting stuck.")
-                gold_value, mineral_value, screen_path, uptime = process_screenshot(init_time)
+                watchdog.check()
+                frame = get_screenshot(window_data=SCAN_WINDOW_DATA)
+                uptime = frame.timestamp - init_time
+                logging.info(f"Uptime: {uptime}")
 
-                if is_worth_attacking(gold_value, mineral_value, screen_path):
-                    end_battle_screenshot = attack()
-                    loot_gold_value, loot_mineral_value = get_gold_and_minerals(end_battle_screenshot,
-                                                                                ATTACK_WINDOW_DATA, "battle")
+                scan_start = time.perf_counter()
+                gold_value, mineral_value, is_worth, analysis = search_pipeline.scan(frame)
+                timings = {'scan': time.perf_counter() - scan_start}
+                watchdog.scanned(gold_value, mineral_value)
 
-                    excel_logger.log_to_excel(gold_value, mineral_value, True, uptime, loot_gold_value,
-                                              loot_mineral_value)
-                    logging.info(f"Results of attack {loot_gold_value} gold and {loot_mineral_value} minerals")
+                if is_worth:
+                    end_battle_screenshot, battle_duration = attack()
+                    timings['battle'] = battle_duration
+                    timings.update(metrics.end_cycle())
+                    search_pipeline.log_attacked(frame, gold_value, mineral_value, uptime, timings, analysis,
+                                                 end_battle_screenshot)
+                    logging.info(f"Battle took {battle_duration:.1f}s")
+                    logging.info(ocr_cache.summary())
+                    logging.info(screenshot_archive.summary())
+                    logging.info(input_dispatcher.summary())
+                    logging.info(watchdog.summary())
 
                     add_troops_to_training()
+                    watchdog.progress()
                     break
                 else:
-                    excel_logger.log_to_excel(gold_value, mineral_value, False, uptime, 0, 0)
-                    click_and_wait(SEARCH_AGAIN_BUTTON, 8)
+                    timings.update(metrics.end_cycle())
+                    search_pipeline.log_skipped(frame, gold_value, mineral_value, uptime, timings, analysis)
+                    click_and_wait(SEARCH_AGAIN_BUTTON, 8, ENEMY_BASE_SCREEN, leave_first=True)
 
         except Exception as e:
             logging.error(f"Error: {e}")
-            iterations = 0
-            handle_error()
+            resume_scanning = watchdog.recover(e)
+
+
+def warm_up_in_background():
+    """
+    Loads the models on a background thread while the game window is being focused.
+
+    Returns:
+        threading.Thread: The warm-up thread
+    """
+    def run():
+        start = time.perf_counter()
+        try:
+            warm_up_inference()
+            logging.info(f"Inference warmed up in {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            # The models are loaded on first use instead
+            logging.error(f"Inference warm-up failed: {e}")
+
+    thread = threading.Thread(target=run, name='warm-up', daemon=True)
+    thread.start()
+    return thread
+
+
+def check():
+    """
+    Dry run: checks the setup without loading any model or touching the game, and prints the import breakdown.
+
+    Returns:
+        int: Exit code, 1 if a check failed
+    """
+    results = check_setup()
+    for passed, description in results:
+        print(f"[{'ok' if passed else 'FAILED'}] {description}")
+    print(import_timer.summary())
+    return 0 if all(passed for passed, _ in results) else 1
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Galaxy Life farming bot.")
+    parser.add_argument('--check', action='store_true',
+                        help="check the setup and print the startup timing breakdown without starting the bot")
+    parser.add_argument('--instance', help="name of this bot when several run at once, see supervisor.py")
+    parser.add_argument('--window', default=window.GAME_WINDOW_TITLE, help="title of the game window to drive")
+    parser.add_argument('--rebenchmark', action='store_true',
+                        help="benchmark the detector runtimes again instead of using the saved choice")
+    args = parser.parse_args()
+    if args.check:
+        sys.exit(check())
+
+    logging.info(import_timer.summary())
+    window.GAME_WINDOW_TITLE = args.window
+    model_registry.DETECTOR_REBENCHMARK = args.rebenchmark
+    metrics_path = METRICS_PATH
+    if args.instance:
+        # Instances share the run log, tagged by run id, but keep their own archive and metrics file
+        screenshot_archive.directory = os.path.join(ARCHIVE_DIRECTORY, args.instance)
+        metrics_path = METRICS_PATH.replace('.prom', f"-{args.instance}.prom")
     init_time = datetime.now()
-    excel_logger = ExcelLogger(init_time)
-    workbook, sheet = None, None
+    run_logger = RunLogger(init_time, (GOLD_VALUE_THRESHOLD, MINERAL_VALUE_THRESHOLD,
+                                       DEFENSIVE_BUILDINGS_AMOUNT_THRESHOLD), instance=args.instance)
+    # Started before the pipeline so the pipeline is drained first at exit and its last entries still get archived
+    screenshot_archive.start()
+    search_pipeline = SearchPipeline(run_logger)
+    watchdog = Watchdog(run_logger)
 
-    clear_screenshots_directory()
-    get_screenshot("Galaxy Life")  # take focus on window
+    warm_up_thread = warm_up_in_background()
+    metrics.start_reporting(path=metrics_path)
+    focus_window()
+    warm_up_thread.join()
     main_loop()
@@ -0,0 +1,201 @@
+import bisect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_ENABLED = True
+METRICS_PATH = '../logs/metrics.prom'
+METRICS_REPORT_INTERVAL = 60
+# Port of the local HTTP endpoint serving the metrics, None to only write METRICS_PATH
+METRICS_HTTP_PORT = None
+
+# Upper bounds of the latency histogram buckets in seconds, from a cached OCR read to a full battle
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 60)
+
+
+class Histogram:
+    """
+    Cumulative latency histogram of a stage with fixed buckets, as exposed by Prometheus.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """
+        Estimates a quantile as the upper bound of the bucket containing it.
+
+        Params:
+            q (float): The quantile, between 0 and 1
+
+        Returns:
+            float: The estimated quantile in seconds, the maximum if it falls in the overflow bucket
+        """
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class Metrics:
+    """
+    Latency histograms of every instrumented stage: clicks and waits, captures, OCR reads, YOLO calls and run log
+    writes. Stages are timed with `span`, which only costs two clock reads and a lock when enabled. Time spent in each
+    stage is also summed per enemy cycle, so it can be logged next to the enemy's row.
+    """
+
+    def __init__(self, enabled=METRICS_ENABLED):
+        self.enabled = enabled
+        self.histograms = {}
+        self.cycle = {}
+        self.lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        """
+        Records the duration of a stage.
+
+        Params:
+            stage (str): Name of the stage
+            seconds (float): Duration of the stage
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.observe(seconds)
+            self.cycle[stage] = self.cycle.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def span(self, stage):
+        """
+        Times the enclosed block as a stage, whether or not it raises.
+
+        Params:
+            stage (str): Name of the stage
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def end_cycle(self):
+        """
+        Ends the current enemy cycle.
+
+        Returns:
+            dict: Seconds spent in each stage since the previous cycle ended, on any thread
+        """
+        with self.lock:
+            cycle, self.cycle = self.cycle, {}
+        return {stage: round(seconds, 4) for stage, seconds in cycle.items()}
+
+    def summary(self):
+        with self.lock:
+            stages = sorted(self.histograms.items(), key=lambda item: -item[1].sum)
+            lines = [f"{stage}: n={h.count}, total {h.sum:.1f}s, mean {h.sum / h.count * 1000:.1f}ms, "
+                     f"p50 <= {h.quantile(0.5) * 1000:.1f}ms, p99 <= {h.quantile(0.99) * 1000:.1f}ms, "
+                     f"max {h.max * 1000:.1f}ms" for stage, h in stages]
+        return "Stage latencies:\n  " + "\n  ".join(lines) if lines else "Stage latencies: nothing recorded yet"
+
+    def to_prometheus(self):
+        """
+        Returns:
+            str: The histograms in the Prometheus text exposition format
+        """
+        lines = ["# HELP galaxylifebot_stage_seconds Latency of the bot's stages.",
+                 "# TYPE galaxylifebot_stage_seconds histogram"]
+        with self.lock:
+            for stage, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'galaxylifebot_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'galaxylifebot_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'galaxylifebot_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+                lines.append(f'galaxylifebot_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path=METRICS_PATH):
+        """
+        Writes the histograms to a text file, e.g. for the node exporter's textfile collector. The file is replaced
+        atomically so a scrape never reads it half written.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.tmp", 'w') as f:
+            f.write(self.to_prometheus())
+        os.replace(f"{path}.tmp", path)
+
+    def start_reporting(self, interval=METRICS_REPORT_INTERVAL, http_port=METRICS_HTTP_PORT, path=METRICS_PATH):
+        """
+        Starts logging the summary and writing the metrics file every interval, and serving the metrics over HTTP if
+        a port is given.
+
+        Params:
+            interval (float): Seconds between reports
+            http_port (int | None): Local port of the HTTP endpoint
+            path (str): Path to the metrics file
+        """
+        if not self.enabled:
+            return
+        threading.Thread(target=self.report, args=(interval, path), name='metrics-reporter', daemon=True).start()
+        if http_port is not None:
+            from http.server import ThreadingHTTPServer
+
+            server = ThreadingHTTPServer(('127.0.0.1', http_port), self.handler())
+            threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+            logging.info(f"Serving metrics on http://127.0.0.1:{http_port}/metrics")
+
+    def report(self, interval, path=METRICS_PATH):
+        while True:
+            time.sleep(interval)
+            logging.info(self.summary())
+            try:
+                self.write_prometheus(path)
+            except OSError as e:
+                logging.error(f"Couldn't write metrics: {e}")
+
+    def handler(self):
+        from http.server import BaseHTTPRequestHandler
+
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return MetricsHandler
+
+
+metrics = Metrics()
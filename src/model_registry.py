@@ -0,0 +1,236 @@
+import importlib.util
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+DETECTOR_MODEL_PATH = "../model/train104/weights/best.pt"
+# Runtime of the defence detector, one of DETECTOR_RUNTIMES or 'auto' to benchmark the available ones and keep the
+# fastest. Exported models are created with `python export.py export <onnx|openvino> [--int8]` in model_training.
+DETECTOR_RUNTIME = 'auto'
+DETECTOR_RUNTIMES = {
+    'torch': (DETECTOR_MODEL_PATH, 'torch'),
+    'onnx': ("../model/train104/weights/best.onnx", 'onnxruntime'),
+    'onnx-int8': ("../model/train104/weights/best-int8.onnx", 'onnxruntime'),
+    'openvino': ("../model/train104/weights/best_openvino_model", 'openvino'),
+    'openvino-int8': ("../model/train104/weights/best_int8_openvino_model", 'openvino'),
+}
+DETECTOR_BENCHMARK_RUNS = 3
+# Runtime chosen by 'auto', kept with the modification times of the exports it was benchmarked on. The runtimes are
+# only benchmarked again when an export is added, removed or rebuilt, or when DETECTOR_REBENCHMARK is set
+DETECTOR_RUNTIME_CHOICE_PATH = "../model/train104/weights/detector_runtime.json"
+DETECTOR_REBENCHMARK = False
+OCR_LANGUAGES = ['en']
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of the heavy models used by the bot. Every model is loaded once, warmed up with a dummy
+    inference and then shared by all callers, including the ones running after an F5 recovery. torch, ultralytics and
+    easyocr are only imported when a model is loaded, so a bot using the inference service never imports them.
+    """
+
+    def __init__(self):
+        self.models = {}
+        self.load_times = {}
+        self.warm_up_times = {}
+        self.detector_runtime = None
+        # Held while a model is loaded, so a background warm-up and the first scan don't load it twice
+        self.lock = threading.Lock()
+
+    def get_detector(self):
+        """
+        Returns the shared YOLO defence detector, loading it on first use.
+
+        Returns:
+            YOLO: The detector model
+        """
+        return self.get_model('detector', self.load_detector, self.warm_up_detector)
+
+    def get_reader(self):
+        """
+        Returns the shared EasyOCR reader, loading it on first use.
+
+        Returns:
+            easyocr.Reader: The OCR reader
+        """
+        return self.get_model('reader', self.load_reader, self.warm_up_reader)
+
+    def get_model(self, name, loader, warm_up):
+        """
+        Returns a cached model, loading and warming it up if it hasn't been requested before.
+
+        Params:
+            name (str): Name of the model in the registry
+            loader (callable): Function building the model
+            warm_up (callable): Function running a dummy inference on the built model
+
+        Returns:
+            The cached model
+        """
+        if name in self.models:
+            return self.models[name]
+
+        with self.lock:
+            if name in self.models:
+                return self.models[name]
+
+            start = time.perf_counter()
+            model = loader()
+            self.load_times[name] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            warm_up(model)
+            self.warm_up_times[name] = time.perf_counter() - start
+
+            logging.info(f"Model '{name}' loaded in {self.load_times[name]:.2f}s, "
+                         f"warmed up in {self.warm_up_times[name]:.2f}s")
+
+            self.models[name] = model
+        return model
+
+    def warm_up(self):
+        """
+        Loads and warms up every model so the first scanned enemy doesn't pay for it.
+        """
+        self.get_reader()
+        self.get_detector()
+
+    def load_detector(self):
+        """
+        Loads the defence detector with the configured runtime, or with the fastest available one.
+
+        Returns:
+            YOLO: The detector model
+        """
+        import torch
+        from ultralytics import YOLO
+
+        if DETECTOR_RUNTIME != 'auto':
+            self.detector_runtime = DETECTOR_RUNTIME
+            return YOLO(DETECTOR_RUNTIMES[DETECTOR_RUNTIME][0], task='detect')
+
+        runtimes = available_detector_runtimes()
+        if torch.cuda.is_available() or len(runtimes) <= 1:
+            # The CPU runtimes can't beat PyTorch on a GPU
+            self.detector_runtime = 'torch'
+            return YOLO(DETECTOR_MODEL_PATH)
+
+        exports = detector_exports(runtimes)
+        runtime = None if DETECTOR_REBENCHMARK else load_runtime_choice(exports)
+        if runtime is not None:
+            self.detector_runtime = runtime
+            logging.info(f"Using detector runtime '{runtime}' benchmarked on the same exports before, run with "
+                         f"--rebenchmark to measure them again")
+            return YOLO(DETECTOR_RUNTIMES[runtime][0], task='detect')
+
+        fastest, fastest_latency, latencies = None, None, {}
+        for runtime in runtimes:
+            detector = YOLO(DETECTOR_RUNTIMES[runtime][0], task='detect')
+            self.warm_up_detector(detector)
+            start = time.perf_counter()
+            for _ in range(DETECTOR_BENCHMARK_RUNS):
+                self.warm_up_detector(detector)
+            latency = (time.perf_counter() - start) / DETECTOR_BENCHMARK_RUNS
+            latencies[runtime] = latency
+            logging.info(f"Detector runtime '{runtime}': {latency * 1000:.0f}ms per frame")
+            if fastest_latency is None or latency < fastest_latency:
+                fastest, fastest_latency = (runtime, detector), latency
+
+        self.detector_runtime = fastest[0]
+        save_runtime_choice(self.detector_runtime, exports, latencies)
+        logging.info(f"Using detector runtime '{self.detector_runtime}'")
+        return fastest[1]
+
+    @staticmethod
+    def load_reader():
+        import easyocr
+        import torch
+
+        with torch.no_grad():
+            return easyocr.Reader(OCR_LANGUAGES, gpu=torch.cuda.is_available())
+
+    @staticmethod
+    def warm_up_detector(detector):
+        detector(np.zeros((640, 640, 3), dtype=np.uint8), verbose=False)
+
+    @staticmethod
+    def warm_up_reader(reader):
+        reader.readtext(np.zeros((32, 96), dtype=np.uint8), detail=0)
+
+
+def available_detector_runtimes():
+    """
+    Returns:
+        list: Names of the detector runtimes whose model has been exported and whose package is installed
+    """
+    return [runtime for runtime, (path, package) in DETECTOR_RUNTIMES.items()
+            if os.path.exists(path) and importlib.util.find_spec(package) is not None]
+
+
+def detector_exports(runtimes):
+    """
+    Returns the latest modification time of the model of every runtime, including the files of exported directories.
+
+    Params:
+        runtimes (list): Names of the detector runtimes
+
+    Returns:
+        dict: Runtime name to the modification time of its model
+    """
+    exports = {}
+    for runtime in runtimes:
+        path = DETECTOR_RUNTIMES[runtime][0]
+        mtimes = [os.path.getmtime(path)]
+        if os.path.isdir(path):
+            mtimes += [os.path.getmtime(os.path.join(directory, name))
+                       for directory, _, names in os.walk(path) for name in names]
+        exports[runtime] = max(mtimes)
+    return exports
+
+
+def load_runtime_choice(exports, path=DETECTOR_RUNTIME_CHOICE_PATH):
+    """
+    Loads the runtime chosen by the last benchmark if it was run on the same exports.
+
+    Params:
+        exports (dict): Modification times of the current exports, see detector_exports
+        path (str): Path to the saved choice
+
+    Returns:
+        str | None: The chosen runtime, None if there is no saved choice or the exports changed since
+    """
+    try:
+        with open(path) as f:
+            choice = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if choice.get('exports') != exports or choice.get('runtime') not in exports:
+        logging.info("Detector exports changed since the last runtime benchmark")
+        return None
+    return choice['runtime']
+
+
+def save_runtime_choice(runtime, exports, latencies, path=DETECTOR_RUNTIME_CHOICE_PATH):
+    """
+    Saves the runtime chosen by a benchmark, see load_runtime_choice.
+
+    Params:
+        runtime (str): The chosen runtime
+        exports (dict): Modification times of the benchmarked exports
+        latencies (dict): Runtime name to its measured seconds per frame
+        path (str): Path to the saved choice
+    """
+    try:
+        with open(path, 'w') as f:
+            json.dump({'runtime': runtime, 'exports': exports, 'latencies': latencies,
+                       'benchmarked_at': datetime.now().isoformat(timespec='seconds')}, f, indent=2)
+    except OSError as e:
+        logging.warning(f"Couldn't save the detector runtime choice to {path}: {e}")
+
+
+model_registry = ModelRegistry()
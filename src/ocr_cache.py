@@ -0,0 +1,128 @@
+import atexit
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from digit_ocr import binarize
+
+OCR_CACHE_SIZE = 4096
+OCR_CACHE_PATH = '../logs/ocr_cache.json'
+PERSIST_OCR_CACHE = False
+
+
+class OcrCache:
+    """
+    Bounded LRU cache of OCR readings keyed on a hash of the binarized region, so a counter image that has already
+    been read is never decoded again.
+    """
+
+    def __init__(self, max_size=OCR_CACHE_SIZE, path=None):
+        self.max_size = max_size
+        self.path = path
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(region_of_interest):
+        """
+        Hashes a grayscale region after binarizing it, so that pixel noise which doesn't change the glyphs maps to
+        the same key.
+
+        Params:
+            region_of_interest (numpy.ndarray): The grayscale region
+
+        Returns:
+            str: The key of the region
+        """
+        binary = np.packbits(binarize(np.ascontiguousarray(region_of_interest)) > 0)
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(np.array(region_of_interest.shape, dtype=np.int32).tobytes())
+        digest.update(binary.tobytes())
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Looks a reading up.
+
+        Params:
+            key (str): The key of the region
+
+        Returns:
+            str | None: The cached reading, None if the region hasn't been read yet
+        """
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Stores a reading, evicting the least recently used one if the cache is full.
+
+        Params:
+            key (str): The key of the region
+            value (str): The reading
+        """
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def summary(self):
+        """
+        Returns:
+            str: Size of the cache and its hit, miss and eviction counters
+        """
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups else 0
+        return (f"OCR cache: {len(self.entries)}/{self.max_size} entries, {self.hits} hits, {self.misses} misses "
+                f"({hit_rate:.1%} hit rate), {self.evictions} evictions")
+
+    def load(self):
+        """
+        Loads readings persisted by a previous run.
+        """
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+            with self.lock:
+                self.entries.update(list(entries.items())[-self.max_size:])
+            logging.info(f"Loaded {len(entries)} OCR cache entries from {self.path}")
+        except (OSError, ValueError) as e:
+            logging.error(f"Couldn't load OCR cache from {self.path}: {e}")
+
+    def save(self):
+        """
+        Persists the readings so the next run starts with them.
+        """
+        if self.path is None:
+            return
+        with self.lock:
+            entries = dict(self.entries)
+        try:
+            with open(self.path, 'w') as f:
+                json.dump(entries, f)
+            logging.info(f"Saved {len(entries)} OCR cache entries to {self.path}")
+        except OSError as e:
+            logging.error(f"Couldn't save OCR cache to {self.path}: {e}")
+
+
+ocr_cache = OcrCache(path=OCR_CACHE_PATH if PERSIST_OCR_CACHE else None)
+ocr_cache.load()
+atexit.register(ocr_cache.save)
@@ -0,0 +1,251 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from capture import capture_frame
+from image_processing import get_gold_and_minerals, evaluate_enemy, detect_defences, save_screenshot, \
+    SCAN_WINDOW_DATA, ATTACK_WINDOW_DATA
+from metrics import metrics
+
+PIPELINE_REPORT_INTERVAL = 10
+# Start the defence detection of every enemy alongside its resource OCR instead of after it, dropping it for enemies
+# the resources rule out. Candidates are decided in about max(OCR, detection) instead of their sum, but every enemy
+# then costs a full screen capture and usually a detection competing with the OCR for the CPU; only enable it once
+# replay.py --speculative shows a higher throughput on this host
+SPECULATIVE_DETECTION = False
+
+
+class PipelineStage:
+    """
+    A worker thread running submitted jobs in order from a bounded queue. Submitting blocks while the queue is full,
+    so a slow stage holds the game-input actor back instead of piling up work.
+    """
+
+    def __init__(self, name, max_queue_size):
+        self.name = name
+        self.jobs = queue.Queue(maxsize=max_queue_size)
+        self.max_depth = 0
+        self.processed = 0
+        self.thread = threading.Thread(target=self.run, name=f"{name}-stage", daemon=True)
+        self.thread.start()
+
+    def submit(self, function, *args):
+        """
+        Queues a job for the stage.
+
+        Params:
+            function (callable): The job to run
+            *args: Arguments of the job
+
+        Returns:
+            Future: The result of the job
+        """
+        future = Future()
+        self.jobs.put((future, function, args))
+        self.max_depth = max(self.max_depth, self.jobs.qsize())
+        return future
+
+    def run(self):
+        while True:
+            future, function, args = self.jobs.get()
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(function(*args))
+                    except Exception as e:
+                        future.set_exception(e)
+                self.processed += 1
+            finally:
+                self.jobs.task_done()
+
+    def drain(self):
+        """
+        Waits until every queued job has been run.
+        """
+        self.jobs.join()
+
+    def summary(self):
+        return f"{self.name}: depth {self.jobs.qsize()}/{self.jobs.maxsize} (max {self.max_depth}), " \
+               f"{self.processed} done"
+
+
+class SpeculativeDetection:
+    """
+    Defence detection of an enemy started as soon as it's captured, on the full screen captured at that moment, and
+    running on a stage thread while its resources are read. The detections are used if the resources make the enemy a
+    candidate and dropped otherwise: a detection that hasn't started is cancelled, a running one finishes and its time
+    is counted as wasted. Metrics count the 'speculation_used', 'speculation_wasted' and 'speculation_cancelled'
+    detections.
+    """
+
+    def __init__(self, stage):
+        self.frame = capture_frame()
+        self.seconds = 0.0
+        self.used = False
+        self.future = stage.submit(self.detect)
+
+    def detect(self):
+        start = time.perf_counter()
+        try:
+            return detect_defences(self.frame)
+        finally:
+            self.seconds = time.perf_counter() - start
+
+    def result(self):
+        """
+        Waits for the detection.
+
+        Returns:
+            A tuple (frame, all_detections) containing:
+            - frame (Frame): The full screen the detector ran on
+            - all_detections (Detections): All detections, in screen coordinates
+        """
+        self.used = True
+        all_detections = self.future.result()
+        metrics.observe('speculation_used', self.seconds)
+        return self.frame, all_detections
+
+    def drop(self):
+        """
+        Cancels the detection, or lets it finish without waiting for it, unless its result was used.
+        """
+        if self.used:
+            return
+        if self.future.cancel():
+            metrics.observe('speculation_cancelled', 0.0)
+        else:
+            self.future.add_done_callback(lambda _: metrics.observe('speculation_wasted', self.seconds))
+
+
+def scan_enemy(frame, speculation_stage=None):
+    """
+    Reads the resources of an enemy and decides whether it's worth attacking.
+
+    Params:
+        frame (Frame): The captured resource counters region
+        speculation_stage (PipelineStage | None): Stage the defence detection is started on alongside the OCR, see
+            SpeculativeDetection; None to only run the detector once the resources make the enemy a candidate
+
+    Returns:
+        A tuple (gold_value, mineral_value, is_worth, analysis) containing:
+        - gold_value (str): gold value
+        - mineral_value (str): mineral value
+        - is_worth (bool): True if the enemy is worth attacking
+        - analysis (dict): Defence features and expected loot of the enemy, see evaluate_enemy
+    """
+    speculation = SpeculativeDetection(speculation_stage) if speculation_stage is not None else None
+    try:
+        gold_value, mineral_value = get_gold_and_minerals(frame, SCAN_WINDOW_DATA)
+        return gold_value, mineral_value, *evaluate_enemy(gold_value, mineral_value, frame, speculation)
+    finally:
+        if speculation is not None:
+            speculation.drop()
+
+
+def log_scan(run_logger, frame, gold_value, mineral_value, is_worth, uptime, timings, analysis, loot=None):
+    """
+    Saves the screenshot of a scanned enemy and logs its row, waiting for the loot reading of an attacked one. The full
+    screen is saved for an analysed enemy, so the archive keeps frames the replay and the detector training can use,
+    and only the resource counters region for the others.
+
+    Params:
+        run_logger (RunLogger): The run log
+        frame (Frame): The captured resource counters region
+        gold_value (str): gold value
+        mineral_value (str): mineral value
+        is_worth (bool): True if the enemy was attacked
+        uptime (timedelta): bot's uptime
+        timings (dict): Seconds spent in each stage of handling the enemy
+        analysis (dict): Defence features and expected loot of the enemy, and the analysed full screen
+        loot (Future | None): Pending (looted gold, looted minerals) reading of an attacked enemy, logged as missing if
+            it fails
+    """
+    save_screenshot(analysis.get('frame', frame), is_worth, low_confidence=not (gold_value and mineral_value))
+    loot_gold_value, loot_mineral_value = 0, 0
+    if loot is not None:
+        try:
+            loot_gold_value, loot_mineral_value = loot.result()
+        except Exception as e:
+            # Logged as unknown rather than as an empty base, so statistics and the attack policy can skip it
+            logging.error(f"Couldn't read the loot: {e}")
+            loot_gold_value, loot_mineral_value = None, None
+    run_logger.log_row(gold_value, mineral_value, is_worth, uptime, loot_gold_value, loot_mineral_value, timings,
+                       analysis)
+    if loot is not None:
+        logging.info(f"Results of attack {loot_gold_value} gold and {loot_mineral_value} minerals")
+
+
+def report_failure(future):
+    """
+    Logs the error of a finished job nobody waits for.
+
+    Params:
+        future (Future): The finished job
+    """
+    if not future.cancelled() and future.exception() is not None:
+        logging.error(f"Pipeline job failed: {future.exception()}")
+
+
+class SearchPipeline:
+    """
+    Runs the analysis of scanned enemies and the logging of their results on stage threads. The main thread stays the
+    only game-input actor: it captures an enemy, waits only for the attack decision and clicks on, while the
+    screenshot and the log row of that enemy are written as the next one is loading. Loot of an attacked enemy is
+    read while the troops are being trained. With SPECULATIVE_DETECTION the defences of every enemy are detected on a
+    third stage while its resources are read.
+    """
+
+    def __init__(self, run_logger):
+        self.run_logger = run_logger
+        self.inference = PipelineStage('inference', max_queue_size=2)
+        self.logging = PipelineStage('logging', max_queue_size=32)
+        self.speculation = PipelineStage('speculation', max_queue_size=1) if SPECULATIVE_DETECTION else None
+        self.start_time = time.monotonic()
+        self.evaluated = 0
+        atexit.register(self.drain)
+
+    def scan(self, frame):
+        """
+        Analyses a captured enemy, returning once the attack decision is known.
+
+        Params:
+            frame (Frame): The captured resource counters region
+
+        Returns:
+            A tuple (gold_value, mineral_value, is_worth, analysis), see scan_enemy
+        """
+        result = self.inference.submit(scan_enemy, frame, self.speculation).result()
+        self.evaluated += 1
+        if self.evaluated % PIPELINE_REPORT_INTERVAL == 0:
+            logging.info(self.summary())
+        return result
+
+    def log_skipped(self, frame, gold_value, mineral_value, uptime, timings, analysis):
+        self.logging.submit(log_scan, self.run_logger, frame, gold_value, mineral_value, False, uptime, timings,
+                            analysis) \
+            .add_done_callback(report_failure)
+
+    def log_attacked(self, frame, gold_value, mineral_value, uptime, timings, analysis, end_battle_frame):
+        """
+        Queues reading the loot of an attacked enemy and logging it, without waiting for either.
+        """
+        loot = self.inference.submit(get_gold_and_minerals, end_battle_frame, ATTACK_WINDOW_DATA, "battle")
+        self.logging.submit(log_scan, self.run_logger, frame, gold_value, mineral_value, True, uptime, timings,
+                            analysis, loot) \
+            .add_done_callback(report_failure)
+
+    def drain(self):
+        self.inference.drain()
+        self.logging.drain()
+        if self.speculation is not None:
+            self.speculation.drain()
+
+    def summary(self):
+        hours = (time.monotonic() - self.start_time) / 3600
+        rate = self.evaluated / hours if hours > 0 else 0
+        stages = [self.inference, self.logging] + ([self.speculation] if self.speculation is not None else [])
+        return f"Pipeline: {self.evaluated} enemies evaluated ({rate:.0f}/h); " \
+               f"{'; '.join(stage.summary() for stage in stages)}"
@@ -0,0 +1,351 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+import image_processing
+import model_registry
+from capture import FakeCaptureBackend, capture_frame, set_capture_backend
+from frame import Frame
+from image_processing import process_screenshot, is_worth_attacking, is_worth_based_on_defences, detect_defences, \
+    decide_on_defences, get_screenshot, SCAN_WINDOW_DATA, DETECTION_SCORE_THRESHOLD
+from input_dispatcher import FakeInputBackend
+from metrics import metrics
+from pipeline import scan_enemy, PipelineStage
+from ocr_cache import ocr_cache
+from utils import set_input_backend
+from window import set_window_finder
+
+REPLAY_DIRECTORY = '../logs/screenshots'
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+LATENCY_PERCENTILES = [50, 90, 99]
+
+
+class RecordingWindow:
+    """
+    Stand-in for a pygetwindow window covering the replayed screen, recording every call.
+    """
+
+    def __init__(self, title, width, height):
+        self.title = title
+        self.left, self.top = 0, 0
+        self.width, self.height = width, height
+        self.isActive = True
+        self.calls = []
+
+    def activate(self):
+        self.calls.append('activate')
+        self.isActive = True
+
+    def maximize(self):
+        self.calls.append('maximize')
+
+    def moveTo(self, x, y):
+        self.calls.append('moveTo')
+        self.left, self.top = x, y
+
+
+def find_replay_frames(directories):
+    """
+    Lists the recorded frames that cover the resource counters, skipping annotated detection images and the resource
+    counter crops saved by recent runs.
+
+    Params:
+        directories (list): Directories containing recorded frames
+
+    Returns:
+        list: Paths to the frames in name order
+    """
+    min_width = SCAN_WINDOW_DATA[0] + SCAN_WINDOW_DATA[2]
+    min_height = SCAN_WINDOW_DATA[1] + SCAN_WINDOW_DATA[3]
+    paths = []
+    for directory in directories:
+        for name in sorted(os.listdir(directory)):
+            if not name.lower().endswith(IMAGE_EXTENSIONS) or '_detections' in name:
+                continue
+            path = os.path.join(directory, name)
+            image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+            if image is None or image.shape[1] < min_width or image.shape[0] < min_height:
+                logging.debug(f"Skipping {path}, it isn't a full screen frame")
+                continue
+            paths.append(path)
+    return paths
+
+
+def install_replay(frame_paths, save_outputs=False):
+    """
+    Replaces the screen, the game window and the input with stand-ins serving recorded frames.
+
+    Params:
+        frame_paths (list): Paths to the recorded frames
+        save_outputs (bool): Whether screenshots and detection results are still saved while replaying
+
+    Returns:
+        A tuple (capture_backend, recording_input) containing:
+        - capture_backend (FakeCaptureBackend): The backend serving the frames
+        - recording_input (FakeInputBackend): The recorded input
+    """
+    capture_backend = FakeCaptureBackend(frame_paths)
+    set_capture_backend(capture_backend)
+    width, height = capture_backend.screen_size()
+    set_window_finder(lambda title: [RecordingWindow(title, width, height)])
+    recording_input = FakeInputBackend()
+    set_input_backend(recording_input)
+
+    image_processing.SAVE_SCREENSHOTS = save_outputs
+    image_processing.SAVE_DETECTION_RESULTS = save_outputs
+    return capture_backend, recording_input
+
+
+def timed(timings, memory, stage, function, *args):
+    """
+    Runs a stage, recording its latency and, if memory is traced, its peak traced allocation.
+    """
+    if memory is not None:
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    result = function(*args)
+    timings.setdefault(stage, []).append(time.perf_counter() - start)
+    if memory is not None:
+        memory.setdefault(stage, []).append(tracemalloc.get_traced_memory()[1])
+    return result
+
+
+def replay(capture_backend, detect_all=False, trace_memory=False, speculative=False):
+    """
+    Feeds every recorded frame through the decision pipeline.
+
+    Params:
+        capture_backend (FakeCaptureBackend): The backend serving the frames
+        detect_all (bool): Run the defence detection on every frame, not only on the ones passing the thresholds
+        trace_memory (bool): Record the peak traced allocation of every stage
+        speculative (bool): Start the defence detection alongside the resource OCR, as the live pipeline does with
+            SPECULATIVE_DETECTION; the decision is timed as 'scan_enemy' instead of 'is_worth_attacking'
+
+    Returns:
+        A tuple (decisions, timings, memory, elapsed) containing:
+        - decisions (dict): Frame name to its readings and decisions
+        - timings (dict): Stage name to the list of its latencies
+        - memory (dict | None): Stage name to the list of its peak traced allocations
+        - elapsed (float): Seconds spent replaying
+    """
+    init_time = datetime.now()
+    decisions, timings = {}, {}
+    memory = {} if trace_memory else None
+    if trace_memory:
+        tracemalloc.start()
+    speculation_stage = PipelineStage('speculation', max_queue_size=1) if speculative else None
+
+    start = time.perf_counter()
+    while True:
+        try:
+            if speculation_stage is not None:
+                frame = timed(timings, memory, 'get_screenshot', get_screenshot, None, SCAN_WINDOW_DATA)
+                gold_value, mineral_value, is_worth, _ = timed(timings, memory, 'scan_enemy', scan_enemy, frame,
+                                                               speculation_stage)
+            else:
+                gold_value, mineral_value, frame, _ = timed(timings, memory, 'process_screenshot',
+                                                            process_screenshot, init_time)
+                is_worth = timed(timings, memory, 'is_worth_attacking', is_worth_attacking, gold_value,
+                                 mineral_value, frame)
+            decision = {'gold_value': gold_value, 'mineral_value': mineral_value, 'is_worth': is_worth}
+            if detect_all:
+                full_frame = timed(timings, memory, 'capture_frame', capture_frame)
+                decision['is_worth_based_on_defences'] = timed(timings, memory, 'is_worth_based_on_defences',
+                                                               is_worth_based_on_defences, full_frame)
+        except Exception as e:
+            # The live loop would recover with the watchdog, the replay records the failure and moves on
+            decision = {'error': str(e)}
+        decisions[os.path.basename(capture_backend.current_path)] = decision
+        if not capture_backend.advance():
+            break
+    elapsed = time.perf_counter() - start
+    if speculation_stage is not None:
+        speculation_stage.drain()
+
+    if trace_memory:
+        tracemalloc.stop()
+    return decisions, timings, memory, elapsed
+
+
+def detection_decision(frame):
+    """
+    Runs the defence detection on a frame with the current detection settings.
+
+    Returns:
+        A tuple (decision, latency) containing:
+        - decision (dict): The amount of defences, whether the base is on the edge and the resulting decision
+        - latency (float): Seconds spent in the detector and the analysis
+    """
+    start = time.perf_counter()
+    detections = detect_defences(frame).filter(DETECTION_SCORE_THRESHOLD)
+    result, _, is_base_on_edge = decide_on_defences(detections)
+    latency = time.perf_counter() - start
+    return {'defences': len(detections), 'is_base_on_edge': is_base_on_edge, 'is_worth': result}, latency
+
+
+def compare_detection_paths(frame_paths, detection_window_data, detection_image_size):
+    """
+    Runs the defence detection on every recorded frame twice, on the full screen at 640 and on a region at a given
+    size, and compares their latency and decisions.
+
+    Params:
+        frame_paths (list): Paths to the recorded full screen frames
+        detection_window_data (list | None): The region the detector sees, None for the full screen
+        detection_image_size (int): Input size of the detector on that region
+
+    Returns:
+        float: Part of the frames with the same defence count, base on edge and decision on both paths
+    """
+    paths = {'full screen at 640': (None, 640),
+             f"{detection_window_data or 'full screen'} at {detection_image_size}": (detection_window_data,
+                                                                                    detection_image_size)}
+    decisions, latencies = {}, {}
+    for name, (window_data, image_size) in paths.items():
+        image_processing.DETECTION_WINDOW_DATA, image_processing.DETECTION_IMAGE_SIZE = window_data, image_size
+        # The first inference at a new size pays for its setup
+        detection_decision(Frame(cv2.imread(frame_paths[0])))
+        for path in frame_paths:
+            decision, latency = detection_decision(Frame(cv2.imread(path)))
+            decisions.setdefault(name, {})[os.path.basename(path)] = decision
+            latencies.setdefault(name, []).append(latency)
+
+    (reference, reference_latencies), (candidate, candidate_latencies) = \
+        [(name, np.array(latencies[name]) * 1000) for name in paths]
+    for name, values in [(reference, reference_latencies), (candidate, candidate_latencies)]:
+        print(f"{name:<48} p50 {np.percentile(values, 50):.1f}ms, p90 {np.percentile(values, 90):.1f}ms")
+    saved = 1 - np.median(candidate_latencies) / np.median(reference_latencies)
+    print(f"Latency saved: {saved:.1%} at p50")
+
+    agreement, different_frames = compare_decisions(decisions[candidate], decisions[reference])
+    print(f"Same defence count, base on edge and decision on {agreement:.2%} of {len(frame_paths)} frames")
+    for different_frame in different_frames:
+        print(f"  {different_frame}: {decisions[candidate][different_frame]} != "
+              f"{decisions[reference][different_frame]}")
+    return agreement
+
+
+def compare_decisions(decisions, baseline):
+    """
+    Compares decisions with the ones of a baseline replay of the same frames.
+
+    Params:
+        decisions (dict): Frame name to its readings and decisions
+        baseline (dict): Frame name to its baseline readings and decisions
+
+    Returns:
+        A tuple (agreement, disagreements) containing:
+        - agreement (float): Part of the common frames with identical readings and decisions
+        - disagreements (list): Names of the frames that differ
+    """
+    common = sorted(set(decisions) & set(baseline))
+    # Only the readings and decisions made in both replays are compared, e.g. when only one of them used --detect-all
+    disagreements = [name for name in common
+                     if any(decisions[name][key] != baseline[name][key] for key in decisions[name].keys()
+                            & baseline[name].keys())
+                     or decisions[name].keys().isdisjoint(baseline[name].keys())]
+    agreement = 1 - len(disagreements) / len(common) if common else 1.0
+    return agreement, disagreements
+
+
+def peak_rss_mib():
+    """
+    Returns:
+        float | None: Peak resident memory of the process in MiB, None where it isn't available, e.g. on Windows
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def print_report(timings, memory, elapsed, frame_count):
+    """
+    Prints latency percentiles, memory and throughput of every replayed stage.
+    """
+    print(f"Frames: {frame_count}, elapsed: {elapsed:.2f}s, throughput: {frame_count / elapsed:.2f} frames/s")
+    percentiles = ', '.join(f"p{p}" for p in LATENCY_PERCENTILES)
+    for stage, latencies in timings.items():
+        values = np.percentile(np.array(latencies) * 1000, LATENCY_PERCENTILES)
+        line = f"{stage:<28} n={len(latencies):<5} {percentiles} ms: {', '.join(f'{v:.2f}' for v in values)}"
+        if memory is not None:
+            line += f", peak traced {max(memory[stage]) / 2 ** 20:.1f} MiB"
+        print(line)
+    max_rss = peak_rss_mib()
+    if max_rss is not None:
+        print(f"Max RSS: {max_rss:.0f} MiB")
+    print(ocr_cache.summary())
+    print(metrics.summary())
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Replay recorded frames through the decision pipeline and benchmark "
+                                                 "it, without a game window.")
+    parser.add_argument('directories', nargs='*', default=[REPLAY_DIRECTORY], help="directories of recorded frames")
+    parser.add_argument('--limit', type=int, help="replay at most this many frames")
+    parser.add_argument('--detect-all', action='store_true', help="run the defence detection on every frame")
+    parser.add_argument('--memory', action='store_true', help="trace peak allocations of every stage")
+    parser.add_argument('--speculative', action='store_true',
+                        help="start the defence detection alongside the resource OCR")
+    parser.add_argument('--imgsz', type=int, default=image_processing.DETECTION_IMAGE_SIZE,
+                        help="input size of the defence detector")
+    parser.add_argument('--playfield-detection', action='store_true',
+                        help="run the defence detector on the playfield instead of the configured region")
+    parser.add_argument('--compare-detection', action='store_true',
+                        help="compare the configured detection region, or the playfield if the detector sees the full "
+                             "screen, with full screen detection at 640 and exit")
+    parser.add_argument('--detector-runtime', choices=['auto', *model_registry.DETECTOR_RUNTIMES],
+                        default=model_registry.DETECTOR_RUNTIME, help="runtime of the defence detector")
+    parser.add_argument('--rebenchmark', action='store_true',
+                        help="benchmark the detector runtimes again instead of using the saved choice")
+    parser.add_argument('--save-baseline', help="save the decisions to this JSON file")
+    parser.add_argument('--baseline', help="compare the decisions with this JSON file")
+    parser.add_argument('--min-agreement', type=float, default=1.0,
+                        help="exit with an error if the agreement with the baseline is lower")
+    args = parser.parse_args()
+
+    replay_frames = find_replay_frames(args.directories)[:args.limit]
+    if not replay_frames:
+        print("No recorded frames to replay.")
+        sys.exit(1)
+
+    model_registry.DETECTOR_RUNTIME = args.detector_runtime
+    model_registry.DETECTOR_REBENCHMARK = args.rebenchmark
+    image_processing.DETECTION_IMAGE_SIZE = args.imgsz
+    if args.playfield_detection:
+        image_processing.DETECTION_WINDOW_DATA = image_processing.PLAYFIELD_WINDOW_DATA
+    if args.compare_detection:
+        compared_window_data = image_processing.DETECTION_WINDOW_DATA or image_processing.PLAYFIELD_WINDOW_DATA
+        detection_agreement = compare_detection_paths(replay_frames, compared_window_data, args.imgsz)
+        sys.exit(0 if detection_agreement >= args.min_agreement else 1)
+
+    backend, _ = install_replay(replay_frames)
+    replay_decisions, replay_timings, replay_memory, replay_elapsed = replay(backend, args.detect_all, args.memory,
+                                                                        args.speculative)
+    print_report(replay_timings, replay_memory, replay_elapsed, len(replay_frames))
+    if model_registry.model_registry.detector_runtime is not None:
+        print(f"Detector runtime: {model_registry.model_registry.detector_runtime}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(replay_decisions, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline_decisions = json.load(f)
+        replay_agreement, different_frames = compare_decisions(replay_decisions, baseline_decisions)
+        print(f"Agreement with baseline: {replay_agreement:.2%}")
+        for different_frame in different_frames:
+            print(f"  {different_frame}: {replay_decisions[different_frame]} != {baseline_decisions[different_frame]}")
+        if replay_agreement < args.min_agreement:
+            sys.exit(1)
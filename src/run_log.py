@@ -0,0 +1,287 @@
+import argparse
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from metrics import metrics
+
+RUN_LOG_PATH = '../logs/runs.db'
+EXCEL_DIRECTORY = '../logs/excel'
+RUN_LOG_FLUSH_INTERVAL = 1.0
+RUN_LOG_FLUSH_SIZE = 100
+
+EXCEL_HEADERS = ["Run", "Gold Value", "Mineral Value", "Is Worth Attacking", "Uptime", "Looted Gold",
+                 "Looted Minerals", "Gold efficiency", "Mineral efficiency", "Total efficiency", "Gold threshold",
+                 "Mineral threshold", "Defensive buildings threshold", "Timings", "Defences", "Base on edge",
+                 "Expected loot", "Attack policy"]
+
+SCAN_INSERT = ("INSERT INTO scans (run_id, logged_at, gold_value, mineral_value, is_worth, uptime, loot_gold_value, "
+               "loot_mineral_value, gold_value_threshold, mineral_value_threshold, defensive_buildings_threshold, "
+               "timings, defences, base_on_edge, expected_loot, attack_policy) "
+               "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+RECOVERY_INSERT = ("INSERT INTO recoveries (run_id, logged_at, reason, screen, action, duration, downtime) "
+                   "VALUES (?, ?, ?, ?, ?, ?, ?)")
+
+# Columns added to the scans table after it was first created, migrated in place on older databases
+ADDED_COLUMNS = {
+    'gold_value_threshold': 'INTEGER',
+    'mineral_value_threshold': 'INTEGER',
+    'defensive_buildings_threshold': 'INTEGER',
+    'timings': 'TEXT',
+    'defences': 'INTEGER',
+    'base_on_edge': 'INTEGER',
+    'expected_loot': 'REAL',
+    'attack_policy': 'TEXT',
+}
+
+
+def to_int(value):
+    """
+    Converts an OCR reading to an integer.
+
+    Params:
+        value (str | int): The reading
+
+    Returns:
+        int | None: The value, None if nothing was read
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def efficiency(looted, scanned):
+    """
+    Calculates the part of the scanned resources that was looted.
+
+    Params:
+        looted (int | None): Looted amount
+        scanned (int | None): Scanned amount
+
+    Returns:
+        float | None: The efficiency, None if it can't be calculated
+    """
+    if looted is None or not scanned:
+        return None
+    return looted / scanned
+
+
+def connect(path):
+    """
+    Opens the run log database shared by all runs, creating or migrating its schema if needed.
+
+    Params:
+        path (str): Path to the database
+
+    Returns:
+        sqlite3.Connection: The connection
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS scans (
+            id INTEGER PRIMARY KEY,
+            run_id TEXT NOT NULL,
+            logged_at TEXT NOT NULL,
+            gold_value INTEGER,
+            mineral_value INTEGER,
+            is_worth INTEGER NOT NULL,
+            uptime REAL NOT NULL,
+            loot_gold_value INTEGER,
+            loot_mineral_value INTEGER
+        )""")
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS recoveries (
+            id INTEGER PRIMARY KEY,
+            run_id TEXT NOT NULL,
+            logged_at TEXT NOT NULL,
+            reason TEXT,
+            screen TEXT,
+            action TEXT NOT NULL,
+            duration REAL NOT NULL,
+            downtime REAL NOT NULL
+        )""")
+    existing_columns = {row[1] for row in connection.execute("PRAGMA table_info(scans)")}
+    for column, column_type in ADDED_COLUMNS.items():
+        if column not in existing_columns:
+            connection.execute(f"ALTER TABLE scans ADD COLUMN {column} {column_type}")
+    connection.execute("CREATE INDEX IF NOT EXISTS scans_run_id ON scans (run_id)")
+    connection.execute("CREATE INDEX IF NOT EXISTS recoveries_run_id ON recoveries (run_id)")
+    connection.commit()
+    return connection
+
+
+class RunLogger:
+    """
+    Append-only log of every scanned enemy. Rows of all runs go to a single SQLite database in WAL mode, tagged with
+    the run id and the thresholds in use. They are buffered and written by a background thread, at most
+    RUN_LOG_FLUSH_INTERVAL seconds or RUN_LOG_FLUSH_SIZE rows after they were logged, so the cost of logging a row
+    doesn't grow with the length of the run. The run's Excel file is exported at shutdown or on demand with
+    `python run_log.py export <run id>`.
+    """
+
+    def __init__(self, init_time, thresholds, path=RUN_LOG_PATH, instance=None):
+        """
+        Params:
+            init_time (datetime): The bot's initialization time, used as the run id
+            thresholds (tuple): (gold value, mineral value, defensive buildings amount) thresholds of the run
+            path (str): Path to the run log database
+            instance (str | None): Name of the bot instance when several run at once, appended to the run id
+        """
+        self.run_id = init_time.strftime("%Y%m%d_%H%M%S") + (f"_{instance}" if instance else "")
+        self.thresholds = tuple(thresholds)
+        self.path = path
+        self.rows = queue.Queue()
+        self.closed = False
+        connect(path).close()
+        self.writer = threading.Thread(target=self.write_rows, name='run-log-writer', daemon=True)
+        self.writer.start()
+        atexit.register(self.close)
+
+    def log_row(self, gold_value, mineral_value, is_worth, uptime, loot_gold_value, loot_mineral_value, timings=None,
+                analysis=None):
+        """
+        Logs a scanned enemy.
+
+        Params:
+            gold_value (str): The gold value
+            mineral_value (str): The mineral value
+            is_worth (bool): True if the base is worth attacking, False otherwise
+            uptime (timedelta): The bot's uptime
+            loot_gold_value (str): Amount of looted gold
+            loot_mineral_value (str): Amount of looted minerals
+            timings (dict | None): Seconds spent in each stage of handling the enemy
+            analysis (dict | None): Defence features and expected loot of the enemy, see image_processing.evaluate_enemy
+        """
+        analysis = analysis or {}
+        base_on_edge = analysis.get('base_on_edge')
+        self.rows.put((SCAN_INSERT, (self.run_id, datetime.now().isoformat(), to_int(gold_value),
+                                     to_int(mineral_value), int(is_worth), uptime.total_seconds(),
+                                     to_int(loot_gold_value), to_int(loot_mineral_value), *self.thresholds,
+                                     json.dumps(timings or {}), analysis.get('defences'),
+                                     None if base_on_edge is None else int(base_on_edge),
+                                     analysis.get('expected_loot'), analysis.get('policy'))))
+
+    def log_recovery(self, reason, screen, action, duration, downtime):
+        """
+        Logs a recovery of the bot from a stuck or failed state.
+
+        Params:
+            reason (str): The error the recovery was started by
+            screen (str | None): The screen the game was on, None if it wasn't recognised
+            action (str): 'none' if the game was already on a usable screen, 'light' if a few clicks recovered it,
+                'refresh' if the game was refreshed
+            duration (float): Seconds the recovery took
+            downtime (float): Seconds since the bot last made progress
+        """
+        self.rows.put((RECOVERY_INSERT, (self.run_id, datetime.now().isoformat(), reason, screen, action, duration,
+                                         downtime)))
+
+    def write_rows(self):
+        connection = connect(self.path)
+        while True:
+            row = self.rows.get()
+            if row is None:
+                break
+
+            batch = [row]
+            deadline = time.monotonic() + RUN_LOG_FLUSH_INTERVAL
+            stop = False
+            while len(batch) < RUN_LOG_FLUSH_SIZE:
+                try:
+                    row = self.rows.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if row is None:
+                    stop = True
+                    break
+                batch.append(row)
+
+            statements = {}
+            for statement, values in batch:
+                statements.setdefault(statement, []).append(values)
+            try:
+                with metrics.span('log_write'), connection:
+                    for statement, rows in statements.items():
+                        connection.executemany(statement, rows)
+            except sqlite3.Error as e:
+                logging.error(f"Couldn't write {len(batch)} rows to the run log: {e}")
+            if stop:
+                break
+        connection.close()
+
+    def close(self):
+        """
+        Writes the remaining rows and exports the run to Excel.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.rows.put(None)
+        self.writer.join()
+        with metrics.span('excel_export'):
+            export_excel(self.run_id, self.path)
+
+
+def export_excel(run_id=None, path=RUN_LOG_PATH):
+    """
+    Exports the rows of a run, or of all runs, to an Excel file named after the run or all_logs.xlsx.
+
+    Params:
+        run_id (str | None): The run to export, None to export all runs
+        path (str): Path to the run log database
+
+    Returns:
+        str: Path to the Excel file
+    """
+    # openpyxl is slow to import and only needed when a run ends
+    from openpyxl import Workbook
+
+    filename = f"{EXCEL_DIRECTORY}/{run_id}-log.xlsx" if run_id else f"{EXCEL_DIRECTORY}/all_logs.xlsx"
+    connection = connect(path)
+    try:
+        query = ("SELECT run_id, gold_value, mineral_value, is_worth, uptime, loot_gold_value, loot_mineral_value, "
+                 "gold_value_threshold, mineral_value_threshold, defensive_buildings_threshold, timings, defences, "
+                 "base_on_edge, expected_loot, attack_policy FROM scans")
+        rows = connection.execute(f"{query} WHERE run_id = ? ORDER BY id", (run_id,)) if run_id \
+            else connection.execute(f"{query} ORDER BY id")
+
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(EXCEL_HEADERS)
+        for (row_run_id, gold_value, mineral_value, is_worth, uptime, loot_gold_value, loot_mineral_value,
+             gold_threshold, mineral_threshold, defences_threshold, timings, defences, base_on_edge, expected_loot,
+             attack_policy) in rows:
+            total_loot = None if loot_gold_value is None or loot_mineral_value is None \
+                else loot_gold_value + loot_mineral_value
+            total_scanned = (gold_value or 0) + (mineral_value or 0)
+            sheet.append([row_run_id, gold_value, mineral_value, bool(is_worth), timedelta(seconds=uptime),
+                          loot_gold_value, loot_mineral_value, efficiency(loot_gold_value, gold_value),
+                          efficiency(loot_mineral_value, mineral_value), efficiency(total_loot, total_scanned),
+                          gold_threshold, mineral_threshold, defences_threshold, timings, defences,
+                          None if base_on_edge is None else bool(base_on_edge), expected_loot, attack_policy])
+
+        os.makedirs(EXCEL_DIRECTORY, exist_ok=True)
+        workbook.save(filename)
+        logging.info(f"{'Run ' + run_id if run_id else 'All runs'} exported to {filename}")
+        return filename
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Export runs from the run log.")
+    parser.add_argument('command', choices=['export'])
+    parser.add_argument('run_id', nargs='?', help="run to export, e.g. 20240626_143342, all runs if not given")
+    args = parser.parse_args()
+    export_excel(args.run_id)
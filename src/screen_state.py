@@ -0,0 +1,125 @@
+import logging
+import os
+import sys
+import time
+
+import cv2
+
+from image_processing import grab_region
+
+SCREEN_STATES_DIRECTORY = '../model/screen_states'
+SCREEN_STATE_MATCH_THRESHOLD = 0.9
+SCREEN_STATE_POLL_INTERVAL = 0.2
+SCREEN_STATE_REGION_SIZE = (80, 40)
+
+
+class ScreenState:
+    """
+    A screen recognised by a small fingerprint region, usually the area around a button that is only visible on it.
+    The fingerprint is matched against a template recorded from the live game with `python screen_state.py <name>`.
+    """
+
+    def __init__(self, name, button, region_size=SCREEN_STATE_REGION_SIZE):
+        self.name = name
+        width, height = region_size
+        self.window_data = [button[0] - width // 2, button[1] - height // 2, width, height]
+        self.template_path = f"{SCREEN_STATES_DIRECTORY}/{name}.png"
+        self.template = None
+        self.template_missing_logged = False
+
+    def load_template(self):
+        """
+        Loads the recorded template of the screen state.
+
+        Returns:
+            numpy.ndarray | None: The grayscale template, None if it hasn't been recorded
+        """
+        if self.template is None and os.path.exists(self.template_path):
+            self.template = cv2.imread(self.template_path, cv2.IMREAD_GRAYSCALE)
+        return self.template
+
+    def record(self):
+        """
+        Captures the fingerprint region from the current screen and saves it as the template of the screen state.
+        """
+        os.makedirs(SCREEN_STATES_DIRECTORY, exist_ok=True)
+        self.template = grab_region(self.window_data)
+        cv2.imwrite(self.template_path, self.template)
+        logging.info(f"Screen state '{self.name}' recorded to {self.template_path}")
+
+    def is_visible(self):
+        """
+        Checks whether the screen state is currently visible.
+
+        Returns:
+            bool | None: True if the fingerprint matches the template, None if there is no template to match against
+        """
+        template = self.load_template()
+        if template is None:
+            return None
+
+        region = grab_region(self.window_data)
+        score = cv2.matchTemplate(region, template, cv2.TM_CCOEFF_NORMED)[0][0]
+        return score >= SCREEN_STATE_MATCH_THRESHOLD
+
+    def wait(self, timeout, leave_first=False):
+        """
+        Waits until the screen state is visible, but no longer than the timeout. Without a recorded template it
+        simply waits for the whole timeout.
+
+        Params:
+            timeout (float): The maximal number of seconds to wait
+            leave_first (bool): Wait for the screen state to disappear before waiting for it to show up, used when the
+                expected screen looks the same as the one being left
+
+        Returns:
+            bool: True if the screen state showed up before the timeout, False otherwise
+        """
+        start = time.monotonic()
+        deadline = start + timeout
+
+        if self.load_template() is None:
+            if not self.template_missing_logged:
+                logging.debug(f"No template for screen state '{self.name}', waiting the full {timeout}s")
+                self.template_missing_logged = True
+            time.sleep(timeout)
+            return False
+
+        if leave_first and not self.poll_until(False, deadline):
+            return False
+
+        visible = self.poll_until(True, deadline)
+        if visible:
+            logging.debug(f"Screen state '{self.name}' visible after {time.monotonic() - start:.2f}s")
+        else:
+            logging.debug(f"Screen state '{self.name}' not visible after {timeout}s")
+        return visible
+
+    def poll_until(self, expected, deadline):
+        """
+        Polls the screen until the visibility of the screen state is as expected or the deadline passes.
+
+        Params:
+            expected (bool): Expected visibility
+            deadline (float): time.monotonic() value to stop polling at
+
+        Returns:
+            bool: True if the expected visibility was reached before the deadline
+        """
+        while True:
+            if self.is_visible() == expected:
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(SCREEN_STATE_POLL_INTERVAL, remaining))
+
+
+if __name__ == '__main__':
+    from utils import SCREEN_STATES
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if len(sys.argv) != 2 or sys.argv[1] not in SCREEN_STATES:
+        print(f"Usage: python screen_state.py <{'|'.join(SCREEN_STATES)}>")
+        sys.exit(1)
+    SCREEN_STATES[sys.argv[1]].record()
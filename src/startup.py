@@ -0,0 +1,100 @@
+import builtins
+import os
+import sys
+import time
+
+# Imports taking less than this aren't listed in the startup breakdown, unless they are imported by the entry point
+IMPORT_REPORT_THRESHOLD = 0.02
+
+
+class ImportTimer:
+    """
+    Measures how long every module imported within the block takes to load, including the modules it imports itself.
+    Used by the entry point to report where startup time goes.
+    """
+
+    def __init__(self):
+        self.times = []
+        self.depth = 0
+        self.original_import = None
+        self.start = None
+        self.elapsed = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.original_import = builtins.__import__
+        builtins.__import__ = self.timed_import
+        return self
+
+    def __exit__(self, *exc_info):
+        builtins.__import__ = self.original_import
+        self.elapsed = time.perf_counter() - self.start
+
+    def timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level > 0 or name in sys.modules:
+            return self.original_import(name, globals, locals, fromlist, level)
+        # Recorded before importing, so the breakdown lists modules in import order
+        entry = len(self.times)
+        self.times.append((self.depth, name, None))
+        self.depth += 1
+        start = time.perf_counter()
+        try:
+            return self.original_import(name, globals, locals, fromlist, level)
+        finally:
+            self.depth -= 1
+            self.times[entry] = (self.depth, name, time.perf_counter() - start)
+
+    def summary(self):
+        """
+        Returns:
+            str: Import times of the entry point's imports and of every slow import, in import order
+        """
+        lines = [f"Imports took {self.elapsed:.2f}s:"]
+        for depth, name, seconds in self.times:
+            if depth == 0 or seconds >= IMPORT_REPORT_THRESHOLD:
+                lines.append(f"  {'  ' * depth}{name}: {seconds * 1000:.0f}ms")
+        return "\n".join(lines)
+
+
+def check_setup():
+    """
+    Checks everything the bot needs before it touches the game, without loading any model.
+
+    Returns:
+        list: (passed, description) of every check; the bot can't run if a check without a fallback failed
+    """
+    from archive import screenshot_archive
+    from digit_ocr import digit_recognizer
+    from inference_service import inference_client, INFERENCE_SERVICE_ADDRESS
+    from model_registry import available_detector_runtimes
+    from run_log import connect, RUN_LOG_PATH
+    from utils import SCREEN_STATES
+
+    results = []
+    service = inference_client.available()
+    results.append((True, f"Inference service at {INFERENCE_SERVICE_ADDRESS[0]}:{INFERENCE_SERVICE_ADDRESS[1]}: "
+                          f"{'running' if service else 'not running, models are loaded by the bot'}"))
+    if not service:
+        runtimes = available_detector_runtimes()
+        results.append((bool(runtimes), f"Detector runtimes available: {', '.join(runtimes) or 'none'}"))
+
+    templates = os.path.exists(digit_recognizer.templates_path)
+    results.append((True, f"Digit templates: {'found' if templates else 'missing'}, EasyOCR is used "
+                          f"{'as a fallback' if templates else 'for every reading'}"))
+    missing_states = [name for name, screen_state in SCREEN_STATES.items()
+                      if not os.path.exists(screen_state.template_path)]
+    results.append((True, f"Screen state templates missing, fixed waits used instead: {', '.join(missing_states)}"
+                    if missing_states else "Screen state templates: all recorded"))
+
+    try:
+        connect(RUN_LOG_PATH).close()
+        results.append((True, f"Run log: {RUN_LOG_PATH}"))
+    except Exception as e:
+        results.append((False, f"Run log {RUN_LOG_PATH}: {e}"))
+    try:
+        os.makedirs(screenshot_archive.directory, exist_ok=True)
+        results.append((os.access(screenshot_archive.directory, os.W_OK),
+                        f"Screenshot archive: {screenshot_archive.directory}"))
+    except OSError as e:
+        results.append((False, f"Screenshot archive {screenshot_archive.directory}: {e}"))
+    return results
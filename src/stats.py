@@ -0,0 +1,172 @@
+import argparse
+
+import numpy as np
+
+from run_log import connect, RUN_LOG_PATH
+
+RESOURCE_PERCENTILES = [10, 25, 50, 75, 90, 99]
+
+
+def load_scans(path=RUN_LOG_PATH):
+    """
+    Loads every logged scan of every run as NumPy columns.
+
+    Params:
+        path (str): Path to the run log database
+
+    Returns:
+        dict: Column name to array; missing readings and defence features are NaN, run ids are mapped to indices of
+            the 'runs' array
+    """
+    connection = connect(path)
+    try:
+        rows = connection.execute(
+            "SELECT run_id, gold_value, mineral_value, is_worth, uptime, loot_gold_value, loot_mineral_value, "
+            "defences, base_on_edge FROM scans ORDER BY id").fetchall()
+    finally:
+        connection.close()
+
+    if not rows:
+        return None
+
+    run_ids, values = zip(*((row[0], row[1:]) for row in rows))
+    values = np.array(values, dtype=np.float64)
+    runs, run_index = np.unique(np.array(run_ids), return_inverse=True)
+    return {
+        'runs': runs,
+        'run_index': run_index,
+        'gold_value': values[:, 0],
+        'mineral_value': values[:, 1],
+        'is_worth': values[:, 2] > 0,
+        'uptime': values[:, 3],
+        'loot_gold_value': values[:, 4],
+        'loot_mineral_value': values[:, 5],
+        'defences': values[:, 6],
+        'base_on_edge': values[:, 7],
+    }
+
+
+def load_recoveries(path=RUN_LOG_PATH):
+    """
+    Loads the number of recoveries and the downtime of every run.
+
+    Params:
+        path (str): Path to the run log database
+
+    Returns:
+        dict: Run id to a tuple (recoveries, refreshes, downtime in seconds)
+    """
+    connection = connect(path)
+    try:
+        rows = connection.execute(
+            "SELECT run_id, COUNT(*), SUM(action = 'refresh'), SUM(downtime) FROM recoveries GROUP BY run_id")
+        return {run_id: (count, refreshes, downtime) for run_id, count, refreshes, downtime in rows}
+    finally:
+        connection.close()
+
+
+def ratio(numerator, denominator):
+    """
+    Divides arrays element-wise, giving NaN where the denominator is zero or missing.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, numerator / denominator, np.nan)
+
+
+def compute_stats(scans, recoveries=None):
+    """
+    Computes efficiencies, loot per hour and the distribution of scanned resources, per run and over all runs.
+
+    Params:
+        scans (dict): Columns returned by load_scans
+        recoveries (dict | None): Recoveries of every run returned by load_recoveries
+
+    Returns:
+        dict: The computed statistics
+    """
+    attacked = scans['is_worth']
+    gold, minerals = scans['gold_value'], scans['mineral_value']
+    loot_gold, loot_minerals = scans['loot_gold_value'], scans['loot_mineral_value']
+    # Attacks whose loot couldn't be read are left out of the loot figures instead of counting as empty bases
+    looted = attacked & ~np.isnan(loot_gold) & ~np.isnan(loot_minerals)
+    total_loot = np.where(looted, np.nan_to_num(loot_gold) + np.nan_to_num(loot_minerals), 0.0)
+
+    gold_efficiency = ratio(loot_gold, gold)[looted]
+    mineral_efficiency = ratio(loot_minerals, minerals)[looted]
+    total_efficiency = ratio(total_loot, np.nan_to_num(gold) + np.nan_to_num(minerals))[looted]
+
+    run_count = len(scans['runs'])
+    run_index = scans['run_index']
+    run_hours = np.zeros(run_count)
+    np.maximum.at(run_hours, run_index, scans['uptime'] / 3600)
+    run_scans = np.bincount(run_index, minlength=run_count)
+    run_attacks = np.bincount(run_index, weights=attacked, minlength=run_count).astype(np.int64)
+    run_looted = np.bincount(run_index, weights=looted, minlength=run_count)
+    run_attack_loot = np.bincount(run_index, weights=total_loot, minlength=run_count)
+    run_loot_per_attack = ratio(run_attack_loot, run_looted)
+    # Every attack of a run is credited with the average loot of its attacks whose loot was read
+    run_loot = np.nan_to_num(run_loot_per_attack) * run_attacks
+    run_recoveries = np.array([(recoveries or {}).get(run, (0, 0, 0.0)) for run in scans['runs']],
+                              dtype=np.float64).reshape(run_count, 3)
+
+    total_hours = run_hours.sum()
+    return {
+        'scans': len(run_index),
+        'attacks': int(attacked.sum()),
+        'unread_loot': int((attacked & ~looted).sum()),
+        'runs': run_count,
+        'hours': total_hours,
+        'gold_efficiency': np.nanmean(gold_efficiency) if gold_efficiency.size else np.nan,
+        'mineral_efficiency': np.nanmean(mineral_efficiency) if mineral_efficiency.size else np.nan,
+        'total_efficiency': np.nanmean(total_efficiency) if total_efficiency.size else np.nan,
+        'loot_per_hour': run_loot.sum() / total_hours if total_hours > 0 else np.nan,
+        'gold_percentiles': np.nanpercentile(gold, RESOURCE_PERCENTILES),
+        'mineral_percentiles': np.nanpercentile(minerals, RESOURCE_PERCENTILES),
+        'per_run': {
+            'run': scans['runs'],
+            'scans': run_scans,
+            'attacks': run_attacks,
+            'hours': run_hours,
+            'loot_per_hour': ratio(run_loot, run_hours),
+            'average_loot_per_attack': run_loot_per_attack,
+            'recoveries': run_recoveries[:, 0].astype(np.int64),
+            'refreshes': run_recoveries[:, 1].astype(np.int64),
+            'downtime_minutes': run_recoveries[:, 2] / 60,
+        },
+    }
+
+
+def print_stats(stats):
+    """
+    Prints the statistics computed by compute_stats.
+    """
+    print(f"Runs: {stats['runs']}, scans: {stats['scans']}, attacks: {stats['attacks']} "
+          f"({stats['unread_loot']} with unread loot), hours: {stats['hours']:.1f}")
+    print(f"Efficiency (looted / scanned): gold {stats['gold_efficiency']:.2%}, "
+          f"minerals {stats['mineral_efficiency']:.2%}, total {stats['total_efficiency']:.2%}")
+    print(f"Loot per hour: {stats['loot_per_hour']:,.0f}")
+    percentiles = ', '.join(f"p{p}" for p in RESOURCE_PERCENTILES)
+    print(f"Scanned gold ({percentiles}): {', '.join(f'{v:,.0f}' for v in stats['gold_percentiles'])}")
+    print(f"Scanned minerals ({percentiles}): {', '.join(f'{v:,.0f}' for v in stats['mineral_percentiles'])}")
+
+    per_run = stats['per_run']
+    print(f"{'Run':<17} {'Scans':>7} {'Attacks':>8} {'Hours':>7} {'Loot/h':>14} {'Loot/attack':>14} "
+          f"{'Recoveries':>11} {'Refreshes':>10} {'Down (min)':>11}")
+    for run, scans, attacks, hours, loot_per_hour, loot_per_attack, recoveries, refreshes, downtime in zip(
+            per_run['run'], per_run['scans'], per_run['attacks'], per_run['hours'], per_run['loot_per_hour'],
+            per_run['average_loot_per_attack'], per_run['recoveries'], per_run['refreshes'],
+            per_run['downtime_minutes']):
+        print(f"{run:<17} {scans:>7} {attacks:>8} {hours:>7.2f} {loot_per_hour:>14,.0f} {loot_per_attack:>14,.0f} "
+              f"{recoveries:>11} {refreshes:>10} {downtime:>11.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Print statistics over all logged runs.")
+    parser.add_argument('--path', default=RUN_LOG_PATH, help="path to the run log database")
+    args = parser.parse_args()
+
+    all_scans = load_scans(args.path)
+    if all_scans is None:
+        print("No scans logged yet.")
+    else:
+        print_stats(compute_stats(all_scans, load_recoveries(args.path)))
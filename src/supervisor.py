@@ -0,0 +1,251 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from inference_service import inference_client
+
+INSTANCE_LOG_DIRECTORY = '../logs/instances'
+# Seconds between checks of the running bots, and before a bot that exited is started again
+SUPERVISOR_CHECK_INTERVAL = 5
+SUPERVISOR_RESTART_DELAY = 30
+SUPERVISOR_REPORT_INTERVAL = 600
+# Seconds to wait for a started inference service to load its models
+INFERENCE_SERVICE_START_TIMEOUT = 300
+
+
+class BotInstance:
+    """
+    A bot process driving its own game window. The bot clicks at absolute screen coordinates, so every instance needs
+    a screen of its own: a separate virtual display (given as the DISPLAY of the process on X11) or a separate session
+    or virtual machine showing a window with the given title.
+    """
+
+    def __init__(self, name, window_title, display=None):
+        self.name = name
+        self.window_title = window_title
+        self.display = display
+        self.process = None
+        self.log_file = None
+        self.starts = 0
+        self.exited_at = None
+
+    def start(self):
+        os.makedirs(INSTANCE_LOG_DIRECTORY, exist_ok=True)
+        self.log_file = open(os.path.join(INSTANCE_LOG_DIRECTORY, f"{self.name}.log"), 'a')
+        environment = dict(os.environ)
+        if self.display is not None:
+            environment['DISPLAY'] = self.display
+        self.process = subprocess.Popen([sys.executable, 'main.py', '--instance', self.name, '--window',
+                                         self.window_title], env=environment, stdout=self.log_file,
+                                        stderr=subprocess.STDOUT)
+        self.starts += 1
+        self.exited_at = None
+        logging.info(f"Started {self.name} on '{self.window_title}'"
+                     f"{f' (display {self.display})' if self.display else ''}, pid {self.process.pid}")
+
+    def check(self):
+        """
+        Starts the bot again SUPERVISOR_RESTART_DELAY seconds after it exited.
+        """
+        if self.process.poll() is None:
+            return
+        if self.exited_at is None:
+            self.exited_at = time.monotonic()
+            self.log_file.close()
+            logging.warning(f"{self.name} exited with code {self.process.returncode}, starting it again in "
+                            f"{SUPERVISOR_RESTART_DELAY}s")
+        elif time.monotonic() - self.exited_at >= SUPERVISOR_RESTART_DELAY:
+            self.start()
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        if self.log_file is not None:
+            self.log_file.close()
+
+    def summary(self):
+        state = 'running' if self.process.poll() is None else f"exited ({self.process.returncode})"
+        return f"{self.name}: {state}, started {self.starts} times"
+
+
+def ensure_inference_service():
+    """
+    Starts the inference service unless one is already running, and waits until its models are loaded.
+
+    Returns:
+        subprocess.Popen | None: The started service, None if one was already running
+    """
+    if inference_client.available():
+        return None
+    service = subprocess.Popen([sys.executable, 'inference_service.py', 'serve', '--port',
+                                str(inference_client.address[1])])
+    logging.info(f"Started the inference service, pid {service.pid}")
+    deadline = time.monotonic() + INFERENCE_SERVICE_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if service.poll() is not None:
+            raise RuntimeError(f"The inference service exited with code {service.returncode}")
+        # The service only listens once its models are warm
+        inference_client.retry_at = 0
+        if inference_client.available():
+            return service
+        time.sleep(1)
+    service.terminate()
+    raise TimeoutError(f"The inference service didn't start in {INFERENCE_SERVICE_START_TIMEOUT}s")
+
+
+def supervise(instances):
+    """
+    Runs the bots next to a shared inference service until interrupted, starting again the ones that exit.
+
+    Params:
+        instances (list): The BotInstance of every bot
+    """
+    service = ensure_inference_service()
+    for instance in instances:
+        instance.start()
+    last_report = time.monotonic()
+    try:
+        while True:
+            time.sleep(SUPERVISOR_CHECK_INTERVAL)
+            for instance in instances:
+                instance.check()
+            if time.monotonic() - last_report >= SUPERVISOR_REPORT_INTERVAL:
+                last_report = time.monotonic()
+                logging.info("; ".join(instance.summary() for instance in instances))
+    except KeyboardInterrupt:
+        logging.info("Stopping the bots")
+    finally:
+        for instance in instances:
+            instance.stop()
+        if service is not None:
+            service.terminate()
+
+
+def replay_instance(name, frame_paths, rounds, results):
+    """
+    Runs one replay-backed bot: the recorded frames stand in for its window, screen and input, and its models run in
+    the shared inference service. Started in a separate process by benchmark_instances.
+
+    Params:
+        name (str): Name of the instance
+        frame_paths (list): Paths to the recorded frames
+        rounds (int): Times the frames are replayed
+        results (multiprocessing.Queue): Queue the stats of the instance are put to
+    """
+    from replay import install_replay, replay
+
+    logging.basicConfig(level=logging.WARNING, format=f'%(asctime)s - {name} - %(levelname)s - %(message)s')
+    stats = {'name': name, 'frames': 0, 'errors': 0, 'elapsed': 0.0, 'latencies': []}
+    try:
+        if not inference_client.available():
+            raise ConnectionError("The inference service isn't running")
+        for _ in range(rounds):
+            capture_backend, _ = install_replay(frame_paths)
+            decisions, timings, _, elapsed = replay(capture_backend, detect_all=True)
+            stats['frames'] += len(decisions)
+            stats['errors'] += sum('error' in decision for decision in decisions.values())
+            stats['elapsed'] += elapsed
+            stats['latencies'] += timings.get('is_worth_based_on_defences', [])
+    except Exception as e:
+        stats['error'] = f"{type(e).__name__}: {e}"
+    results.put(stats)
+
+
+def benchmark_instances(frame_paths, instance_count, rounds):
+    """
+    Replays the frames in several bot processes at once against the shared inference service.
+
+    Params:
+        frame_paths (list): Paths to the recorded frames
+        instance_count (int): Number of bot processes
+        rounds (int): Times every bot replays the frames
+
+    Returns:
+        A tuple (instance_stats, elapsed) containing:
+        - instance_stats (list): Stats of every instance, see replay_instance
+        - elapsed (float): Seconds until the last instance finished
+    """
+    # Spawned, so the processes don't inherit the supervisor's connection to the service
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    processes = [context.Process(target=replay_instance, args=(f"bot{index + 1}", frame_paths, rounds, results))
+                 for index in range(instance_count)]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    instance_stats = [results.get() for _ in processes]
+    elapsed = time.perf_counter() - start
+    for process in processes:
+        process.join()
+    return sorted(instance_stats, key=lambda stats: stats['name']), elapsed
+
+
+def print_benchmark(instance_stats, elapsed):
+    for stats in instance_stats:
+        if 'error' in stats:
+            print(f"  {stats['name']}: failed, {stats['error']}")
+            continue
+        latencies = np.array(stats['latencies']) * 1000
+        detection = f", defence detection p50 {np.percentile(latencies, 50):.1f}ms, " \
+                    f"p90 {np.percentile(latencies, 90):.1f}ms" if latencies.size else ""
+        print(f"  {stats['name']}: {stats['frames']} frames in {stats['elapsed']:.2f}s "
+              f"({stats['frames'] / stats['elapsed']:.2f} frames/s), {stats['errors']} errors{detection}")
+    frames = sum(stats['frames'] for stats in instance_stats)
+    print(f"  Total: {frames} frames in {elapsed:.2f}s, {frames / elapsed:.2f} frames/s")
+    return frames / elapsed
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Run several bots sharing one inference service, or benchmark them "
+                                                 "on recorded frames.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run_parser = subparsers.add_parser('run', help="run a bot for every game window")
+    run_parser.add_argument('windows', nargs='+', help="titles of the game windows, one bot for each")
+    run_parser.add_argument('--displays', nargs='+', help="X11 display of every bot, e.g. :1 :2")
+    benchmark_parser = subparsers.add_parser('benchmark', help="replay recorded frames in several bots at once")
+    benchmark_parser.add_argument('directories', nargs='*', default=['../logs/screenshots'],
+                                  help="directories of recorded frames")
+    benchmark_parser.add_argument('--instances', type=int, nargs='+', default=[1, 2, 4],
+                                  help="numbers of bots to benchmark")
+    benchmark_parser.add_argument('--rounds', type=int, default=1, help="times every bot replays the frames")
+    benchmark_parser.add_argument('--limit', type=int, help="replay at most this many frames")
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        if args.displays and len(args.displays) != len(args.windows):
+            parser.error("give one display for every window")
+        supervise([BotInstance(f"bot{index + 1}", window_title, args.displays[index] if args.displays else None)
+                   for index, window_title in enumerate(args.windows)])
+    else:
+        from replay import find_replay_frames
+
+        replay_frames = find_replay_frames(args.directories)[:args.limit]
+        if not replay_frames:
+            print("No recorded frames to replay.")
+            sys.exit(1)
+        inference_service = ensure_inference_service()
+        try:
+            single_throughput = None
+            for count in args.instances:
+                print(f"{count} instances:")
+                throughput = print_benchmark(*benchmark_instances(replay_frames, count, args.rounds))
+                single_throughput = single_throughput or throughput / count
+                print(f"  Scaling: {throughput / single_throughput:.2f}x the throughput of one instance")
+            for operation, (batches, requests) in inference_client.ping()['batches'].items():
+                if batches:
+                    print(f"Inference service {operation}: {requests} requests in {batches} batches, "
+                          f"{requests / batches:.2f} per batch")
+        finally:
+            if inference_service is not None:
+                inference_service.terminate()
@@ -1,30 +1,9 @@
 import logging
-import os
-import shutil
 import time
 
-import pyautogui
-from openpyxl import Workbook, load_workbook
-
-from src.image_processing import get_screenshot
-
-
-def clear_screenshots_directory():
-    """
-    Clears the screenshots directory by removing all files and recreating the directory.
-    """
-
-    directory = '../logs/screenshots'
-
-    if os.path.exists(directory):
-        shutil.rmtree(directory)
-        os.makedirs(directory)
-        with open(os.path.join(directory, '.gitkeep'), 'w'):
-            pass
-
-        logging.info(f"Directory '{directory}' has been cleared.")
-    else:
-        logging.info(f"Directory '{directory}' does not exist.")
+from image_processing import focus_window, get_screenshot
+from metrics import metrics
+from screen_state import ScreenState
 
 
 # Define button coordinates as constants
@@ -45,18 +24,75 @@ CHOOSE_LOOTER_UNIT_WHEN_ATTACKING_BUTTON = (950, 1375)
 CLOSE_NEWS_POPUP_BUTTON = (1583, 204)
 CLOSE_DAILY_GIFT_POPUP_BUTTON = (1590, 530)
 
+# Define screens recognised by the button that is visible on them
+ATTACK_MENU_SCREEN = ScreenState('attack_menu', FIND_TARGET_BUTTON)
+FIGHT_NOW_SCREEN = ScreenState('fight_now', FIGHT_NOW_BUTTON)
+ENEMY_BASE_SCREEN = ScreenState('enemy_base', SEARCH_AGAIN_BUTTON)
+BATTLE_SCREEN = ScreenState('battle', END_BATTLE_BUTTON)
+BATTLE_END_SCREEN = ScreenState('battle_end', GO_HOME_BUTTON)
+HOME_BASE_SCREEN = ScreenState('home_base', ATTACK_BUTTON)
+PLANETS_LIST_SCREEN = ScreenState('planets_list', COLONY_11_BUTTON)
+NEWS_POPUP_SCREEN = ScreenState('news_popup', CLOSE_NEWS_POPUP_BUTTON)
+DAILY_GIFT_POPUP_SCREEN = ScreenState('daily_gift_popup', CLOSE_DAILY_GIFT_POPUP_BUTTON)
+
+SCREEN_STATES = {screen_state.name: screen_state for screen_state in [
+    ATTACK_MENU_SCREEN, FIGHT_NOW_SCREEN, ENEMY_BASE_SCREEN, BATTLE_SCREEN, BATTLE_END_SCREEN, HOME_BASE_SCREEN,
+    PLANETS_LIST_SCREEN, NEWS_POPUP_SCREEN, DAILY_GIFT_POPUP_SCREEN
+]}
+
+
+# Seconds pyautogui sleeps after every call on its own, the waits are explicit everywhere instead
+INPUT_BACKEND_PAUSE = 0
+
+input_backend = None
+
+
+def get_input_backend():
+    """
+    Returns the backend sending clicks and key presses to the game, pyautogui unless it has been replaced.
+
+    Returns:
+        The input backend, providing click, keyDown and keyUp like pyautogui
+    """
+    global input_backend
+    if input_backend is None:
+        import pyautogui
+        pyautogui.PAUSE = INPUT_BACKEND_PAUSE
+        input_backend = pyautogui
+    return input_backend
+
+
+def set_input_backend(backend):
+    """
+    Replaces the input backend, e.g. with a recording stand-in when replaying.
+
+    Params:
+        backend: The input backend, providing click, keyDown and keyUp like pyautogui
+    """
+    global input_backend
+    input_backend = backend
 
-def click_and_wait(button, time_to_wait):
+
+def click_and_wait(button, time_to_wait, until_screen=None, leave_first=False):
     """
-    Clicks a specified button and waits for a given amount of time.
+    Clicks a specified button and waits for a given amount of time. If a screen state is given, the wait ends as soon
+    as it is visible and the time to wait only serves as a timeout.
 
     Params:
         button (tuple): The (x, y) coordinates of the button to click.
         time_to_wait (float): The number of seconds to wait after clicking.
+        until_screen (ScreenState): The screen expected after clicking.
+        leave_first (bool): Wait for the expected screen to disappear first, used when the click starts with the
+            expected screen already visible.
     """
 
-    pyautogui.click(button)
-    time.sleep(time_to_wait)
+    with metrics.span('click'):
+        get_input_backend().click(button)
+    with metrics.span('wait'):
+        if until_screen is None:
+            time.sleep(time_to_wait)
+        else:
+            until_screen.wait(time_to_wait, leave_first)
 
 
 def get_initial_base():
@@ -65,8 +101,8 @@ def get_initial_base():
     """
 
     try:
-        click_and_wait(OPEN_PLANETS_LIST_BUTTON, 2)
-        click_and_wait(COLONY_11_BUTTON, 7)
+        click_and_wait(OPEN_PLANETS_LIST_BUTTON, 2, PLANETS_LIST_SCREEN)
+        click_and_wait(COLONY_11_BUTTON, 7, HOME_BASE_SCREEN)
     except Exception as e:
         raise e
 
@@ -76,80 +112,20 @@ def handle_error():
     Handles errors by refreshing the game window and resetting to the initial base.
     """
 
-    get_screenshot("Galaxy Life")  # take focus on window
+    focus_window()
     logging.warning("---------------------------------Handling error with F5 refresh---------------------------------")
-    pyautogui.keyDown('F5')
+    get_input_backend().keyDown('F5')
     time.sleep(0.2)
-    pyautogui.keyUp('F5')
-    time.sleep(15)
-    click_and_wait(CLOSE_NEWS_POPUP_BUTTON, 3)
+    get_input_backend().keyUp('F5')
+    NEWS_POPUP_SCREEN.wait(15)
+    click_and_wait(CLOSE_NEWS_POPUP_BUTTON, 3, DAILY_GIFT_POPUP_SCREEN)
     click_and_wait(CLOSE_DAILY_GIFT_POPUP_BUTTON, 2)
 
     get_initial_base()
 
 
-class ExcelLogger:
-    def __init__(self, init_time):
-        self.init_time = init_time
-        self.workbook = None
-        self.sheet = None
-        self.filename = None
-        self.init_excel_logging()
-
-    def init_excel_logging(self):
-        """
-        Initializes the Excel workbook for logging.
-        """
-        init_time_formatted = self.init_time.strftime("%Y%m%d_%H%M%S")
-        self.filename = f"../logs/excel/{init_time_formatted}-log.xlsx"
-
-        if os.path.exists(self.filename):
-            self.workbook = load_workbook(self.filename)
-            self.sheet = self.workbook.active
-        else:
-            self.workbook = Workbook()
-            self.sheet = self.workbook.active
-            headers = ["Gold Value", "Mineral Value", "Is Worth Attacking", "Uptime", "Looted Gold", "Looted Minerals",
-                       "Gold efficiency", "Mineral efficiency"]
-            for col, header in enumerate(headers, start=1):
-                self.sheet.cell(row=1, column=col, value=header)
-
-        self.workbook.save(self.filename)
-
-    def log_to_excel(self, gold_value, mineral_value, is_worth, uptime, loot_gold_value, loot_mineral_value):
-        """
-        Logs data to the Excel spreadsheet.
-
-        Params:
-            gold_value (str): The gold value
-            mineral_value (str): The mineral value
-            is_worth (bool): True if the base is worth attacking, False otherwise
-            uptime (timedelta): The bot's uptime
-            loot_gold_value (str): Amount of looted gold
-            loot_mineral_value (str): Amount of looted minerals
-        """
-        new_row = [gold_value, mineral_value, is_worth, uptime, loot_gold_value, loot_mineral_value]
-        self.sheet.append(new_row)
-        self.workbook.save(self.filename)
-
-
 # TODO: list below
 """
-# TODO: calculate efficiency?
-as for efficiencies, i want them to be stored in new columns within our log table
-mineral_efficiency = loot_mineral_value / mineral_value
-gold_efficiency = loot_gold_value / gold_value
-total_efficiency = (loot_mineral_value+loot_gold_value)/(mineral_value+gold_value)
-at some point (maybe when starting the logger, we should save values assigned to threshholds for:
-defensive_buildings, gold and mineral value (like the one that we use to decide if attack is worth it)
-i want it to be printed over and over again for each entry in a separate column
--------------------
-i want to add some kind of total logging that will be used to calculate stats for entire project
-i want to keep logging stuff for each run separately, but i also want them to be logged to a one bigger logging
-file (we will append new entries there)
-like yk log1.xlsx log2.xlsx log3.xlsx for each run and all_logs.xlsx for file containing all the runs together
-remember about new columns (especially the efficiency ones) and the fact that we have naming convention already
--------------------
 i want all the logging to console be logged to some file, let's say logs.txt; new logs are gonna be appended to the file
 ####gotta fix it -> logs are cleared every time
 """
@@ -0,0 +1,191 @@
+import collections
+import logging
+import time
+
+from image_processing import grab_region, PLAYFIELD_WINDOW_DATA
+from metrics import metrics
+from utils import click_and_wait, focus_window, handle_error
+from utils import CLOSE_NEWS_POPUP_BUTTON, CLOSE_DAILY_GIFT_POPUP_BUTTON, END_BATTLE_BUTTON, GO_HOME_BUTTON, \
+    COLONY_11_BUTTON, FIND_TARGET_BUTTON, FIGHT_NOW_BUTTON
+from utils import NEWS_POPUP_SCREEN, DAILY_GIFT_POPUP_SCREEN, BATTLE_SCREEN, BATTLE_END_SCREEN, ENEMY_BASE_SCREEN, \
+    FIGHT_NOW_SCREEN, ATTACK_MENU_SCREEN, HOME_BASE_SCREEN, PLANETS_LIST_SCREEN
+
+# Seconds without progress, i.e. without a readable enemy, after which the game is refreshed
+WATCHDOG_STALL_TIMEOUT = 180
+# Consecutive unreadable enemies after which the screen is checked
+WATCHDOG_UNREADABLE_SCANS = 3
+# Light recoveries in a row without progress in between before the game is refreshed anyway
+WATCHDOG_MAX_LIGHT_RECOVERIES = 3
+# Clicks a light recovery may take to reach a usable screen
+WATCHDOG_MAX_RECOVERY_STEPS = 6
+# Standard deviation of the grayscale playfield below which the game shows a blank screen: disconnected or reloading
+DISCONNECTED_MAX_DEVIATION = 4.0
+DISCONNECTED_SAMPLE_STRIDE = 8
+
+# Screens in the order they are checked, popups first as they cover the others, with their category
+SCREEN_CATEGORIES = [
+    (NEWS_POPUP_SCREEN, 'popup'),
+    (DAILY_GIFT_POPUP_SCREEN, 'popup'),
+    (BATTLE_END_SCREEN, 'battle'),
+    (BATTLE_SCREEN, 'battle'),
+    (ENEMY_BASE_SCREEN, 'search'),
+    (FIGHT_NOW_SCREEN, 'search'),
+    (ATTACK_MENU_SCREEN, 'search'),
+    (HOME_BASE_SCREEN, 'home'),
+    (PLANETS_LIST_SCREEN, 'home'),
+]
+# The single step moving the game from a screen towards a usable one: (button, time to wait, expected screen)
+RECOVERY_STEPS = {
+    'news_popup': (CLOSE_NEWS_POPUP_BUTTON, 1),
+    'daily_gift_popup': (CLOSE_DAILY_GIFT_POPUP_BUTTON, 1),
+    'battle': (END_BATTLE_BUTTON, 5, BATTLE_END_SCREEN),
+    'battle_end': (GO_HOME_BUTTON, 10, HOME_BASE_SCREEN),
+    'planets_list': (COLONY_11_BUTTON, 7, HOME_BASE_SCREEN),
+    'attack_menu': (FIND_TARGET_BUTTON, 1.5, FIGHT_NOW_SCREEN),
+    'fight_now': (FIGHT_NOW_BUTTON, 8, ENEMY_BASE_SCREEN),
+}
+# Screens the main loop can continue from: scanning enemies, or searching for one
+USABLE_SCREENS = ('enemy_base', 'home_base')
+
+
+class StuckError(Exception):
+    """
+    Raised by the watchdog when the bot stopped making progress.
+    """
+
+
+class Watchdog:
+    """
+    Tells whether the bot is still making progress and gets it going again with the smallest action that works.
+    The current screen is classified from the fingerprints of the screen states (search, battle, home, popup) and the
+    variance of the playfield (disconnected); a popup is closed, a battle finished and a half-open menu clicked
+    through, and the game is only refreshed when the screen isn't recognised or progress has stalled for good.
+    Every recovery is logged to the run log with the downtime it ended.
+    """
+
+    def __init__(self, run_logger=None, stall_timeout=WATCHDOG_STALL_TIMEOUT):
+        self.run_logger = run_logger
+        self.stall_timeout = stall_timeout
+        self.last_progress = time.monotonic()
+        self.last_recovery_end = 0.0
+        self.unreadable_scans = 0
+        self.light_recoveries = 0
+        self.recoveries = collections.Counter()
+        self.downtime = 0.0
+
+    def progress(self):
+        """
+        Marks that the bot is making progress.
+        """
+        self.last_progress = time.monotonic()
+        self.unreadable_scans = 0
+        self.light_recoveries = 0
+
+    def scanned(self, gold_value, mineral_value):
+        """
+        Records the readings of a scanned enemy, a readable enemy being progress.
+        """
+        if gold_value and mineral_value:
+            self.progress()
+        else:
+            self.unreadable_scans += 1
+
+    def stalled(self):
+        return time.monotonic() - self.last_progress >= self.stall_timeout
+
+    def check(self):
+        """
+        Raises StuckError if progress has stalled, or if the last enemies were unreadable because the game isn't on
+        the enemy base screen.
+        """
+        if self.stalled():
+            raise StuckError(f"No progress for {time.monotonic() - self.last_progress:.0f}s")
+        if self.unreadable_scans >= WATCHDOG_UNREADABLE_SCANS:
+            screen, category = self.classify()
+            # Unrecognised screens are left to the stall timeout, e.g. when no templates have been recorded
+            if screen is not None and screen != 'enemy_base':
+                raise StuckError(f"{self.unreadable_scans} unreadable enemies, the game is on {screen} ({category})")
+            self.unreadable_scans = 0
+
+    @staticmethod
+    def classify():
+        """
+        Classifies the current screen.
+
+        Returns:
+            A tuple (screen, category) containing:
+            - screen (str | None): Name of the visible screen state, 'disconnected', or None if not recognised
+            - category (str | None): 'popup', 'battle', 'search', 'home' or 'disconnected', None if not recognised
+        """
+        playfield = grab_region(PLAYFIELD_WINDOW_DATA)
+        if playfield[::DISCONNECTED_SAMPLE_STRIDE, ::DISCONNECTED_SAMPLE_STRIDE].std() < DISCONNECTED_MAX_DEVIATION:
+            return 'disconnected', 'disconnected'
+        for screen_state, category in SCREEN_CATEGORIES:
+            if screen_state.is_visible():
+                return screen_state.name, category
+        return None, None
+
+    def recover(self, error):
+        """
+        Gets the game back to a usable screen after an error.
+
+        Params:
+            error (Exception): The error that interrupted the main loop
+
+        Returns:
+            bool: True if the game is on the enemy base screen and scanning can continue, False if it's on the home
+                base and a new search has to be started
+        """
+        start = time.monotonic()
+        # Downtime counts from the last progress, or from the end of the previous recovery if it came later
+        down_since = max(self.last_progress, self.last_recovery_end)
+        screen, action = None, 'refresh'
+        if not self.stalled() and self.light_recoveries < WATCHDOG_MAX_LIGHT_RECOVERIES:
+            focus_window()
+            screen, steps = self.settle()
+            if screen in USABLE_SCREENS:
+                action = 'light' if steps else 'none'
+                self.light_recoveries += 1
+        if action == 'refresh':
+            handle_error()
+            screen = 'home_base'
+            self.progress()
+
+        self.last_recovery_end = time.monotonic()
+        duration = self.last_recovery_end - start
+        downtime = self.last_recovery_end - down_since
+        self.recoveries[action] += 1
+        self.downtime += downtime
+        metrics.observe('recovery', duration)
+        logging.warning(f"Recovered from '{error}' with action '{action}' in {duration:.1f}s, now on {screen}; "
+                        f"{self.summary()}")
+        if self.run_logger is not None:
+            self.run_logger.log_recovery(str(error), screen, action, duration, downtime)
+        return screen == 'enemy_base'
+
+    def settle(self):
+        """
+        Clicks through the recovery steps of the visible screens until a usable screen shows up.
+
+        Returns:
+            A tuple (screen, steps) containing:
+            - screen (str | None): The last classified screen
+            - steps (list): Names of the screens a step was taken on
+        """
+        steps = []
+        screen = None
+        for _ in range(WATCHDOG_MAX_RECOVERY_STEPS):
+            screen, category = self.classify()
+            logging.info(f"Watchdog: game on {screen} ({category})")
+            if screen in USABLE_SCREENS or screen not in RECOVERY_STEPS:
+                break
+            steps.append(screen)
+            click_and_wait(*RECOVERY_STEPS[screen])
+        return screen, steps
+
+    def summary(self):
+        total = sum(self.recoveries.values())
+        if not total:
+            return "Watchdog: no recoveries"
+        actions = ', '.join(f"{count} {action}" for action, count in self.recoveries.most_common())
+        return f"Watchdog: {total} recoveries ({actions}), {self.downtime:.0f}s downtime"
@@ -0,0 +1,116 @@
+import logging
+import time
+
+# Title of the game window, each bot run by the supervisor gets its own with `python main.py --window <title>`
+GAME_WINDOW_TITLE = "Galaxy Life"
+
+window_finder = None
+
+
+def find_windows(title):
+    """
+    Finds windows by their title, through pygetwindow unless the window finder has been replaced.
+
+    Params:
+        title (str): The title of the window
+
+    Returns:
+        list: The matching windows
+    """
+    if window_finder is not None:
+        return window_finder(title)
+    from pygetwindow import getWindowsWithTitle
+    return getWindowsWithTitle(title)
+
+
+def set_window_finder(finder):
+    """
+    Replaces the window finder, e.g. with one returning recording stand-ins when replaying.
+
+    Params:
+        finder (callable): Function returning the list of windows with a given title
+    """
+    global window_finder
+    window_finder = finder
+    game_windows.clear()
+
+
+class GameWindow:
+    """
+    Handle of the game window, located and placed once. Later checks only compare the cached geometry and focus and
+    place the window again when either of them has changed.
+    """
+
+    def __init__(self, title):
+        self.title = title
+        self.window = None
+        self.geometry = None
+        self.checks = 0
+        self.replacements = 0
+
+    def locate(self):
+        """
+        Finds the window by its title.
+        """
+        try:
+            self.window = find_windows(self.title)[0]
+        except IndexError:
+            logging.error("Window not found!")
+            exit()
+
+    def place(self):
+        """
+        Activates, maximizes and moves the window to the top-left corner of the screen, then caches its geometry.
+        """
+        self.window.activate()
+        time.sleep(0.25)
+        self.window.maximize()
+        time.sleep(0.25)
+        self.window.moveTo(0, 0)
+        time.sleep(0.25)
+        self.geometry = self.read_geometry()
+
+    def read_geometry(self):
+        return self.window.left, self.window.top, self.window.width, self.window.height
+
+    def ensure_placed(self):
+        """
+        Makes sure the window is focused and placed, placing it again only if its geometry or focus has changed.
+        """
+        self.checks += 1
+        if self.window is None:
+            self.locate()
+            self.place()
+            return
+
+        try:
+            needs_placement = self.read_geometry() != self.geometry or not self.window.isActive
+        except Exception as e:
+            # The cached handle is no longer valid, e.g. the window has been recreated
+            logging.warning(f"Game window handle lost: {e}")
+            self.locate()
+            needs_placement = True
+
+        if needs_placement:
+            self.replacements += 1
+            logging.info(f"Placing game window again ({self.replacements} re-placements in {self.checks} checks)")
+            self.place()
+
+
+game_windows = {}
+
+
+def get_game_window(title=None):
+    """
+    Returns the cached handle of a window, creating it on first use.
+
+    Params:
+        title (str | None): The title of the window, GAME_WINDOW_TITLE if not given
+
+    Returns:
+        GameWindow: The window handle
+    """
+    title = title or GAME_WINDOW_TITLE
+    if title not in game_windows:
+        game_windows[title] = GameWindow(title)
+    return game_windows[title]
@@ -0,0 +1,13 @@
+import os
+import sys
+
+import pytest
+
+SRC_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC_DIRECTORY)
+
+
+@pytest.fixture(autouse=True)
+def run_from_src(monkeypatch):
+    # The modules resolve their paths relative to src, where the bot is run from
+    monkeypatch.chdir(SRC_DIRECTORY)
@@ -0,0 +1,105 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from attack_policy import AttackPolicy, evaluate, optimal_loot_rate, throughput, EFFICIENCY_PRIOR_WEIGHT
+
+NAN = float('nan')
+
+
+def scans(rows):
+    """
+    Builds the columns of stats.load_scans from rows
+    (run, gold, minerals, is_worth, uptime, loot gold, loot minerals, defences, base on edge).
+    """
+    run_ids, values = zip(*((row[0], row[1:]) for row in rows))
+    values = np.array(values, dtype=np.float64)
+    runs, run_index = np.unique(np.array(run_ids), return_inverse=True)
+    return {
+        'runs': runs,
+        'run_index': run_index,
+        'gold_value': values[:, 0],
+        'mineral_value': values[:, 1],
+        'is_worth': values[:, 2] > 0,
+        'uptime': values[:, 3],
+        'loot_gold_value': values[:, 4],
+        'loot_mineral_value': values[:, 5],
+        'defences': values[:, 6],
+        'base_on_edge': values[:, 7],
+    }
+
+
+def attacks(run, count, share, defences, start=0):
+    # Attacks of 1000 gold and 1000 minerals enemies, 90 seconds apart, looting the given share
+    return [(run, 1000, 1000, 1, start + index * 90, 1000 * share, 1000 * share, defences, 0) for index in range(count)]
+
+
+def test_optimal_loot_rate_is_the_best_rate_of_any_selection():
+    rng = np.random.default_rng(0)
+    expected_loot = rng.uniform(0, 1000, 8)
+    best = max(throughput(expected_loot, np.array(attack), 8, 90)
+               for attack in itertools.product([False, True], repeat=len(expected_loot)))
+
+    assert optimal_loot_rate(expected_loot, 8, 90) == pytest.approx(best)
+
+
+def test_optimal_loot_rate_attacks_worthy_enemies_only():
+    # Attacking only the first enemy brings 100 loot in 10 + 1 seconds, more per second than attacking both
+    assert optimal_loot_rate(np.array([100.0, 10.0]), 1, 10) == pytest.approx(100 / 11)
+
+
+def test_fit_estimates_the_looted_share_per_defence_bucket():
+    rows = attacks('run', 20, 0.8, 0) + attacks('run', 20, 0.2, 10, start=20 * 90)
+    # An attack whose loot couldn't be read is ignored
+    rows.append(('run', 1000, 1000, 1, 40 * 90, NAN, NAN, 0, 0))
+    policy = AttackPolicy.fit(scans(rows))
+
+    overall = 0.5
+    assert policy.overall_efficiency == pytest.approx(overall)
+    assert policy.efficiencies[0, 0] == pytest.approx((20 * 0.8 + EFFICIENCY_PRIOR_WEIGHT * overall)
+                                                      / (20 + EFFICIENCY_PRIOR_WEIGHT))
+    assert policy.efficiencies[3, 0] == pytest.approx((20 * 0.2 + EFFICIENCY_PRIOR_WEIGHT * overall)
+                                                      / (20 + EFFICIENCY_PRIOR_WEIGHT))
+    # Defences that were never attacked are as bad as the worst attacked ones
+    assert policy.efficiencies[1, 1] == policy.efficiencies[3, 0]
+    assert policy.attack_seconds == 90
+    assert policy.fitted_on['attacks'] == 40
+
+
+def test_decide_attacks_above_the_loot_threshold():
+    efficiencies = [[0.5, 0.5], [0.4, 0.4], [0.3, 0.3], [0.1, 0.2], [0.1, 0.1]]
+    policy = AttackPolicy(efficiencies, 0.3, skip_seconds=10, attack_seconds=110, loot_rate=10)
+
+    assert policy.loot_threshold == 1000
+    assert policy.decide(1500, 1500, 0, False) == (True, pytest.approx(1500))
+    assert policy.decide(1500, 1500, 10, False) == (False, pytest.approx(300))
+    assert policy.decide(1500, 1500, 10, True) == (False, pytest.approx(600))
+    # Without defence features the overall share is used
+    assert policy.decide(1500, 1500, None, None) == (False, pytest.approx(900))
+    assert policy.worth_detecting(1500, 1500)
+    assert not policy.worth_detecting(500, 500)
+
+
+def test_evaluate_scores_realized_outcomes_only():
+    train = attacks('a', 30, 0.5, 0)
+    test = [
+        # Attacked by both, loot read
+        ('b', 1000, 1000, 1, 0, 800, 200, 0, 0),
+        # Skipped by both
+        ('b', 50, 50, 0, 90, 0, 0, 0, 0),
+        # Rich but well defended: skipped by the thresholds and the run, attacked by the policy, no realized outcome
+        ('b', 5000, 5000, 0, 98, 0, 0, 8, 0),
+        # Attacked by both but the loot couldn't be read
+        ('b', 1000, 1000, 1, 106, NAN, NAN, 0, 0),
+        # Attacked by the thresholds only
+        ('b', 150, 150, 1, 196, 100, 50, 0, 0),
+    ]
+    evaluation = evaluate(scans(train + test), (100, 100, 5), test_runs=1)
+
+    assert evaluation['scans'] == 5
+    assert evaluation['scored'] == 3
+    assert (evaluation['fixed_without_outcome'], evaluation['learned_without_outcome']) == (1, 2)
+    assert (evaluation['fixed_attacks'], evaluation['learned_attacks'], evaluation['changed']) == (2, 1, 1)
+    assert evaluation['fixed_loot_per_hour'] == pytest.approx(1150 / (90 + 8 + 90) * 3600)
+    assert evaluation['learned_loot_per_hour'] == pytest.approx(1000 / (90 + 8 + 8) * 3600)
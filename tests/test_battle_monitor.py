@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+import battle_monitor
+from battle_monitor import BattleMonitor
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeScreen:
+    def __init__(self, clock, visible_at=None):
+        self.clock = clock
+        self.visible_at = visible_at
+
+    def is_visible(self):
+        return self.visible_at is not None and self.clock.now >= self.visible_at
+
+
+def loot(value):
+    return np.full((50, 65), value, dtype=np.uint8)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(battle_monitor, 'time', clock)
+    monkeypatch.setattr(battle_monitor, 'read_resource_values', lambda region: '123456')
+    return clock
+
+
+def run_battle(monkeypatch, clock, values, end_screen_at=None):
+    """
+    Runs a battle in which the loot region shows values[i] at the i-th second, the last value afterwards.
+    """
+    samples = iter(values)
+    monkeypatch.setattr(battle_monitor, 'grab_region', lambda window_data: loot(next(samples, values[-1])))
+    monkeypatch.setattr(battle_monitor, 'BATTLE_END_SCREEN', FakeScreen(clock, end_screen_at))
+    monitor = BattleMonitor(timeout=50)
+    return monitor, monitor.wait_for_battle_end()
+
+
+def test_battle_ends_once_the_loot_stops_changing(monkeypatch, clock):
+    # Loot is taken from the 4th to the 12th second
+    monitor, duration = run_battle(monkeypatch, clock, [200] * 4 + list(range(190, 100, -10)))
+
+    assert duration == pytest.approx(12 + battle_monitor.BATTLE_STABLE_DURATION)
+    assert monitor.without_loot == 0
+
+
+def test_stability_is_only_measured_after_the_first_change(monkeypatch, clock):
+    # Looters need 15s to reach the first building, longer than the minimum duration and the stable duration
+    monitor, duration = run_battle(monkeypatch, clock, [200] * 15 + [150])
+
+    assert duration == pytest.approx(15 + battle_monitor.BATTLE_STABLE_DURATION)
+
+
+def test_battle_without_loot_ends_after_the_no_loot_timeout(monkeypatch, clock):
+    monitor, duration = run_battle(monkeypatch, clock, [200])
+
+    assert duration == pytest.approx(battle_monitor.BATTLE_NO_LOOT_TIMEOUT)
+    assert monitor.without_loot == 1
+    assert "1 without loot change" in monitor.summary()
+
+
+def test_battle_end_screen_ends_the_battle(monkeypatch, clock):
+    _, duration = run_battle(monkeypatch, clock, list(range(250, 0, -5)), end_screen_at=7)
+
+    assert duration == pytest.approx(7)
+
+
+def test_battle_never_exceeds_the_timeout(monkeypatch, clock):
+    _, duration = run_battle(monkeypatch, clock, list(range(250, 0, -3)))
+
+    assert duration == pytest.approx(50)
+
+
+def test_unreadable_loot_region_is_reported_once(monkeypatch, clock, caplog):
+    monkeypatch.setattr(battle_monitor, 'read_resource_values', lambda region: '')
+    monkeypatch.setattr(battle_monitor, 'grab_region', lambda window_data: loot(200))
+    monkeypatch.setattr(battle_monitor, 'BATTLE_END_SCREEN', FakeScreen(clock, visible_at=0))
+    monitor = BattleMonitor()
+    monitor.wait_for_battle_end()
+    monitor.wait_for_battle_end()
+
+    assert len([record for record in caplog.records if "doesn't show the loot counters" in record.message]) == 1
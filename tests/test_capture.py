@@ -0,0 +1,77 @@
+import cv2
+import numpy as np
+import pytest
+
+import capture
+from capture import FakeCaptureBackend, capture_frame, grab_region_into_buffer, set_capture_backend
+
+
+@pytest.fixture
+def screens(tmp_path):
+    paths = []
+    for index in range(2):
+        image = np.zeros((40, 60, 3), dtype=np.uint8)
+        image[:, :, 0] = np.arange(60, dtype=np.uint8)
+        image[:, :, 1] = np.arange(40, dtype=np.uint8)[:, None]
+        image[:, :, 2] = index
+        path = tmp_path / f"screen_{index}.png"
+        cv2.imwrite(str(path), image)
+        paths.append(path)
+    return paths
+
+
+@pytest.fixture
+def backend(screens):
+    backend = FakeCaptureBackend.from_directory(str(screens[0].parent))
+    set_capture_backend(backend)
+    yield backend
+    set_capture_backend(None)
+
+
+def test_full_screen_frame(backend):
+    frame = capture_frame()
+
+    assert frame.is_full_screen
+    assert frame.pixels.shape == (40, 60, 3)
+    assert np.array_equal(frame.pixels, backend.image)
+
+
+def test_region_frame_is_cropped_in_screen_coordinates(backend):
+    frame = capture_frame([10, 5, 20, 15])
+
+    assert not frame.is_full_screen
+    assert frame.pixels.shape == (15, 20, 3)
+    assert np.array_equal(frame.pixels, backend.image[5:20, 10:30])
+    assert np.array_equal(frame.crop([12, 7, 4, 3]), backend.image[7:10, 12:16])
+
+
+def test_region_outside_of_the_screen_is_black(backend):
+    frame = capture_frame([50, 30, 20, 20])
+
+    assert np.array_equal(frame.pixels[:10, :10], backend.image[30:40, 50:60])
+    assert not frame.pixels[10:].any() and not frame.pixels[:, 10:].any()
+
+
+def test_advance_serves_the_screens_in_name_order(backend, screens):
+    assert backend.current_path == str(screens[0])
+    assert capture_frame().pixels[0, 0, 2] == 0
+
+    assert backend.advance()
+    assert capture_frame().pixels[0, 0, 2] == 1
+    assert not backend.advance()
+
+
+def test_region_buffer_is_reused_for_the_same_size(backend):
+    first = grab_region_into_buffer([0, 0, 8, 8])
+    second = grab_region_into_buffer([8, 8, 8, 8])
+
+    assert first is second
+    assert np.array_equal(second, backend.image[8:16, 8:16])
+    assert grab_region_into_buffer([0, 0, 4, 4]) is not first
+
+
+def test_setting_a_backend_drops_the_region_buffers(backend):
+    grab_region_into_buffer([0, 0, 8, 8])
+    set_capture_backend(backend)
+
+    assert not capture.region_buffers
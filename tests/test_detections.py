@@ -0,0 +1,60 @@
+import numpy as np
+
+from detections import Detections, BASE_CLASS_ID
+
+NAMES = {0: 'cannon', BASE_CLASS_ID: 'base'}
+
+
+def make_detections():
+    return Detections.from_array(np.array([
+        [10, 20, 30, 40, 0.9, 0],
+        [100, 110, 200, 210, 0.6, BASE_CLASS_ID],
+        [50, 60, 70, 80, 0.15, 0],
+        [120, 130, 180, 190, 0.8, BASE_CLASS_ID],
+    ], dtype=np.float32), NAMES)
+
+
+def test_array_round_trip():
+    detections = make_detections()
+
+    assert len(detections) == 4
+    assert detections.classes.dtype == np.int64
+    assert np.array_equal(Detections.from_array(detections.to_array()).to_array(), detections.to_array())
+
+
+def test_filter_keeps_scores_above_the_threshold():
+    detections = make_detections().filter(0.6)
+
+    assert detections.scores.tolist() == [np.float32(0.9), np.float32(0.8)]
+    assert detections.names is NAMES
+
+
+def test_offset_moves_boxes_only():
+    detections = make_detections()
+    moved = detections.offset(5, 7)
+
+    assert moved.boxes[0].tolist() == [15, 27, 35, 47]
+    assert np.array_equal(moved.scores, detections.scores)
+    assert np.array_equal(detections.boxes[0], [10, 20, 30, 40])
+
+
+def test_base_box_is_the_best_scored_base():
+    assert make_detections().base_box.tolist() == [120, 130, 180, 190]
+    assert make_detections().filter(0.95).base_box is None
+
+
+def test_encompassing_rectangle():
+    assert make_detections().encompassing_rectangle().tolist() == [10, 200, 20, 210]
+    assert make_detections().filter(1.0).encompassing_rectangle() is None
+
+
+def test_labels_and_text():
+    detections = make_detections()
+    unnamed = Detections.from_array(detections.to_array())
+
+    assert detections.label(1) == 'base'
+    assert unnamed.label(1) == str(BASE_CLASS_ID)
+    lines = detections.to_text().splitlines()
+    assert lines[0] == "Total detected boxes: 4"
+    assert lines[2].startswith("0,0.899")
+    assert lines[2].endswith(",10.0,20.0,30.0,40.0")
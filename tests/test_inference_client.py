@@ -0,0 +1,93 @@
+import socket
+import threading
+from multiprocessing.connection import Listener
+
+import numpy as np
+import pytest
+
+import image_processing
+import inference_service
+from inference_service import InferenceClient
+
+AUTHKEY = b'test-authkey'
+
+
+class FakeReader:
+    def __init__(self):
+        self.regions = []
+
+    def readtext(self, region, detail=0):
+        self.regions.append(region)
+        return ['123 456']
+
+
+def free_address():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()
+
+
+def failing_service(listener):
+    # Answers every request with an error, like a service whose model can't run
+    with listener.accept() as connection:
+        try:
+            while True:
+                connection.recv()
+                connection.send({'ok': False, 'error': "ModuleNotFoundError: No module named '_posixsubprocess'"})
+        except EOFError:
+            pass
+
+
+@pytest.fixture
+def reader(monkeypatch):
+    reader = FakeReader()
+    monkeypatch.setattr(image_processing.model_registry, 'get_reader', lambda: reader)
+    return reader
+
+
+def test_service_down_is_not_retried_before_the_interval(monkeypatch):
+    client = InferenceClient(address=free_address(), authkey=AUTHKEY)
+    attempts = []
+    connect = inference_service.Client
+    monkeypatch.setattr(inference_service, 'Client', lambda *args, **kwargs: attempts.append(args) or
+                        connect(*args, **kwargs))
+
+    assert not client.available()
+    assert not client.available()
+    assert len(attempts) == 1
+
+    client.retry_at = 0
+    assert not client.available()
+    assert len(attempts) == 2
+
+
+def test_disabled_service_is_never_connected(monkeypatch):
+    monkeypatch.setattr(inference_service, 'USE_INFERENCE_SERVICE', False)
+    client = InferenceClient(address=free_address(), authkey=AUTHKEY)
+
+    assert not client.available()
+    assert client.retry_at == 0
+
+
+def test_read_text_runs_in_the_bot_when_the_service_is_down(monkeypatch, reader):
+    monkeypatch.setattr(image_processing, 'inference_client', InferenceClient(address=free_address(), authkey=AUTHKEY))
+    region = np.zeros((25, 65), dtype=np.uint8)
+
+    assert image_processing.read_text(region) == ['123 456']
+    assert len(reader.regions) == 1
+
+
+def test_read_text_runs_in_the_bot_when_the_service_fails(monkeypatch, reader):
+    with Listener(('127.0.0.1', 0), authkey=AUTHKEY) as listener:
+        service = threading.Thread(target=failing_service, args=(listener,), daemon=True)
+        service.start()
+        client = InferenceClient(address=listener.address, authkey=AUTHKEY)
+        monkeypatch.setattr(image_processing, 'inference_client', client)
+
+        assert client.available()
+        with pytest.raises(RuntimeError):
+            client.read_text(np.zeros((25, 65), dtype=np.uint8))
+        assert image_processing.read_text(np.zeros((25, 65), dtype=np.uint8)) == ['123 456']
+        assert len(reader.regions) == 1
+        client.close()
+        service.join(5)
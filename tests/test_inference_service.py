@@ -0,0 +1,220 @@
+import os
+import stat
+import threading
+from multiprocessing.connection import Listener
+
+import numpy as np
+import pytest
+
+import inference_service
+from inference_service import InferenceClient, InferenceServer, get_authkey, INFERENCE_SERVICE_AUTHKEY_ENV
+
+AUTHKEY = b'test-authkey'
+
+
+class FakeTensor:
+    def __init__(self, array):
+        self.array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+
+class FakeBoxes:
+    def __init__(self, array):
+        self.data = FakeTensor(array)
+
+
+class FakeResults:
+    """
+    Detector results with a single box scored by the mean of the frame, so a response tells which frame was read.
+    """
+
+    names = {0: 'cannon'}
+
+    def __init__(self, pixels):
+        self.boxes = FakeBoxes(np.array([[0, 0, pixels.shape[1], pixels.shape[0], pixels.mean() / 255, 0]],
+                                        dtype=np.float32))
+
+
+class FakeDetector:
+    def __init__(self):
+        self.batch_sizes = []
+        self.failing = False
+
+    def __call__(self, inputs, imgsz, verbose=False):
+        if self.failing:
+            raise RuntimeError("detector failed")
+        inputs = inputs if isinstance(inputs, list) else [inputs]
+        self.batch_sizes.append(len(inputs))
+        return [FakeResults(pixels) for pixels in inputs]
+
+
+class FakeReader:
+    def readtext(self, region, detail=0):
+        return [str(int(region.sum()))]
+
+    def readtext_batched(self, regions, detail=0):
+        return [self.readtext(region) for region in regions]
+
+
+class FakeRegistry:
+    def __init__(self):
+        self.detector = FakeDetector()
+        self.load_times = {}
+        self.detector_runtime = 'fake'
+
+    def get_detector(self):
+        return self.detector
+
+    def get_reader(self):
+        return FakeReader()
+
+
+def accept_connections(server, listener):
+    while True:
+        try:
+            connection = listener.accept()
+        except OSError:
+            return
+        threading.Thread(target=server.handle, args=(connection,), daemon=True).start()
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """
+    The service on localhost with stand-in models, started like serve_forever without loading the real ones.
+    """
+    # The bots and the service share the resource tracker of this process, which has to keep tracking the segments
+    # the bots own
+    monkeypatch.setattr(inference_service.resource_tracker, 'unregister', lambda name, rtype: None)
+    server = InferenceServer(('127.0.0.1', 0), authkey=AUTHKEY)
+    server.model_registry = FakeRegistry()
+    threading.Thread(target=server.run_batches, daemon=True).start()
+    with Listener(('127.0.0.1', 0), authkey=server.authkey) as listener:
+        server.address = listener.address
+        threading.Thread(target=accept_connections, args=(server, listener), daemon=True).start()
+        yield server
+
+
+@pytest.fixture
+def client(server):
+    client = InferenceClient(address=server.address, authkey=AUTHKEY)
+    assert client.available()
+    yield client
+    client.close()
+
+
+def frame(value, size=64):
+    return np.full((size, size, 3), value, dtype=np.uint8)
+
+
+def test_detect_reads_the_frame_from_shared_memory(client):
+    detections = client.detect(frame(51), 640)
+
+    assert len(detections) == 1
+    assert detections.scores[0] == pytest.approx(0.2)
+    assert detections.label(0) == 'cannon'
+    assert client.detect(frame(102), 640).scores[0] == pytest.approx(0.4)
+
+
+def test_read_text_sends_the_region_inline(client):
+    assert client.read_text(np.ones((25, 65), dtype=np.uint8)) == [str(25 * 65)]
+
+
+def test_ping_reports_the_service(client, server):
+    client.read_text(np.ones((2, 2), dtype=np.uint8))
+    service = client.ping()
+
+    assert service['detector_runtime'] == 'fake'
+    assert service['connections'] == 1
+    assert service['batches']['read_text'] == [1, 1]
+
+
+def test_grown_frame_replaces_the_segment_of_the_connection(client, monkeypatch):
+    attached = []
+    attach = inference_service.attach_shared_memory
+    monkeypatch.setattr(inference_service, 'attach_shared_memory', lambda name: attached.append(attach(name)) or
+                        attached[-1])
+
+    assert client.detect(frame(51, size=32), 640).scores[0] == pytest.approx(0.2)
+    assert client.detect(frame(102, size=64), 640).scores[0] == pytest.approx(0.4)
+
+    assert len(attached) == 2
+    # The service closed its mapping of the segment the client unlinked when it grew its buffer
+    assert attached[0].buf is None
+    assert attached[1].buf is not None
+
+
+def test_requests_of_several_bots_are_batched(server, monkeypatch):
+    monkeypatch.setattr(inference_service, 'INFERENCE_BATCH_WINDOW', 0.2)
+    clients = [InferenceClient(address=server.address, authkey=AUTHKEY) for _ in range(3)]
+    assert all(client.available() for client in clients)
+    results = {}
+
+    def detect(index, client):
+        results[index] = client.detect(frame(index * 50), 640)
+
+    threads = [threading.Thread(target=detect, args=(index, client)) for index, client in enumerate(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    for client in clients:
+        client.close()
+
+    assert server.model_registry.detector.batch_sizes == [3]
+    assert server.batches['detect'] == [1, 3]
+    for index, detections in results.items():
+        assert detections.scores[0] == pytest.approx(index * 50 / 255)
+
+
+def test_model_errors_are_returned_to_the_bot(client, server):
+    server.model_registry.detector.failing = True
+
+    with pytest.raises(RuntimeError, match="detector failed"):
+        client.detect(frame(0), 640)
+    # The connection stays usable
+    assert client.read_text(np.ones((1, 1), dtype=np.uint8)) == ['1']
+
+
+def test_client_with_another_key_is_rejected(server):
+    client = InferenceClient(address=server.address, authkey=b'another-key')
+
+    assert not client.available()
+    assert client.retry_at > 0
+
+
+def test_connections_are_counted_across_threads(server):
+    clients = [InferenceClient(address=server.address, authkey=AUTHKEY) for _ in range(8)]
+    threads = [threading.Thread(target=client.available) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert clients[0].ping()['connections'] == 8
+    for client in clients:
+        client.close()
+
+
+def test_authkey_is_generated_once_for_the_user_only(tmp_path, monkeypatch):
+    monkeypatch.delenv(INFERENCE_SERVICE_AUTHKEY_ENV, raising=False)
+    path = str(tmp_path / "keys" / "inference_authkey")
+    key = get_authkey(path)
+
+    assert len(key) == 64
+    assert get_authkey(path) == key
+    if os.name == 'posix':
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+
+def test_authkey_from_the_environment_takes_precedence(tmp_path, monkeypatch):
+    monkeypatch.setenv(INFERENCE_SERVICE_AUTHKEY_ENV, 'from-the-environment')
+    path = tmp_path / "inference_authkey"
+
+    assert get_authkey(str(path)) == b'from-the-environment'
+    assert not path.exists()
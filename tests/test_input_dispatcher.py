@@ -0,0 +1,60 @@
+import pytest
+
+import utils
+from input_dispatcher import FakeInputBackend, InputDispatcher
+
+PAUSE = 0.05
+
+
+class FakeScreen:
+    def __init__(self):
+        self.waits = []
+
+    def wait(self, timeout, leave_first=False):
+        self.waits.append((timeout, leave_first))
+        return True
+
+
+@pytest.fixture
+def backend():
+    backend = FakeInputBackend(latency=0.02)
+    previous = utils.input_backend
+    utils.set_input_backend(backend)
+    yield backend
+    utils.set_input_backend(previous)
+
+
+def test_sequence_clicks_in_order(backend):
+    dispatcher = InputDispatcher()
+    dispatcher.click_sequence([((1, 2), PAUSE), ((3, 4), PAUSE), ((5, 6), 0)])
+
+    assert [(name, args) for _, name, args, _ in backend.calls] == [('click', ((1, 2),)), ('click', ((3, 4),)),
+                                                                    ('click', ((5, 6),))]
+    assert (dispatcher.sequences, dispatcher.clicks) == (1, 3)
+    assert len(dispatcher.latencies) == 3
+
+
+def test_click_latency_is_absorbed_by_the_pause(backend):
+    dispatcher = InputDispatcher()
+    dispatcher.click_sequence([((0, 0), PAUSE), ((0, 0), PAUSE), ((0, 0), 0)])
+
+    times = [time for time, *_ in backend.calls]
+    gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+    # Clicks are scheduled PAUSE apart from each other's start, not PAUSE after each one ends
+    assert all(PAUSE - 0.005 <= gap < PAUSE + 0.015 for gap in gaps)
+
+
+def test_sequence_waits_for_the_expected_screen(backend):
+    screen = FakeScreen()
+    InputDispatcher().click_sequence([((0, 0), 0), ((0, 0), 3)], until_screen=screen, leave_first=True)
+
+    # The pause of the last step is the timeout of the wait
+    assert screen.waits == [(3, True)]
+
+
+def test_summary():
+    dispatcher = InputDispatcher()
+
+    assert dispatcher.summary() == "Input: no clicks sent yet"
+    dispatcher.record(0.002)
+    assert dispatcher.summary().startswith("Input: 1 clicks in 0 sequences")
@@ -0,0 +1,85 @@
+import pytest
+
+from metrics import Histogram, Metrics
+
+BUCKETS = (0.01, 0.1, 1)
+
+
+def test_observations_fall_in_the_first_bucket_they_fit():
+    histogram = Histogram(BUCKETS)
+    for seconds in (0.005, 0.01, 0.05, 0.5, 5):
+        histogram.observe(seconds)
+
+    # Bounds are inclusive, like Prometheus' le, and the last bucket counts what exceeds every bound
+    assert histogram.counts == [2, 1, 1, 1]
+    assert histogram.count == 5
+    assert histogram.sum == pytest.approx(5.565)
+    assert histogram.max == 5
+
+
+def test_quantile_is_the_upper_bound_of_its_bucket():
+    histogram = Histogram(BUCKETS)
+    for seconds in (0.005, 0.006, 0.05, 0.5):
+        histogram.observe(seconds)
+
+    assert histogram.quantile(0.5) == 0.01
+    assert histogram.quantile(0.75) == 0.1
+    assert histogram.quantile(1.0) == 0.5
+
+
+def test_quantile_is_capped_by_the_maximum():
+    histogram = Histogram(BUCKETS)
+    histogram.observe(0.2)
+    assert histogram.quantile(0.5) == 0.2
+
+    histogram.observe(30)
+    assert histogram.quantile(0.5) == 1
+    assert histogram.quantile(0.99) == 30
+
+
+def test_cycle_sums_stages_until_it_ends():
+    metrics = Metrics(enabled=True)
+    metrics.observe('ocr', 0.01)
+    metrics.observe('ocr', 0.02)
+    with metrics.span('yolo'):
+        pass
+
+    cycle = metrics.end_cycle()
+
+    assert cycle['ocr'] == pytest.approx(0.03)
+    assert set(cycle) == {'ocr', 'yolo'}
+    assert metrics.end_cycle() == {}
+    assert metrics.histograms['ocr'].count == 2
+
+
+def test_span_records_failing_blocks():
+    metrics = Metrics(enabled=True)
+    with pytest.raises(ValueError):
+        with metrics.span('click'):
+            raise ValueError("missed")
+
+    assert metrics.histograms['click'].count == 1
+
+
+def test_disabled_metrics_record_nothing():
+    metrics = Metrics(enabled=False)
+    metrics.observe('ocr', 0.01)
+    with metrics.span('yolo'):
+        pass
+
+    assert metrics.histograms == {}
+    assert metrics.summary() == "Stage latencies: nothing recorded yet"
+
+
+def test_prometheus_buckets_are_cumulative():
+    metrics = Metrics(enabled=True)
+    for seconds in (0.0005, 0.003, 100):
+        metrics.observe('click', seconds)
+
+    lines = metrics.to_prometheus().splitlines()
+
+    assert 'galaxylifebot_stage_seconds_bucket{stage="click",le="0.001"} 1' in lines
+    assert 'galaxylifebot_stage_seconds_bucket{stage="click",le="0.005"} 2' in lines
+    assert 'galaxylifebot_stage_seconds_bucket{stage="click",le="60"} 2' in lines
+    assert 'galaxylifebot_stage_seconds_bucket{stage="click",le="+Inf"} 3' in lines
+    assert 'galaxylifebot_stage_seconds_count{stage="click"} 3' in lines
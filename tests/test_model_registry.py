@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+import model_registry
+from model_registry import detector_exports, load_runtime_choice, save_runtime_choice
+
+
+@pytest.fixture
+def exports(tmp_path, monkeypatch):
+    (tmp_path / "best.onnx").write_text("onnx")
+    (tmp_path / "best_openvino_model").mkdir()
+    (tmp_path / "best_openvino_model" / "best.xml").write_text("openvino")
+    monkeypatch.setattr(model_registry, 'DETECTOR_RUNTIMES', {
+        'onnx': (str(tmp_path / "best.onnx"), 'onnxruntime'),
+        'openvino': (str(tmp_path / "best_openvino_model"), 'openvino'),
+    })
+    return tmp_path
+
+
+def test_saved_choice_is_used_for_the_same_exports(exports):
+    path = str(exports / "detector_runtime.json")
+    save_runtime_choice('openvino', detector_exports(['onnx', 'openvino']), {'onnx': 0.05, 'openvino': 0.03}, path)
+
+    assert load_runtime_choice(detector_exports(['onnx', 'openvino']), path) == 'openvino'
+
+
+def test_rebuilt_export_invalidates_the_choice(exports):
+    path = str(exports / "detector_runtime.json")
+    save_runtime_choice('openvino', detector_exports(['onnx', 'openvino']), {}, path)
+    model = exports / "best_openvino_model" / "best.xml"
+    os.utime(model, (os.path.getmtime(model) + 10,) * 2)
+
+    assert load_runtime_choice(detector_exports(['onnx', 'openvino']), path) is None
+
+
+def test_removed_export_invalidates_the_choice(exports):
+    path = str(exports / "detector_runtime.json")
+    save_runtime_choice('openvino', detector_exports(['onnx', 'openvino']), {}, path)
+
+    assert load_runtime_choice(detector_exports(['onnx']), path) is None
+
+
+def test_missing_or_unreadable_choice_is_ignored(exports):
+    (exports / "broken.json").write_text("{")
+
+    assert load_runtime_choice(detector_exports(['onnx']), str(exports / "missing.json")) is None
+    assert load_runtime_choice(detector_exports(['onnx']), str(exports / "broken.json")) is None
@@ -0,0 +1,69 @@
+import cv2
+import numpy as np
+
+from ocr_cache import OcrCache
+
+
+def counter(text):
+    region = np.full((25, 120), 30, dtype=np.uint8)
+    cv2.putText(region, text, (2, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.7, 230, 2, cv2.LINE_AA)
+    return region
+
+
+def test_key_ignores_brightness_that_keeps_the_glyphs():
+    region = counter("123456")
+
+    assert OcrCache.key(region) == OcrCache.key(region.copy())
+    assert OcrCache.key(region) == OcrCache.key(region + 12)
+    assert OcrCache.key(region) != OcrCache.key(counter("123457"))
+
+
+def test_key_depends_on_the_region_shape():
+    region = np.zeros((20, 40), dtype=np.uint8)
+
+    assert OcrCache.key(region) != OcrCache.key(region.reshape(40, 20))
+
+
+def test_hits_and_misses():
+    cache = OcrCache(max_size=4)
+    key = cache.key(counter("500000"))
+
+    assert cache.get(key) is None
+    cache.put(key, "500000")
+    assert cache.get(key) == "500000"
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert "1 hits, 1 misses (50.0% hit rate)" in cache.summary()
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = OcrCache(max_size=2)
+    cache.put('a', '1')
+    cache.put('b', '2')
+    cache.get('a')
+    cache.put('c', '3')
+
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == ('1', '3')
+    assert cache.evictions == 1
+
+
+def test_persisted_entries_are_loaded_up_to_the_size(tmp_path):
+    path = str(tmp_path / "ocr_cache.json")
+    cache = OcrCache(max_size=3, path=path)
+    for index in range(3):
+        cache.put(str(index), str(index * 10))
+    cache.save()
+
+    loaded = OcrCache(max_size=2, path=path)
+    loaded.load()
+
+    assert list(loaded.entries.items()) == [('1', '10'), ('2', '20')]
+
+
+def test_unreadable_persisted_cache_is_ignored(tmp_path):
+    path = tmp_path / "ocr_cache.json"
+    path.write_text("{not json")
+    cache = OcrCache(path=str(path))
+    cache.load()
+
+    assert not cache.entries
@@ -0,0 +1,172 @@
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+import capture
+import image_processing
+import inference_service
+import utils
+import window
+from image_processing import SCAN_WINDOW_DATA
+from ocr_cache import OcrCache
+from replay import compare_decisions, find_replay_frames, install_replay, replay
+
+COUNTER_UNIT = 25000
+# Fixture frames: gold and mineral counters, as read by the fake reader, and number of defences
+FIXTURE_FRAMES = {
+    'enemy_1.png': (600000, 1200000, 2),
+    'enemy_2.png': (100000, 1200000, 2),
+    'enemy_3.png': (700000, 1500000, 8),
+}
+# Baseline decisions of the fixture frames
+FIXTURE_DECISIONS = {
+    'enemy_1.png': {'gold_value': '600000', 'mineral_value': '1200000', 'is_worth': True},
+    'enemy_2.png': {'gold_value': '100000', 'mineral_value': '1200000', 'is_worth': False},
+    'enemy_3.png': {'gold_value': '700000', 'mineral_value': '1500000', 'is_worth': False},
+}
+
+
+class FakeReader:
+    # Reads a counter from the width of its bright bar, COUNTER_UNIT per column
+    def readtext(self, region, detail=0):
+        return [str(int((region.max(axis=0) > 128).sum()) * COUNTER_UNIT)]
+
+
+class FakeTensor:
+    def __init__(self, array):
+        self.array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+
+class FakeResults:
+    names = {0: 'cannon', 7: 'base'}
+
+    def __init__(self, data):
+        self.boxes = type('Boxes', (), {'data': FakeTensor(data)})()
+
+
+class FakeDetector:
+    """
+    Detects the base in the middle of the screen and as many defences in the corners as the blue channel of the
+    top-left pixel tells.
+    """
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, image, imgsz, verbose=False):
+        self.calls += 1
+        height, width = image.shape[:2]
+        corners = [(0, 0), (width - 10, height - 10), (0, height - 10), (width - 10, 0)]
+        rows = [[width / 2 - 10, height / 2 - 10, width / 2 + 10, height / 2 + 10, 0.9, 7]]
+        for index in range(int(image[0, 0, 0])):
+            x, y = corners[index % len(corners)]
+            rows.append([x, y, x + 10, y + 10, 0.9, 0])
+        return [FakeResults(np.array(rows, dtype=np.float32))]
+
+
+def test_identical_decisions_agree():
+    decisions = {'a.png': {'gold_value': '100', 'is_worth': False}, 'b.png': {'gold_value': '200', 'is_worth': True}}
+
+    assert compare_decisions(decisions, dict(decisions)) == (1.0, [])
+
+
+def test_different_decisions_are_listed():
+    decisions = {'a.png': {'gold_value': '100', 'is_worth': False}, 'b.png': {'gold_value': '200', 'is_worth': True}}
+    baseline = {'a.png': {'gold_value': '100', 'is_worth': False}, 'b.png': {'gold_value': '200', 'is_worth': False}}
+
+    assert compare_decisions(decisions, baseline) == (0.5, ['b.png'])
+
+
+def test_only_common_frames_and_keys_are_compared():
+    decisions = {'a.png': {'is_worth': True, 'is_worth_based_on_defences': False}, 'new.png': {'is_worth': True}}
+    baseline = {'a.png': {'is_worth': True}, 'old.png': {'is_worth': False}}
+
+    assert compare_decisions(decisions, baseline) == (1.0, [])
+
+
+def test_failed_frame_differs_from_a_decided_one():
+    assert compare_decisions({'a.png': {'error': 'no window'}}, {'a.png': {'is_worth': True}}) == (0.0, ['a.png'])
+
+
+def test_no_common_frames_agree():
+    assert compare_decisions({'a.png': {'is_worth': True}}, {}) == (1.0, [])
+
+
+def test_find_replay_frames_skips_crops_and_annotated_images(tmp_path):
+    screen = np.zeros((SCAN_WINDOW_DATA[1] + SCAN_WINDOW_DATA[3], SCAN_WINDOW_DATA[0] + SCAN_WINDOW_DATA[2], 3),
+                       dtype=np.uint8)
+    cv2.imwrite(str(tmp_path / "20260101_120001.jpg"), screen)
+    cv2.imwrite(str(tmp_path / "20260101_120000.png"), screen)
+    cv2.imwrite(str(tmp_path / "20260101_120000_detections.jpg"), screen)
+    cv2.imwrite(str(tmp_path / "20260101_120002.png"), screen[:SCAN_WINDOW_DATA[3], :SCAN_WINDOW_DATA[2]])
+    (tmp_path / "20260101_120000.txt").write_text("Total detected boxes: 0\n")
+
+    assert find_replay_frames([str(tmp_path)]) == [str(tmp_path / "20260101_120000.png"),
+                                                   str(tmp_path / "20260101_120001.jpg")]
+
+
+@pytest.fixture
+def fixture_frames(tmp_path):
+    x, y, width, height = SCAN_WINDOW_DATA
+    for name, (gold, minerals, defences) in FIXTURE_FRAMES.items():
+        screen = np.full((y + height + 50, x + width + 50, 3), 40, dtype=np.uint8)
+        screen[y + 5:y + height // 2 - 5, x:x + gold // COUNTER_UNIT] = 230
+        screen[y + height // 2 + 5:y + height - 5, x:x + minerals // COUNTER_UNIT] = 230
+        screen[0, 0, 0] = defences
+        cv2.imwrite(str(tmp_path / name), screen)
+    return find_replay_frames([str(tmp_path)])
+
+
+@pytest.fixture
+def replay_models(monkeypatch):
+    """
+    Fake reader and detector in the bot, with no inference service, attack policy, digit templates or OCR cache.
+    """
+    detector = FakeDetector()
+    monkeypatch.setattr(image_processing.model_registry, 'get_reader', lambda: FakeReader())
+    monkeypatch.setattr(image_processing.model_registry, 'get_detector', lambda: detector)
+    monkeypatch.setattr(inference_service, 'USE_INFERENCE_SERVICE', False)
+    monkeypatch.setattr(image_processing, 'get_attack_policy', lambda: None)
+    monkeypatch.setattr(image_processing.digit_recognizer, 'templates', None)
+    monkeypatch.setattr(image_processing.digit_recognizer, 'templates_loaded', True)
+    monkeypatch.setattr(image_processing, 'ocr_cache', OcrCache())
+    for flag in ('SAVE_SCREENSHOTS', 'SAVE_DETECTION_RESULTS'):
+        monkeypatch.setattr(image_processing, flag, getattr(image_processing, flag))
+    previous_input = utils.input_backend
+    yield detector
+    capture.set_capture_backend(None)
+    window.set_window_finder(None)
+    utils.set_input_backend(previous_input)
+
+
+def test_replayed_fixture_frames_match_the_baseline(fixture_frames, replay_models, tmp_path):
+    backend, _ = install_replay(fixture_frames)
+    decisions, timings, _, _ = replay(backend)
+
+    assert decisions == FIXTURE_DECISIONS
+    # The defences are only detected on the enemy passing the resource thresholds
+    assert replay_models.calls == 2
+    assert len(timings['process_screenshot']) == 3
+
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps(decisions))
+    assert compare_decisions(decisions, json.loads(baseline.read_text())) == (1.0, [])
+
+
+def test_replay_reports_frames_departing_from_the_baseline(fixture_frames, replay_models, monkeypatch):
+    monkeypatch.setattr(image_processing, 'DEFENSIVE_BUILDINGS_AMOUNT_THRESHOLD', 10)
+    backend, _ = install_replay(fixture_frames)
+    decisions, _, _, _ = replay(backend, detect_all=True)
+
+    assert decisions['enemy_2.png']['is_worth_based_on_defences']
+    agreement, disagreements = compare_decisions(decisions, FIXTURE_DECISIONS)
+    assert agreement == pytest.approx(2 / 3)
+    assert disagreements == ['enemy_3.png']